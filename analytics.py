@@ -0,0 +1,194 @@
+# Resúmenes incrementales del registro de consultas (tabla consulta).
+#
+# ``refresh`` lee solo las consultas registradas desde la última marca de
+# agua (analitica_marca) y las suma a tres tablas de resumen:
+#
+#   consulta_hora            consultas y suma de puntuaciones por hora y FAQ
+#   consulta_score           histograma de puntuaciones por hora
+#   consulta_sin_respuesta   consultas bajo el umbral agrupadas por texto normalizado
+#
+# Resumen y marca se actualizan en la misma transacción, así que cada
+# consulta se cuenta una sola vez. Las lecturas de /stats solo tocan los
+# resúmenes. La marca se queda ANALYTICS_LAG_SECONDS por detrás del reloj
+# porque las consultas se insertan por lotes con algo de retraso.
+#
+#   python analytics.py    (refresco manual, p. ej. desde cron)
+import datetime
+
+import psycopg2
+import psycopg2.extras
+
+# Configuración de la base de datos
+DB_NAME = "DefensaIA"
+DB_USER = "postgres"
+DB_PASSWORD = "postgres"
+DB_HOST = "localhost"
+DB_PORT = "5432"
+
+CONFIDENCE_THRESHOLD = 0.10        # Mismo umbral que api.py (para el refresco manual)
+ANALYTICS_LAG_SECONDS = 120        # Margen para consultas que aún están en la cola del registro
+SCORE_HISTOGRAM_BUCKETS = 20       # Cubetas de 0.05 entre 0 y 1
+# faq_id de las consultas sin FAQ asociada (la clave primaria no admite NULL)
+NO_FAQ = "00000000-0000-0000-0000-000000000000"
+WATERMARK = "consulta"
+# Las entradas internas ("[SYSTEM] ...") no son consultas de usuarios
+SYSTEM_PREFIX = "[SYSTEM]"
+READ_BATCH_ROWS = 5000
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def watermark(cursor):
+    """Instante hasta el que ya están resumidas las consultas"""
+    cursor.execute("SELECT ts FROM analitica_marca WHERE nombre = %s", (WATERMARK,))
+    row = cursor.fetchone()
+    return row[0] if row else _EPOCH
+
+
+def _rollup_hours(cursor, since, until):
+    cursor.execute(
+        "INSERT INTO consulta_hora (hora, faq_id, consultas, score_sum) "
+        "SELECT date_trunc('hour', timestamp), COALESCE(faq_id, %s::uuid), count(*), COALESCE(sum(score), 0) "
+        "FROM consulta WHERE timestamp > %s AND timestamp <= %s AND texto NOT LIKE %s "
+        "GROUP BY 1, 2 "
+        "ON CONFLICT (hora, faq_id) DO UPDATE SET consultas = consulta_hora.consultas + EXCLUDED.consultas, "
+        "score_sum = consulta_hora.score_sum + EXCLUDED.score_sum",
+        (NO_FAQ, since, until, SYSTEM_PREFIX + "%")
+    )
+
+
+def _rollup_scores(cursor, since, until):
+    cursor.execute(
+        "INSERT INTO consulta_score (hora, cubeta, consultas) "
+        "SELECT date_trunc('hour', timestamp), LEAST(GREATEST(floor(score * %s), 0), %s - 1)::int, count(*) "
+        "FROM consulta WHERE timestamp > %s AND timestamp <= %s AND score IS NOT NULL AND texto NOT LIKE %s "
+        "GROUP BY 1, 2 "
+        "ON CONFLICT (hora, cubeta) DO UPDATE SET consultas = consulta_score.consultas + EXCLUDED.consultas",
+        (SCORE_HISTOGRAM_BUCKETS, SCORE_HISTOGRAM_BUCKETS, since, until, SYSTEM_PREFIX + "%")
+    )
+
+
+def _rollup_unanswered(cursor, since, until, threshold, normalize):
+    """Agrupa por texto normalizado las consultas bajo el umbral (la normalización es la de api.py)"""
+    cursor.execute(
+        "SELECT texto, score, timestamp FROM consulta "
+        "WHERE timestamp > %s AND timestamp <= %s AND (score IS NULL OR score < %s) AND texto NOT LIKE %s",
+        (since, until, threshold, SYSTEM_PREFIX + "%")
+    )
+    groups = {}
+    while True:
+        batch = cursor.fetchmany(READ_BATCH_ROWS)
+        if not batch:
+            break
+        for texto, score, ts in batch:
+            key = normalize(texto)
+            if not key:
+                continue
+            g = groups.get(key)
+            if g is None:
+                groups[key] = [texto, 1, score or 0.0, ts, ts]
+            else:
+                g[1] += 1
+                g[2] = max(g[2], score or 0.0)
+                g[3] = min(g[3], ts)
+                g[4] = max(g[4], ts)
+    if groups:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO consulta_sin_respuesta (texto_norm, ejemplo, consultas, score_max, primera, ultima) "
+            "VALUES %s ON CONFLICT (texto_norm) DO UPDATE SET "
+            "consultas = consulta_sin_respuesta.consultas + EXCLUDED.consultas, "
+            "score_max = GREATEST(consulta_sin_respuesta.score_max, EXCLUDED.score_max), "
+            "primera = LEAST(consulta_sin_respuesta.primera, EXCLUDED.primera), "
+            "ultima = GREATEST(consulta_sin_respuesta.ultima, EXCLUDED.ultima)",
+            [(key, *g) for key, g in groups.items()],
+            page_size=1000
+        )
+    return len(groups)
+
+
+def refresh(cursor, normalize, threshold, now=None):
+    """Suma a los resúmenes las consultas nuevas desde la marca de agua. No confirma la transacción.
+
+    Devuelve (desde, hasta, textos sin respuesta actualizados) o None si no había nada nuevo.
+    """
+    # Bloquea la fila de la marca: dos refrescos a la vez no cuentan lo mismo dos veces
+    cursor.execute("INSERT INTO analitica_marca (nombre, ts) VALUES (%s, %s) ON CONFLICT (nombre) DO NOTHING",
+                   (WATERMARK, _EPOCH))
+    cursor.execute("SELECT ts FROM analitica_marca WHERE nombre = %s FOR UPDATE", (WATERMARK,))
+    since = cursor.fetchone()[0]
+    now = now or datetime.datetime.now()
+    until = now - datetime.timedelta(seconds=ANALYTICS_LAG_SECONDS)
+    if until <= since:
+        return None
+    _rollup_hours(cursor, since, until)
+    _rollup_scores(cursor, since, until)
+    texts = _rollup_unanswered(cursor, since, until, threshold, normalize)
+    cursor.execute("UPDATE analitica_marca SET ts = %s WHERE nombre = %s", (until, WATERMARK))
+    return since, until, texts
+
+
+def top_faqs(cursor, since, limit=20):
+    """FAQs más consultadas desde ``since``: (faq_id, consultas, puntuación media)"""
+    cursor.execute(
+        "SELECT faq_id, sum(consultas), sum(score_sum) / sum(consultas) FROM consulta_hora "
+        "WHERE hora >= date_trunc('hour', %s::timestamp) AND faq_id <> %s::uuid "
+        "GROUP BY faq_id ORDER BY 2 DESC LIMIT %s",
+        (since, NO_FAQ, limit)
+    )
+    return [(str(faq_id), int(n), float(avg)) for faq_id, n, avg in cursor.fetchall()]
+
+
+def hourly(cursor, since, faq_id=None):
+    """Consultas por hora desde ``since`` (de una FAQ o de todas): (hora, consultas, puntuación media)"""
+    sql = ("SELECT hora, sum(consultas), sum(score_sum) / sum(consultas) FROM consulta_hora "
+           "WHERE hora >= date_trunc('hour', %s::timestamp)")
+    params = [since]
+    if faq_id:
+        sql += " AND faq_id = %s"
+        params.append(faq_id)
+    cursor.execute(sql + " GROUP BY hora ORDER BY hora", params)
+    return [(hora, int(n), float(avg)) for hora, n, avg in cursor.fetchall()]
+
+
+def score_histogram(cursor, since):
+    """Consultas por cubeta de puntuación desde ``since``: lista de SCORE_HISTOGRAM_BUCKETS conteos"""
+    cursor.execute(
+        "SELECT cubeta, sum(consultas) FROM consulta_score "
+        "WHERE hora >= date_trunc('hour', %s::timestamp) GROUP BY cubeta",
+        (since,)
+    )
+    counts = [0] * SCORE_HISTOGRAM_BUCKETS
+    for cubeta, n in cursor.fetchall():
+        counts[cubeta] = int(n)
+    return counts
+
+
+def unanswered(cursor, since=None, limit=50):
+    """Consultas sin respuesta más frecuentes (vistas desde ``since``): lo que conviene escribir como FAQ"""
+    cursor.execute(
+        "SELECT texto_norm, ejemplo, consultas, score_max, primera, ultima FROM consulta_sin_respuesta "
+        "WHERE ultima >= %s ORDER BY consultas DESC, ultima DESC LIMIT %s",
+        (since or _EPOCH, limit)
+    )
+    return [
+        {"text": key, "example": ejemplo, "count": int(n), "max_score": float(score_max),
+         "first_seen": primera, "last_seen": ultima}
+        for key, ejemplo, n, score_max, primera, ultima in cursor.fetchall()
+    ]
+
+
+if __name__ == "__main__":
+    from train_index import preprocess_text
+
+    conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    cursor = conn.cursor()
+    result = refresh(cursor, lambda text: preprocess_text([text])[0], CONFIDENCE_THRESHOLD)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    if result is None:
+        print("Sin consultas nuevas que resumir.")
+    else:
+        since, until, texts = result
+        print(f"Resumidas las consultas de {since} a {until} ({texts} textos sin respuesta actualizados).")
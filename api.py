@@ -1,17 +1,49 @@
-from fastapi import FastAPI, HTTPException, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import collections
+import dataclasses
+import datetime
+import hashlib
+import itertools
+import json
+import numpy as np
 import joblib
+import logging
+import multiprocessing
+import os
 import psycopg2
 import psycopg2.extras
-import pickle
+import random
+import threading
+import time
 import uuid
 import re
+import tempfile
 import unicodedata
 from pathlib import Path
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import strip_accents_unicode
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Optional
+from analytics import (SCORE_HISTOGRAM_BUCKETS, hourly, refresh as refresh_analytics, score_histogram, top_faqs,
+                       unanswered, watermark)
+from db_pool import ConnectionPool
+from dedup import DEDUP_THRESHOLD, DEDUP_WORKERS, find_duplicates
+from dense_index import fit_dense, hybrid_search
+from faq_collections import (COLLECTION_MEMORY_BUDGET, DEFAULT_COLLECTION, CollectionCache, collection_dir,
+                             collection_index_name, collection_lock_key, directory_nbytes, valid_collection)
+from faq_listing import LIST_DEFAULT_LIMIT, LIST_MAX_LIMIT, SEARCH_FIELDS, page
+from faq_import import FORMATS, ON_CONFLICT, detect_format, import_faqs, iter_records, text_stream
+from index_snapshot import IndexSnapshot, analyzer_step, fit_pipeline, is_hashing
+from index_sync import INDEX_NAME, WORKER_ID, BuildLock, IndexListener, notify, publish_version
+from metrics import SCORE_BUCKETS, Registry, begin_request, end_request
+from serving_index import current_serving_dir, load_serving_index, publish_serving_index
+from query_cache import QueryCache
+from query_log import QueryLogWriter
+from synonyms import EXPAND_DOCUMENTS, SYNONYMS_FROM_DB, compile_synonyms
+from vector_codec import load_matrix, upsert_vector, write_vectors
 
 # Configuración de la base de datos
 DB_NAME = "DefensaIA"
@@ -20,9 +52,26 @@ DB_PASSWORD = "postgres"
 DB_HOST = "localhost"
 DB_PORT = "5432"
 
+# Configuración del pool de conexiones
+DB_POOL_MIN = 1                 # Conexiones abiertas al arrancar
+DB_POOL_MAX = 10                # Máximo de conexiones simultáneas (backends de Postgres)
+DB_POOL_TIMEOUT = 5.0           # Segundos de espera por una conexión libre
+DB_POOL_HEALTHCHECK_IDLE = 30.0 # Verificar con SELECT 1 las conexiones inactivas más de N segundos
+
 # Rutas de archivos para artefactos del modelo
 PIPE_PATH = Path("tfidf_pipe.joblib")
 FAQS_PATH = Path("faqs_texts.joblib")
+# Artefacto de servicio mapeado en memoria (preferido al arrancar; no requiere scikit-learn)
+SERVING_DIR = Path("serving_index")
+
+def strip_accents_unicode(s: str) -> str:
+    """Quita los acentos (misma transformación que sklearn.feature_extraction.text.strip_accents_unicode)"""
+    try:
+        s.encode("ASCII", errors="strict")
+        return s
+    except UnicodeEncodeError:
+        normalized = unicodedata.normalize("NFKD", s)
+        return "".join([c for c in normalized if not unicodedata.combining(c)])
 
 # Función para normalizar texto (igual que en train_index.py)
 def normalize_text(text: str) -> str:
@@ -35,37 +84,298 @@ def normalize_text(text: str) -> str:
     text = re.sub(r"\s+", " ", text).strip()
     return text
 
-# Diccionario de sinónimos locales (ejemplos; ampliar según necesidades)
-SYN = {
-    "viaticos": ["viatico", "gastos de viaje", "pasajes", "reembolso"],
-    "vacaciones": ["licencia", "descanso", "vacas", "permiso"],
-    "justificar": ["sustentar", "motivar", "respaldar", "fundamentar"],
-    "sueldo": ["salario", "remuneracion", "pago", "honorarios"],
-    "contrato": ["convenio", "acuerdo", "vinculo laboral"],
-    "horario": ["jornada", "tiempo", "horas de trabajo"],
-    "capacitacion": ["formacion", "entrenamiento", "curso", "taller"]
-}
-
-def expand_query(q: str) -> str:
-    """Expande la consulta con sinónimos relevantes"""
+# Los sinónimos se leen de sinonimos.txt (o de la tabla sinonimo, ver synonyms.py)
+# y se compilan con cada índice; /reload vuelve a leerlos.
+def _compile_synonyms(cursor=None):
+    """Compila el diccionario de sinónimos con la normalización de las consultas"""
+    return compile_synonyms(normalize_text, cursor=cursor)
+
+def expand_query(q: str, synonyms=None) -> str:
+    """Expande la consulta con sinónimos relevantes (frases completas, en una sola pasada)"""
     nq = normalize_text(q)  # Usar la función de normalización
-    tokens = set(nq.split())
-    extra = []
-    for k, alts in SYN.items():
-        if k in tokens or any(a in tokens for a in alts):
-            extra.extend(alts + [k])
-    if extra:
-        nq = f"{nq} " + " ".join(sorted(set(extra)))
-    return nq
-
-# Cargar artefactos
-pipe = joblib.load(PIPE_PATH)
-store = joblib.load(FAQS_PATH)
-X = store["X"]; QUESTIONS = store["questions"]; ANSWERS = store["answers"]; FAQ_IDS = store["ids"]
+    if synonyms is None:
+        synonyms = SNAPSHOT.synonyms
+    return synonyms.expand(nq)
+
+def _load_store_from_db():
+    """Reconstruye textos y matriz de servicio desde las tablas faq y vector_tfidf"""
+    conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, q, a FROM faq WHERE coleccion = %s", (DEFAULT_COLLECTION,))
+        faqs = cursor.fetchall()
+        ids = [str(row[0]) for row in faqs]
+        X = load_matrix(cursor, ids)
+        cursor.close()
+    finally:
+        conn.close()
+    return {"X": X, "questions": [row[1].strip() for row in faqs],
+            "answers": [row[2].strip() for row in faqs], "ids": ids}
+
+def _load_initial_synonyms():
+    """Sinónimos del arranque; si la tabla sinonimo no está disponible se usa solo el fichero"""
+    if SYNONYMS_FROM_DB:
+        try:
+            conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+            try:
+                return _compile_synonyms(conn.cursor())
+            finally:
+                conn.close()
+        except psycopg2.Error:
+            pass
+    return _compile_synonyms()
+
+def _open_serving_index(directory, synonyms):
+    """Snapshot (generación 0) sobre una versión del artefacto de servicio abierta con mmap"""
+    art = load_serving_index(directory)
+    return IndexSnapshot.build(art["vectorizer"], None, art["questions"], art["answers"], art["ids"],
+                               generation=0, engine=art["engine"], synonyms=synonyms, dense=art["dense"],
+                               version=directory.name)
+
+def _load_initial_snapshot():
+    """Abre el artefacto mapeado en memoria si existe; si no, los joblib (o la BD si faltan)"""
+    synonyms = _load_initial_synonyms()
+    serving_dir = current_serving_dir(SERVING_DIR)
+    if serving_dir is not None:
+        return _open_serving_index(serving_dir, synonyms)
+    # Sin faqs_texts.joblib, la matriz se reconstruye directamente desde vector_tfidf
+    store = joblib.load(FAQS_PATH) if FAQS_PATH.exists() else _load_store_from_db()
+    return IndexSnapshot.build(joblib.load(PIPE_PATH), store["X"], store["questions"], store["answers"],
+                               store["ids"], generation=0, synonyms=synonyms, dense=store.get("dense"))
+
+# Cargar artefactos en el snapshot servido (se reemplaza completo, nunca por partes)
+_generations = itertools.count(1)
+SNAPSHOT = _load_initial_snapshot()
 
 CONFIDENCE_THRESHOLD = 0.10
 
-app = FastAPI(title="FAQ Chatbot (TF-IDF)", version="1.0")
+# Máximo de consultas aceptadas por llamada a /ask/batch
+ASK_BATCH_MAX = 5000
+
+# Estrategia de puntuación: "inverted" (índice invertido, solo FAQs que comparten términos)
+# o "brute" (similitud contra toda la matriz, camino original)
+RETRIEVAL_MODE = "inverted"
+
+# Puntuación de /ask, /topk y /ask/batch: "sparse" (coseno TF-IDF), "dense" (producto escalar
+# en el espacio LSA, ver dense_index.py) o "hybrid" (HYBRID_ALPHA * denso + resto * disperso).
+# Los modos densos necesitan un índice construido con dense (train_index.py --dense o /reload
+# con un modo denso activo); sin él se usa el disperso. CONFIDENCE_THRESHOLD está calibrado
+# para el coseno TF-IDF; los modos densos usan su propio umbral (ver _threshold).
+SCORING_MODES = ("sparse", "dense", "hybrid")
+SCORING_MODE = "sparse"
+HYBRID_ALPHA = 0.5
+# Umbral por defecto de los modos densos: los cosenos LSA suelen quedar entre 0.2 y 0.9, así que
+# con el umbral del coseno TF-IDF casi ninguna consulta caería en "No estoy seguro"
+DENSE_CONFIDENCE_THRESHOLD = 0.50
+HYBRID_CONFIDENCE_THRESHOLD = HYBRID_ALPHA * DENSE_CONFIDENCE_THRESHOLD + (1 - HYBRID_ALPHA) * CONFIDENCE_THRESHOLD
+
+# Corrección de errores de escritura (spelling.py): si una consulta no llega al umbral, sus
+# palabras desconocidas se corrigen con el diccionario del índice y se vuelve a puntuar
+SPELL_CORRECTION = True
+
+# Mantenimiento incremental: los cambios en /faqs actualizan solo su fila del índice
+INCREMENTAL_INDEX = True
+INCREMENTAL_REFIT_DRIFT = 0.10   # Reajuste completo cuando la deriva supera este valor
+_index_lock = threading.Lock()   # Serializa a quienes publican snapshots nuevos
+_refit_pending = False
+
+# Modo del índice al reconstruir: por defecto el del índice servido (ver train_index.py);
+# /reload?mode=hashing|vocabulary permite cambiarlo
+INDEX_MODES = ("vocabulary", "hashing")
+HASH_N_FEATURES = 2 ** 20        # Cubetas al pasar al modo hashing
+
+# Reconstrucción en segundo plano
+REBUILD_IN_SUBPROCESS = True     # Ajustar el vectorizador en otro proceso para no competir por el GIL
+BUILD_STATUS = {"state": "idle", "phase": None, "progress": 0.0, "started_at": None,
+                "finished_at": None, "duration": None, "error": None, "items": None, "generation": None,
+                "mode": None}
+_build_lock = threading.Lock()
+_build_thread: Optional[threading.Thread] = None
+_pending_edits: Optional[list] = None  # Cambios de /faqs durante una reconstrucción
+_phase_clock = None  # (fase, inicio) de la fase de reconstrucción en curso
+
+# Coordinación entre workers (index_sync.py): un solo proceso reconstruye y los demás abren
+# el artefacto publicado; los cambios de /faqs se avisan a todos por LISTEN/NOTIFY
+COORDINATE_WORKERS = True
+INDEX_SYNC_POLL_SECONDS = 30.0   # Consulta de indice_publicado por si se perdió una notificación
+EDIT_REPLAY_SECONDS = 60.0       # Margen al repetir cambios de /faqs sobre un índice recibido
+EDIT_HISTORY = 10000             # Cambios recientes que se recuerdan para repetirlos
+SYNC_LOG = logging.getLogger("faq.sync")
+_recent_edits = collections.deque(maxlen=EDIT_HISTORY)  # (instante, id, pregunta, respuesta, borrada)
+
+# Caché de resultados de consultas (se invalida al cambiar la generación del índice)
+QUERY_CACHE_SIZE = 10000   # Máximo de consultas distintas en memoria
+QUERY_CACHE_TTL = 300.0    # Segundos de vida de cada entrada
+QUERY_CACHE = QueryCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+# Métricas (GET /metrics) y registro muestreado de peticiones lentas
+SLOW_REQUEST_SECONDS = 0.5   # Duración a partir de la cual una petición se considera lenta
+SLOW_REQUEST_SAMPLE = 1.0    # Fracción de peticiones lentas que se registran (0 = ninguna)
+METRICS = Registry()
+STAGE_SECONDS = METRICS.histogram("faq_stage_seconds", "Duración de cada etapa de una consulta", ["stage"])
+REQUEST_SECONDS = METRICS.histogram("faq_http_request_seconds", "Duración de las peticiones HTTP", ["method", "path"])
+REQUESTS = METRICS.counter("faq_http_requests_total", "Peticiones HTTP por ruta y código", ["method", "path", "status"])
+SCORES = METRICS.histogram("faq_score", "Puntuación de la mejor FAQ por consulta", ["endpoint"], buckets=SCORE_BUCKETS)
+UNANSWERED = METRICS.counter("faq_below_threshold_total", "Consultas por debajo del umbral de confianza", ["endpoint"])
+DB_SECONDS = METRICS.histogram("faq_db_connection_seconds", "Espera y uso de conexiones del pool", ["phase"])
+RELOAD_SECONDS = METRICS.histogram("faq_reload_seconds", "Duración de las reconstrucciones del índice", ["result"],
+                                   buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+RELOAD_PHASE_SECONDS = METRICS.histogram("faq_reload_phase_seconds", "Duración de cada fase de la reconstrucción",
+                                         ["phase"], buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+SPELL_CORRECTIONS = METRICS.counter("faq_spell_corrections_total", "Consultas respondidas con palabras corregidas", ["endpoint"])
+LOG_FLUSH_SECONDS = METRICS.histogram("faq_query_log_flush_seconds", "Duración de cada escritura de lote del registro de consultas")
+VECTOR_WRITE_ERRORS = METRICS.counter("faq_vector_write_errors_total", "Vectores de cambios de /faqs que no se pudieron guardar en vector_tfidf")
+SLOW_LOG = logging.getLogger("faq.slow")
+
+def _next_generation():
+    return next(_generations)
+
+def _publish(snap, edited=None):
+    """Publica un snapshot nuevo con un único intercambio de referencia.
+
+    ``edited`` = (filas, términos) de un cambio incremental: la caché descarta
+    solo las consultas afectadas; sin él (índice nuevo) se vacía entera.
+    """
+    global SNAPSHOT
+    SNAPSHOT = snap
+    if edited is None:
+        QUERY_CACHE.set_generation(snap.generation)
+    else:
+        QUERY_CACHE.invalidate(snap.generation, *edited)
+
+def _cached(snap, key, compute):
+    """Resultado de ``compute`` para ``key`` a través de QUERY_CACHE"""
+    if snap is SNAPSHOT:
+        # Las entradas del índice principal sobreviven a los cambios incrementales que no las afectan
+        return QUERY_CACHE.get_or_compute(key, compute, generation=snap.generation)
+    # Colecciones (y snapshots ya reemplazados): la generación va en la clave
+    return QUERY_CACHE.get_or_compute((snap.generation,) + key, compute)
+
+def _rank(snap, v, k=1):
+    """Devuelve (índices, puntuaciones) de las k FAQs más similares al vector de consulta"""
+    with STAGE_SECONDS.time("score"):
+        scoring = _scoring_mode(snap)
+        if scoring == "dense":
+            # Cualquier fila nueva o cambiada puede entrar en el top-k denso
+            QUERY_CACHE.depends()
+            return snap.dense.search(snap.dense.project(v)[0], k)
+        if scoring == "hybrid":
+            QUERY_CACHE.depends()
+            return hybrid_search(snap.engine, snap.dense, v, k, HYBRID_ALPHA)
+        if RETRIEVAL_MODE == "brute":
+            idx, scores = snap.engine.search_brute(v, k)
+        else:
+            idx, scores = snap.engine.search(v, k)
+    if len(idx) < k:
+        # Se devolvieron todas las filas vivas: una alta también cambia el resultado
+        QUERY_CACHE.depends()
+    else:
+        QUERY_CACHE.depends(idx.tolist(), v.indices.tolist())
+    return idx, scores
+
+def _vectorize_query(snap, nq):
+    """Expande y vectoriza una consulta ya normalizada midiendo cada etapa; devuelve (consulta expandida, vector)"""
+    with STAGE_SECONDS.time("expand"):
+        # El diccionario compilado ya está normalizado, así que la consulta expandida también
+        q = snap.synonyms.expand(nq)
+    with STAGE_SECONDS.time("transform"):
+        v = snap.pipe.transform([q])
+    return q, v
+
+def _correct_query(snap, nq):
+    """Consulta normalizada con las palabras desconocidas corregidas (None si no cambia nada)"""
+    # El diccionario se construye al publicar el índice; mientras no exista no se corrige
+    spelling = snap.spelling(normalize_text, build=False) if SPELL_CORRECTION else None
+    if spelling is None:
+        return None
+    with STAGE_SECONDS.time("spell"):
+        corrected, changes = spelling.correct(nq)
+    return corrected if changes else None
+
+def _warm_spelling():
+    """Construye el corrector del snapshot servido (los incrementales posteriores lo heredan)"""
+    # Si entretanto se publica otro snapshot sin corrector, se construye también para ese
+    while SPELL_CORRECTION and SNAPSHOT.spelling(normalize_text, build=False) is None:
+        SNAPSHOT.spelling(normalize_text)
+
+def _search_query(snap, q_raw, k, threshold, endpoint):
+    """Normaliza, vectoriza y puntúa una consulta; por debajo del umbral reintenta con la consulta corregida.
+
+    Devuelve (consulta expandida, vector, índices, puntuaciones, consulta corregida o None).
+    """
+    with STAGE_SECONDS.time("normalize"):
+        nq = normalize_text(q_raw)
+    q, v = _vectorize_query(snap, nq)
+    idx, scores = _rank(snap, v, k)
+    score = float(scores[0]) if len(idx) else 0.0
+    if score < threshold:
+        corrected = _correct_query(snap, nq)
+        if corrected is not None:
+            q2, v2 = _vectorize_query(snap, corrected)
+            idx2, scores2 = _rank(snap, v2, k)
+            # Solo se usa la corrección si mejora el resultado
+            if len(idx2) and float(scores2[0]) > score:
+                SPELL_CORRECTIONS.inc(endpoint)
+                return q2, v2, idx2, scores2, corrected
+    return q, v, idx, scores, None
+
+def _observe_score(endpoint, score, threshold=None):
+    """Anota la puntuación servida (también las respuestas desde la caché)"""
+    SCORES.observe(score, endpoint)
+    if threshold is not None and score < threshold:
+        UNANSWERED.inc(endpoint)
+
+# Pool de conexiones compartido (se crea en el arranque de la aplicación)
+DB_POOL: Optional[ConnectionPool] = None
+_db_pool_lock = threading.Lock()
+
+def init_db_pool():
+    """Crea el pool de conexiones si aún no existe"""
+    global DB_POOL
+    with _db_pool_lock:
+        if DB_POOL is None:
+            DB_POOL = ConnectionPool(
+                DB_POOL_MIN,
+                DB_POOL_MAX,
+                acquire_timeout=DB_POOL_TIMEOUT,
+                healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE,
+                observe=lambda phase, seconds: DB_SECONDS.observe(seconds, phase),
+                dbname=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                host=DB_HOST,
+                port=DB_PORT
+            )
+    return DB_POOL
+
+def close_db_pool():
+    """Cierra el pool de conexiones"""
+    global DB_POOL
+    with _db_pool_lock:
+        if DB_POOL is not None:
+            DB_POOL.close()
+            DB_POOL = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        init_db_pool()
+    except psycopg2.Error:
+        # La API puede responder consultas sin BD; el pool se reintenta en el primer uso
+        pass
+    QUERY_LOG.start()
+    _start_analytics()
+    if COORDINATE_WORKERS:
+        INDEX_LISTENER.start()
+    threading.Thread(target=_warm_spelling, name="spelling-warmup", daemon=True).start()
+    yield
+    INDEX_LISTENER.close()
+    _analytics_stop.set()
+    # Escribir las consultas pendientes antes de cerrar el pool
+    QUERY_LOG.close()
+    close_db_pool()
+
+app = FastAPI(title="FAQ Chatbot (TF-IDF)", version="1.0", lifespan=lifespan)
 
 # Configuración de orígenes permitidos para CORS
 origins = [
@@ -89,6 +399,27 @@ app.add_middleware(
     allow_headers=["Content-Type", "Authorization", "X-Requested-With"]
 )
 
+@app.middleware("http")
+async def _request_metrics(request: Request, call_next):
+    """Mide cada petición por ruta y registra una muestra de las lentas con el desglose por etapa"""
+    token = begin_request()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        stages = end_request(token)
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.observe(elapsed, request.method, path)
+        REQUESTS.inc(request.method, path, str(status))
+        if elapsed >= SLOW_REQUEST_SECONDS and random.random() < SLOW_REQUEST_SAMPLE:
+            SLOW_LOG.warning("petición lenta %s %s %d %.1f ms etapas=%s", request.method, path, status,
+                             elapsed * 1000.0, {k: round(v * 1000.0, 3) for k, v in stages.items()})
+
 # Modelos de datos
 class AskIn(BaseModel):
     query: str
@@ -97,6 +428,13 @@ class AskOut(BaseModel):
     answer: str
     match_question: str
     score: float
+    corrected_query: Optional[str] = None
+
+class AskBatchIn(BaseModel):
+    queries: List[str]
+
+class AskBatchOut(BaseModel):
+    results: List[AskOut]
 
 class RankItem(BaseModel):
     question: str
@@ -106,6 +444,15 @@ class RankItem(BaseModel):
 class TopKOut(BaseModel):
     results: List[RankItem]
     terms: List[str] = []
+    corrected_query: Optional[str] = None
+
+class AnswerOut(BaseModel):
+    answer: str
+    match_question: str
+    score: float
+    results: List[RankItem]
+    terms: List[str] = []
+    corrected_query: Optional[str] = None
     
 class FaqItem(BaseModel):
     q: str
@@ -114,100 +461,323 @@ class FaqItem(BaseModel):
 
 # Funciones auxiliares para CRUD con PostgreSQL
 def get_db_connection():
-    """Establece y retorna una conexión a la base de datos"""
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
-    conn.autocommit = True
-    return conn
-
-def _read_faqs():
-    """Lee las FAQs desde la base de datos PostgreSQL"""
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cursor.execute("SELECT id, q, a FROM faq")
-    faqs = [dict(row) for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
+    """Presta una conexión del pool (usar con ``with``; se devuelve al salir)"""
+    pool = DB_POOL or init_db_pool()
+    return pool.connection()
+
+def _read_faqs(collection=DEFAULT_COLLECTION):
+    """Lee las FAQs de una colección desde la base de datos PostgreSQL"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        cursor.execute("SELECT id, q, a FROM faq WHERE coleccion = %s", (collection,))
+        faqs = [dict(row) for row in cursor.fetchall()]
+        cursor.close()
     return faqs
 
-def _add_faq(item):
-    """Añade una nueva FAQ a la base de datos"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO faq (id, q, a) VALUES (%s, %s, %s) RETURNING id",
-        (item["id"], item["q"], item["a"])
-    )
-    faq_id = cursor.fetchone()[0]
-    cursor.close()
-    conn.close()
+def _get_faq(faq_id, collection=DEFAULT_COLLECTION):
+    """Lee una FAQ de una colección por id (o None si no existe)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        cursor.execute("SELECT id, q, a FROM faq WHERE id = %s AND coleccion = %s", (faq_id, collection))
+        row = cursor.fetchone()
+        cursor.close()
+    return dict(row) if row else None
+
+def _add_faq(item, collection=DEFAULT_COLLECTION):
+    """Añade una nueva FAQ a una colección de la base de datos"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO faq (id, q, a, coleccion) VALUES (%s, %s, %s, %s) RETURNING id",
+            (item["id"], item["q"], item["a"], collection)
+        )
+        faq_id = cursor.fetchone()[0]
+        cursor.close()
     return faq_id
 
-def _update_faq(faq_id, item):
-    """Actualiza una FAQ existente en la base de datos"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE faq SET q = %s, a = %s WHERE id = %s RETURNING id",
-        (item["q"], item["a"], faq_id)
-    )
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
+def _update_faq(faq_id, item, collection=DEFAULT_COLLECTION):
+    """Actualiza una FAQ existente de una colección en la base de datos"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE faq SET q = %s, a = %s WHERE id = %s AND coleccion = %s RETURNING id",
+            (item["q"], item["a"], faq_id, collection)
+        )
+        result = cursor.fetchone()
+        cursor.close()
     return result is not None
 
-def _delete_faq(faq_id):
-    """Elimina una FAQ de la base de datos"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Primero eliminar los vectores TF-IDF asociados
-    cursor.execute("DELETE FROM vector_tfidf WHERE faq_id = %s", (faq_id,))
-    
-    # Eliminar referencias en la tabla consulta
-    cursor.execute("DELETE FROM consulta WHERE faq_id = %s", (faq_id,))
-    
-    # Luego eliminar la FAQ
-    cursor.execute("DELETE FROM faq WHERE id = %s RETURNING id", (faq_id,))
-    result = cursor.fetchone()
-    
-    # Confirmar los cambios
-    conn.commit()
-    cursor.close()
-    conn.close()
+def _delete_faq(faq_id, collection=DEFAULT_COLLECTION):
+    """Elimina una FAQ de una colección de la base de datos"""
+    with get_db_connection() as conn:
+        # Ejecutar los tres borrados en una sola transacción
+        conn.autocommit = False
+        cursor = conn.cursor()
+        
+        # Solo si la FAQ es de la colección (bloqueada hasta confirmar)
+        cursor.execute("SELECT 1 FROM faq WHERE id = %s AND coleccion = %s FOR UPDATE", (faq_id, collection))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            cursor.close()
+            return False
+        
+        # Primero eliminar los vectores TF-IDF asociados
+        cursor.execute("DELETE FROM vector_tfidf WHERE faq_id = %s", (faq_id,))
+        
+        # Conservar el historial de consultas: solo se quita la referencia (índice consulta_faq_id_idx)
+        cursor.execute("UPDATE consulta SET faq_id = NULL WHERE faq_id = %s", (faq_id,))
+        
+        # Luego eliminar la FAQ
+        cursor.execute("DELETE FROM faq WHERE id = %s RETURNING id", (faq_id,))
+        result = cursor.fetchone()
+        
+        # Confirmar los cambios
+        conn.commit()
+        cursor.close()
     return result is not None
 
+def _write_consultas(rows):
+    """Escribe un lote de consultas (id, texto, timestamp, score, faq_id) con una sola inserción multi-fila"""
+    with LOG_FLUSH_SECONDS.time(), get_db_connection() as conn:
+        cursor = conn.cursor()
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO consulta (id, texto, timestamp, score, faq_id) VALUES %s",
+            rows,
+            page_size=1000
+        )
+        cursor.close()
+
+# Registro de consultas fuera de la petición: cola acotada y escritura por lotes
+QUERY_LOG_QUEUE_SIZE = 10000     # Filas en espera como máximo (después se descartan y se cuentan)
+QUERY_LOG_BATCH_SIZE = 500       # Filas por inserción
+QUERY_LOG_FLUSH_SECONDS = 1.0    # Espera máxima antes de escribir un lote incompleto
+QUERY_LOG_BLOCK_SECONDS = 0.0    # Espera de la petición con la cola llena (0 = descartar sin esperar)
+QUERY_LOG = QueryLogWriter(_write_consultas, maxsize=QUERY_LOG_QUEUE_SIZE, batch_size=QUERY_LOG_BATCH_SIZE,
+                           flush_interval=QUERY_LOG_FLUSH_SECONDS, block_timeout=QUERY_LOG_BLOCK_SECONDS)
+
+def _log_consultas(rows):
+    """Registra varias consultas (texto, score, faq_id) en la cola del registro"""
+    if not rows:
+        return
+    with STAGE_SECONDS.time("log"):
+        QUERY_LOG.log_many(rows)
+
+def _log_consulta(texto, score=None, faq_id=None):
+    """Registra una consulta en la cola del registro (las filas perdidas se cuentan en /querylog/stats)"""
+    with STAGE_SECONDS.time("log"):
+        QUERY_LOG.log(texto, score, faq_id)
+
+# Resúmenes del registro de consultas (analytics.py)
+ANALYTICS_REFRESH_SECONDS = 300.0   # Cada cuánto se suman las consultas nuevas (0 = solo con POST /stats/refresh)
+ANALYTICS_LOG = logging.getLogger("faq.analytics")
+_analytics_stop = threading.Event()
+_analytics_thread = None
+
+def _refresh_analytics():
+    """Suma a los resúmenes las consultas registradas desde la última marca de agua"""
+    with get_db_connection() as conn:
+        conn.autocommit = False
+        cursor = conn.cursor()
+        try:
+            result = refresh_analytics(cursor, normalize_text, _threshold(SNAPSHOT))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    return result
+
+def _analytics_loop():
+    while not _analytics_stop.wait(ANALYTICS_REFRESH_SECONDS):
+        try:
+            _refresh_analytics()
+        except Exception as e:
+            ANALYTICS_LOG.warning("no se pudieron actualizar los resúmenes de consultas: %s", e)
+
+def _start_analytics():
+    global _analytics_thread
+    if ANALYTICS_REFRESH_SECONDS <= 0 or (_analytics_thread is not None and _analytics_thread.is_alive()):
+        return
+    _analytics_stop.clear()
+    _analytics_thread = threading.Thread(target=_analytics_loop, name="analytics-refresh", daemon=True)
+    _analytics_thread.start()
+
 # Endpoints básicos
 @app.get("/")
 def root():
-    return {"status": "ok", "items": len(QUESTIONS)}
+    return {"status": "ok", "items": SNAPSHOT.items}
 
-@app.post("/ask", response_model=AskOut)
-def ask(payload: AskIn, threshold: float = CONFIDENCE_THRESHOLD):
-    """Responde a una consulta buscando la pregunta más similar"""
-    q_raw = (payload.query or "").strip()
-    if not q_raw:
-        return {"answer": "Por favor, escribe una pregunta.", "match_question": "", "score": 0.0}
-    
-    # Expandir y normalizar la consulta
-    q = expand_query(q_raw)
-    
-    # Preprocesar la consulta expandida (igual que en entrenamiento)
-    processed_query = normalize_text(q)
-    
-    # Vectorizar consulta preprocesada
-    v = pipe.transform([processed_query])
-    scores = cosine_similarity(v, X).ravel()
-    ix = int(scores.argmax())
-    score = float(scores[ix])
+@app.get("/health")
+def health():
+    """Estado de este worker: versión y generación del índice que sirve frente a la publicada"""
+    snap = SNAPSHOT
+    sync = INDEX_LISTENER.stats() if COORDINATE_WORKERS else None
+    if sync is None:
+        status = "ok"
+    elif not sync["connected"]:
+        status = "disconnected"
+    elif sync["published_version"] not in (None, snap.version):
+        status = "stale"
+    else:
+        status = "ok"
+    return {
+        "status": status,
+        "worker": WORKER_ID,
+        "generation": snap.generation,
+        "index_version": snap.version,
+        "built_at": snap.built_at,
+        "items": snap.items,
+        "build": BUILD_STATUS["state"],
+        "sync": sync,
+    }
+
+@app.get("/index/status")
+def index_status():
+    """Generación del índice servido y deriva acumulada por cambios incrementales"""
+    snap = SNAPSHOT
+    return {
+        "generation": snap.generation,
+        "built_at": snap.built_at,
+        "items": snap.items,
+        "mode": _index_mode(snap)[0],
+        "features": snap.engine.n_terms,
+        "version": snap.version,
+        "scoring": _scoring_mode(snap),
+        "dense_dim": snap.dense.dim if snap.dense is not None else None,
+        "incremental": INCREMENTAL_INDEX,
+        "refit_threshold": INCREMENTAL_REFIT_DRIFT,
+        "refit_pending": _refit_pending,
+        "unsaved_vectors": len(_unsaved_vectors),
+        "drift": snap.drift.stats(),
+    }
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Contadores de la caché de consultas (aciertos, fallos, expulsiones)"""
+    return QUERY_CACHE.stats()
+
+@app.get("/pool/stats")
+def pool_stats():
+    """Estadísticas de saturación del pool de conexiones"""
+    if DB_POOL is None:
+        return {"status": "not_initialized", "min": DB_POOL_MIN, "max": DB_POOL_MAX}
+    return DB_POOL.stats()
+
+@app.get("/querylog/stats")
+def querylog_stats():
+    """Cola del registro de consultas: pendientes, escritas y descartadas por motivo"""
+    return QUERY_LOG.stats()
+
+def _index_gauges():
+    snap = SNAPSHOT
+    return {("items",): snap.items, ("terms",): snap.engine.n_terms, ("nnz",): snap.engine.nnz,
+            ("overlay_rows",): len(snap.engine.overlay), ("generation",): snap.generation,
+            ("drift",): snap.drift.stats()["drift"]}
+
+def _stats_gauges(stats):
+    return {(name,): value for name, value in stats.items() if isinstance(value, (int, float))}
+
+METRICS.gauge("faq_index", "Tamaño y estado del índice servido", ["stat"], fn=_index_gauges)
+METRICS.gauge("faq_query_cache", "Contadores de la caché de consultas", ["stat"],
+              fn=lambda: _stats_gauges(QUERY_CACHE.stats()))
+METRICS.gauge("faq_db_pool", "Estado del pool de conexiones", ["stat"],
+              fn=lambda: _stats_gauges(DB_POOL.stats()) if DB_POOL is not None else {})
+METRICS.gauge("faq_query_log", "Cola del registro de consultas (pendientes, escritas, descartadas)", ["stat"],
+              fn=lambda: _stats_gauges(QUERY_LOG.stats()))
+METRICS.gauge("faq_reload_last_seconds", "Duración de la última reconstrucción del índice",
+              fn=lambda: BUILD_STATUS["duration"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+# Estadísticas de uso (leídas de los resúmenes, no del registro completo)
+def _read_stats(fn, *args):
+    """Ejecuta una lectura de analytics.py; devuelve (marca de agua, resultado)"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            result = fn(cursor, *args)
+            mark = watermark(cursor)
+            cursor.close()
+    except psycopg2.Error as e:
+        raise HTTPException(503, f"Estadísticas no disponibles: {str(e)}")
+    return mark, result
+
+def _since(hours):
+    return datetime.datetime.now() - datetime.timedelta(hours=hours)
+
+@app.get("/stats/faqs")
+def stats_faqs(hours: int = Query(24, ge=1, le=24 * 366), limit: int = Query(20, ge=1, le=500)):
+    """FAQs más consultadas en las últimas ``hours`` horas"""
+    mark, rows = _read_stats(top_faqs, _since(hours), limit)
+    snap = SNAPSHOT
+    items = []
+    for faq_id, count, avg_score in rows:
+        faq = snap.get_faq(faq_id)
+        items.append({"id": faq_id, "question": faq["q"] if faq else None, "count": count, "avg_score": avg_score})
+    return {"hours": hours, "watermark": mark, "items": items}
+
+@app.get("/stats/hourly")
+def stats_hourly(hours: int = Query(48, ge=1, le=24 * 366), faq_id: Optional[str] = None):
+    """Consultas por hora (de todas las FAQs o de una)"""
+    mark, rows = _read_stats(hourly, _since(hours), faq_id)
+    return {"hours": hours, "faq_id": faq_id, "watermark": mark,
+            "items": [{"hour": hora, "count": n, "avg_score": avg} for hora, n, avg in rows]}
+
+@app.get("/stats/scores")
+def stats_scores(hours: int = Query(24, ge=1, le=24 * 366)):
+    """Histograma de puntuaciones de la mejor FAQ por consulta"""
+    mark, counts = _read_stats(score_histogram, _since(hours))
+    width = 1.0 / SCORE_HISTOGRAM_BUCKETS
+    buckets = [{"from": round(i * width, 4), "to": round((i + 1) * width, 4), "count": n} for i, n in enumerate(counts)]
+    return {"hours": hours, "watermark": mark, "threshold": _threshold(SNAPSHOT), "buckets": buckets}
+
+@app.get("/stats/unanswered")
+def stats_unanswered(days: int = Query(30, ge=1, le=3660), limit: int = Query(50, ge=1, le=500)):
+    """Consultas bajo el umbral más frecuentes, agrupadas por texto normalizado (candidatas a nuevas FAQs)"""
+    mark, items = _read_stats(unanswered, _since(24 * days), limit)
+    return {"days": days, "watermark": mark, "threshold": _threshold(SNAPSHOT), "items": items}
+
+@app.post("/stats/refresh")
+def stats_refresh():
+    """Actualiza los resúmenes ahora (sin esperar al refresco periódico)"""
+    try:
+        result = _refresh_analytics()
+    except psycopg2.Error as e:
+        raise HTTPException(503, f"Estadísticas no disponibles: {str(e)}")
+    if result is None:
+        return {"status": "up_to_date"}
+    since, until, texts = result
+    return {"status": "refreshed", "from": since, "to": until, "unanswered_texts": texts}
+
+# Número de términos de la consulta que se devuelven para resaltar
+HIGHLIGHT_TERMS = 5
+
+def _highlight_terms(snap, v, n=HIGHLIGHT_TERMS, text=None):
+    """Términos de mayor peso de la consulta, leídos de los índices del vector disperso"""
+    v = v.tocsr()
+    if v.nnz == 0:
+        return []
+    # ordena por peso descendente y toma hasta n
+    top = np.argsort(-v.data, kind="stable")[:n]
+    # en el modo hashing los nombres salen de los n-gramas de la propia consulta
+    names = snap.feature_names(text)
+    return [str(names[int(v.indices[i])]) for i in top]
+
+def _ask_result(snap, q_raw, threshold):
+    """Calcula la respuesta de /ask; devuelve (respuesta, consulta expandida, score, faq_id)"""
+    # Expandir, normalizar y vectorizar la consulta (igual que en entrenamiento)
+    q, v, idx, scores, corrected = _search_query(snap, q_raw, 1, threshold, "ask")
+    # Sin filas vigentes (todas las FAQs borradas por /faqs) no hay candidata
+    ix = int(idx[0]) if len(idx) else None
+    score = float(scores[0]) if len(idx) else 0.0
     
     # Preparar respuesta
-    if score < threshold:
+    if ix is None or score < threshold:
         response = {
             "answer": "No estoy seguro. ¿Puedes reformular o ser más específico?",
             "match_question": "",
@@ -216,105 +786,525 @@ def ask(payload: AskIn, threshold: float = CONFIDENCE_THRESHOLD):
         matched_faq_id = None
     else:
         response = {
-            "answer": ANSWERS[ix], 
-            "match_question": QUESTIONS[ix], 
+            "answer": snap.answer(ix), 
+            "match_question": snap.question(ix), 
             "score": score
         }
-        matched_faq_id = FAQ_IDS[ix] if ix < len(FAQ_IDS) else None
+        matched_faq_id = snap.faq_id(ix)
+    response["corrected_query"] = corrected
+    return response, q, score, matched_faq_id
+
+def _topk_result(snap, q_raw, k):
+    """Calcula el resultado de /topk; devuelve (respuesta, consulta expandida, score, faq_id)"""
+    # Expandir, normalizar y vectorizar la consulta (igual que en entrenamiento)
+    q, v, idx, scores, corrected = _search_query(snap, q_raw, k, _threshold(snap), "topk")
     
-    # Registrar la consulta en la base de datos
-    try:
-        consulta_id = str(uuid.uuid4())
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO consulta (id, texto, timestamp, score, faq_id) VALUES (%s, %s, CURRENT_TIMESTAMP, %s, %s)",
-            (consulta_id, q, score, matched_faq_id)
-        )
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        # Ignorar errores en el registro de consultas
-        pass
+    # términos top-N por peso TF-IDF de la consulta
+    with STAGE_SECONDS.time("highlight"):
+        highlight_terms = _highlight_terms(snap, v, text=q)
+    
+    # Preparar resultados
+    results = [
+        {"question": snap.question(i), "answer": snap.answer(i), "score": float(s)}
+        for i, s in zip(idx, scores)
+    ]
+    
+    # ID de la FAQ con mayor puntuación
+    top_idx = idx[0] if len(idx) > 0 else None
+    matched_faq_id = snap.faq_id(top_idx) if top_idx is not None else None
+    top_score = float(scores[0]) if top_idx is not None else 0.0
+    return {"results": results, "terms": highlight_terms, "corrected_query": corrected}, q, top_score, matched_faq_id
+
+def _answer_result(snap, q_raw, k, threshold):
+    """Mejor respuesta, alternativas y términos con una sola vectorización y una sola puntuación"""
+    q, v, idx, scores, corrected = _search_query(snap, q_raw, k, threshold, "answer")
+    
+    results = [
+        {"question": snap.question(i), "answer": snap.answer(i), "score": float(s)}
+        for i, s in zip(idx, scores)
+    ]
+    score = float(scores[0]) if len(idx) else 0.0
+    if not len(idx) or score < threshold:
+        response = {
+            "answer": "No estoy seguro. ¿Puedes reformular o ser más específico?",
+            "match_question": "",
+            "score": score
+        }
+        matched_faq_id = None
+    else:
+        ix = int(idx[0])
+        response = {"answer": snap.answer(ix), "match_question": snap.question(ix), "score": score}
+        matched_faq_id = snap.faq_id(ix)
+    response["results"] = results
+    response["corrected_query"] = corrected
+    with STAGE_SECONDS.time("highlight"):
+        response["terms"] = _highlight_terms(snap, v, text=q)
+    return response, q, score, matched_faq_id
+
+@app.post("/answer", response_model=AnswerOut)
+def answer(payload: AskIn, k: int = Query(3, ge=1, le=10), threshold: Optional[float] = None):
+    """Respuesta, k alternativas y términos para resaltar en una sola pasada (un solo registro)"""
+    q_raw = (payload.query or "").strip()
+    if not q_raw:
+        return {"answer": "Por favor, escribe una pregunta.", "match_question": "", "score": 0.0,
+                "results": [], "terms": []}
+    
+    snap = SNAPSHOT
+    threshold = _threshold(snap, threshold)
+    key = ("answer", normalize_text(q_raw), k, threshold)
+    response, q, score, matched_faq_id = _cached(snap, key, lambda: _answer_result(snap, q_raw, k, threshold))
+    _observe_score("answer", score, threshold)
+    
+    # Registrar la consulta en la base de datos (una sola fila)
+    _log_consulta(q, score, matched_faq_id)
     
     return response
 
-@app.post("/topk", response_model=TopKOut)
-def topk(payload: AskIn, k: int = Query(5, ge=1, le=10)):
-    """Devuelve las k respuestas más similares a la consulta y términos para resaltar"""
+@app.post("/ask", response_model=AskOut)
+def ask(payload: AskIn, threshold: Optional[float] = None):
+    """Responde a una consulta buscando la pregunta más similar"""
+    return _ask(SNAPSHOT, payload, threshold)
+
+def _ask(snap, payload, threshold):
+    threshold = _threshold(snap, threshold)
     q_raw = (payload.query or "").strip()
+    if not q_raw:
+        return {"answer": "Por favor, escribe una pregunta.", "match_question": "", "score": 0.0}
     
-    # Expandir y normalizar la consulta
-    q = expand_query(q_raw)
+    # Consultas repetidas se sirven desde la caché (clave: consulta normalizada, k, umbral)
+    key = ("ask", normalize_text(q_raw), 1, threshold)
+    response, q, score, matched_faq_id = _cached(snap, key, lambda: _ask_result(snap, q_raw, threshold))
+    _observe_score("ask", score, threshold)
     
-    # Preprocesar la consulta expandida (igual que en entrenamiento)
-    processed_query = normalize_text(q)
+    # Registrar la consulta en la base de datos
+    _log_consulta(q, score, matched_faq_id)
     
-    v = pipe.transform([processed_query])
+    return response
+
+def _best_batch(snap, V):
+    """Mejor FAQ (índice, puntuación) para cada fila de V con el modo de puntuación del snapshot (-1 si ninguna)"""
+    scoring = _scoring_mode(snap)
+    if scoring == "dense":
+        return snap.dense.best_batch(snap.dense.project(V))
+    if scoring == "hybrid":
+        best = [hybrid_search(snap.engine, snap.dense, V[i], 1, HYBRID_ALPHA) for i in range(V.shape[0])]
+        return ([docs[0] if len(docs) else -1 for docs, _ in best],
+                [scores[0] if len(scores) else 0.0 for _, scores in best])
+    return snap.engine.best_batch(V)
+
+@app.post("/ask/batch", response_model=AskBatchOut)
+def ask_batch(payload: AskBatchIn, threshold: Optional[float] = None):
+    """Responde un lote de consultas con una sola vectorización y un solo producto matricial"""
+    if len(payload.queries) > ASK_BATCH_MAX:
+        raise HTTPException(400, f"Máximo {ASK_BATCH_MAX} consultas por lote")
     
-    # términos top-N por peso TF-IDF de la consulta
-    highlight_terms = []
-    try:
-        feature_names = pipe.named_steps["tfidf"].get_feature_names_out()
-        arr = v.toarray()[0]
-        nz = arr.nonzero()[0]
-        # ordena por peso descendente y toma hasta 5
-        if len(nz) > 0:
-            top_term_idx = nz[arr[nz].argsort()[::-1][:5]]
-            highlight_terms = [feature_names[i] for i in top_term_idx]
-    except Exception:
-        # por compatibilidad si el nombre del paso difiere
-        try:
-            feature_names = pipe.steps[0][1].get_feature_names_out()
-            arr = v.toarray()[0]
-            nz = arr.nonzero()[0]
-            if len(nz) > 0:
-                top_term_idx = nz[arr[nz].argsort()[::-1][:5]]
-                highlight_terms = [feature_names[i] for i in top_term_idx]
-        except Exception:
-            # Si falla, no devolvemos términos para resaltar
-            pass
+    snap = SNAPSHOT
+    threshold = _threshold(snap, threshold)
+    results = [None] * len(payload.queries)
+    positions, normalized, expanded = [], [], []
+    for i, raw in enumerate(payload.queries):
+        q_raw = (raw or "").strip()
+        if not q_raw:
+            results[i] = {"answer": "Por favor, escribe una pregunta.", "match_question": "", "score": 0.0}
+            continue
+        positions.append(i)
+        normalized.append(normalize_text(q_raw))
+        with STAGE_SECONDS.time("expand"):
+            expanded.append(snap.synonyms.expand(normalized[-1]))
     
-    scores = cosine_similarity(v, X).ravel()
-    idx = scores.argsort()[::-1][:k]
+    log_rows = []
+    if expanded:
+        # Vectorizar todas las consultas de una vez y puntuar con V · Xᵀ
+        with STAGE_SECONDS.time("batch_transform"):
+            V = snap.pipe.transform(expanded)
+        with STAGE_SECONDS.time("batch_score"):
+            best_idx, best_score = _best_batch(snap, V)
+        best_idx, best_score = list(map(int, best_idx)), list(map(float, best_score))
+        corrected = [None] * len(expanded)
+        # Segunda pasada, solo para las consultas bajo el umbral que tienen alguna palabra corregible
+        retry = [(j, _correct_query(snap, normalized[j])) for j in range(len(expanded)) if best_score[j] < threshold]
+        retry = [(j, fixed) for j, fixed in retry if fixed is not None]
+        if retry:
+            retry_q = [snap.synonyms.expand(fixed) for _, fixed in retry]
+            retry_idx, retry_score = _best_batch(snap, snap.pipe.transform(retry_q))
+            for (j, fixed), q, ix, score in zip(retry, retry_q, retry_idx, retry_score):
+                if float(score) > best_score[j]:
+                    best_idx[j], best_score[j] = int(ix), float(score)
+                    expanded[j], corrected[j] = q, fixed
+                    SPELL_CORRECTIONS.inc("ask_batch")
+        for pos, q, ix, score, fixed in zip(positions, expanded, best_idx, best_score, corrected):
+            if ix < 0 or score < threshold:
+                results[pos] = {
+                    "answer": "No estoy seguro. ¿Puedes reformular o ser más específico?",
+                    "match_question": "",
+                    "score": score,
+                    "corrected_query": fixed
+                }
+                matched_faq_id = None
+            else:
+                results[pos] = {"answer": snap.answer(ix), "match_question": snap.question(ix), "score": score,
+                                "corrected_query": fixed}
+                matched_faq_id = snap.faq_id(ix)
+            _observe_score("ask_batch", score, threshold)
+            log_rows.append((q, score, matched_faq_id))
     
-    # Preparar resultados
-    results = [
-        {"question": QUESTIONS[i], "answer": ANSWERS[i], "score": float(scores[i])}
-        for i in idx
-    ]
+    # Registrar todas las consultas del lote en una sola escritura
+    _log_consultas(log_rows)
     
-    # Registrar la consulta en la base de datos
-    try:
-        consulta_id = str(uuid.uuid4())
-        conn = get_db_connection()
+    return {"results": results}
+
+@app.post("/topk", response_model=TopKOut)
+def topk(payload: AskIn, k: int = Query(5, ge=1, le=10)):
+    """Devuelve las k respuestas más similares a la consulta y términos para resaltar"""
+    return _topk(SNAPSHOT, payload, k)
+
+def _topk(snap, payload, k):
+    q_raw = (payload.query or "").strip()
+    
+    key = ("topk", normalize_text(q_raw), k, None)
+    response, q, top_score, matched_faq_id = _cached(snap, key, lambda: _topk_result(snap, q_raw, k))
+    _observe_score("topk", top_score)
+    
+    # Registrar la consulta en la base de datos con el ID de la FAQ con mayor puntuación
+    _log_consulta(q, top_score, matched_faq_id)
+    
+    return response
+
+# Mantenimiento incremental del índice
+INDEX_LOG = logging.getLogger("faq.index")
+# Vectores de /faqs que la BD rechazó: se reintentan con el siguiente cambio (una reconstrucción los escribe todos)
+_unsaved_vectors: Dict[str, Any] = {}
+_unsaved_vectors_lock = threading.Lock()
+
+def _store_vector(faq_id, v):
+    """Guarda (o reemplaza) el vector TF-IDF de una sola FAQ"""
+    with get_db_connection() as conn:
         cursor = conn.cursor()
-        
-        # Obtener el ID de la FAQ con mayor puntuación
-        top_idx = idx[0] if len(idx) > 0 else None
-        matched_faq_id = FAQ_IDS[top_idx] if top_idx is not None and top_idx < len(FAQ_IDS) else None
-        top_score = float(scores[top_idx]) if top_idx is not None else 0.0
-        
-        cursor.execute(
-            "INSERT INTO consulta (id, texto, timestamp, score, faq_id) VALUES (%s, %s, CURRENT_TIMESTAMP, %s, %s)",
-            (consulta_id, q, top_score, matched_faq_id)
-        )
+        upsert_vector(cursor, faq_id, v)
         cursor.close()
-        conn.close()
+
+def _save_vector(faq_id, v):
+    """Guarda el vector de un cambio de /faqs junto con los pendientes; si la BD falla quedan pendientes"""
+    with _unsaved_vectors_lock:
+        if v is None:
+            # FAQ borrada: su vector ya no hace falta
+            _unsaved_vectors.pop(faq_id, None)
+        else:
+            _unsaved_vectors[faq_id] = v
+        pending = list(_unsaved_vectors.items())
+    for pending_id, vec in pending:
+        try:
+            _store_vector(pending_id, vec)
+        except Exception as e:
+            VECTOR_WRITE_ERRORS.inc()
+            INDEX_LOG.warning("no se pudo guardar el vector de la FAQ %s (%d pendientes): %s",
+                              pending_id, len(pending), e)
+            return
+        with _unsaved_vectors_lock:
+            if _unsaved_vectors.get(pending_id) is vec:
+                del _unsaved_vectors[pending_id]
+
+def _vectorize_faq(snap, q, a):
+    """Vectoriza una FAQ con el vocabulario del snapshot; devuelve (vector, n-gramas, n-gramas fuera de vocabulario)"""
+    doc = normalize_text(f"{q.strip()} {a.strip()}")
+    if EXPAND_DOCUMENTS:
+        doc = snap.synonyms.expand(doc)
+    pipe = snap.pipe
+    vec = analyzer_step(pipe)
+    pruned = getattr(vec, "stop_words_", None) or ()
+    ngrams = [g for g in vec.build_analyzer()(doc) if g not in pruned]
+    # En el modo hashing todo n-grama tiene columna: no hay términos fuera de vocabulario
+    oov = 0 if is_hashing(pipe) else sum(1 for g in ngrams if g not in vec.vocabulary_)
+    return pipe.transform([doc]), len(ngrams), oov
+
+def _edited_snapshot(snap, faq_id, q, a, deleted, generation):
+    """(snapshot con la alta, cambio o baja aplicada, vector nuevo); snapshot None si se borra una FAQ ausente"""
+    if deleted:
+        return snap.without_faq(faq_id, generation), None
+    v, n_ngrams, n_oov = _vectorize_faq(snap, q, a)
+    return snap.with_faq(faq_id, q.strip(), a.strip(), v, generation, n_ngrams, n_oov), v
+
+def _apply_faq_change(faq_id, q=None, a=None, deleted=False):
+    """Aplica una alta, cambio o baja de FAQ solo sobre su fila y publica el snapshot resultante"""
+    with _index_lock:
+        _recent_edits.append((time.time(), faq_id, q, a, deleted))
+        if _pending_edits is not None:
+            # Hay una reconstrucción en curso: repetir el cambio sobre el índice nuevo
+            _pending_edits.append((faq_id, q, a, deleted))
+        old_ix = SNAPSHOT.position(faq_id)
+        new_snap, v = _edited_snapshot(SNAPSHOT, faq_id, q, a, deleted, _next_generation())
+        if new_snap is None:
+            return None
+        rows = {ix for ix in (old_ix, new_snap.position(faq_id)) if ix is not None}
+        _publish(new_snap, edited=(rows, v.indices.tolist() if v is not None else ()))
+    return v
+
+def _background_refit():
+    """Reajuste completo del índice lanzado cuando la deriva incremental es excesiva"""
+    global _refit_pending
+    try:
+        if _start_rebuild():
+            _build_thread.join()
+    finally:
+        with _index_lock:
+            _refit_pending = False
+
+def _index_faq_change(background_tasks, faq_id, q=None, a=None, deleted=False):
+    """Actualiza el índice y vector_tfidf tras un cambio en /faqs; programa un reajuste si hace falta"""
+    global _refit_pending
+    if not INCREMENTAL_INDEX:
+        return
+    v = _apply_faq_change(faq_id, q, a, deleted)
+    if v is not None or deleted:
+        _save_vector(faq_id, v)
+    _broadcast_faq_change(faq_id, deleted)
+    if SNAPSHOT.drift.exceeds(INCREMENTAL_REFIT_DRIFT):
+        # Comprobar y marcar a la vez: dos cambios simultáneos no programan dos reajustes
+        with _index_lock:
+            if _refit_pending:
+                return
+            _refit_pending = True
+        background_tasks.add_task(_background_refit)
+
+# Coordinación entre workers
+def _connect_db():
+    """Conexión propia (fuera del pool) para el bloqueo de construcción y LISTEN"""
+    return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+
+def _broadcast_faq_change(faq_id, deleted=False, collection=DEFAULT_COLLECTION):
+    """Avisa a los demás workers de un cambio en /faqs (lo aplican leyendo la FAQ de la BD)"""
+    if not COORDINATE_WORKERS:
+        return
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            notify(cursor, {"type": "faq", "id": faq_id, "deleted": deleted, "collection": collection})
+            cursor.close()
     except Exception as e:
-        # Ignorar errores en el registro de consultas
-        pass
-        
-    return {"results": results, "terms": highlight_terms}
+        SYNC_LOG.warning("no se pudo avisar del cambio de la FAQ %s: %s", faq_id, e)
+
+def _on_remote_edit(event):
+    """Aplica sobre el índice de este worker un cambio de /faqs hecho en otro"""
+    if not INCREMENTAL_INDEX:
+        return
+    faq_id = event["id"]
+    collection = event.get("collection", DEFAULT_COLLECTION)
+    if collection != DEFAULT_COLLECTION:
+        # Solo importa si la colección está cargada aquí; si no, se sincroniza con la BD al abrirla
+        if COLLECTIONS.peek(collection) is not None:
+            faq = None if event.get("deleted") else _get_faq(faq_id, collection)
+            if faq is None:
+                _apply_collection_change(collection, faq_id, deleted=True)
+            else:
+                _apply_collection_change(collection, faq_id, faq["q"], faq["a"])
+        return
+    faq = None if event.get("deleted") else _get_faq(faq_id)
+    if faq is None:
+        _apply_faq_change(faq_id, deleted=True)
+    else:
+        _apply_faq_change(faq_id, faq["q"], faq["a"])
+
+def _replay_edits(snap, edits):
+    """Repite sobre ``snap`` cambios de /faqs (id, pregunta, respuesta, borrada) en orden"""
+    for faq_id, q, a, deleted in edits:
+        snap = _edited_snapshot(snap, faq_id, q, a, deleted, snap.generation)[0] or snap
+    return snap
+
+def _load_published(version, since=None):
+    """Sirve la versión ``version`` del artefacto, construida por otro proceso; False si ya se servía"""
+    if SNAPSHOT.version == version:
+        return False
+    if BUILD_STATUS["state"] == "building":
+        # Hasta anunciar la suya, indice_publicado aún tiene la versión que esta construcción reemplaza
+        return False
+    directory = SERVING_DIR / version
+    if not (directory / "meta.json").exists():
+        SYNC_LOG.warning("la versión publicada %s no está en %s", version, SERVING_DIR)
+        return False
+    art = load_serving_index(directory)
+    snap = IndexSnapshot.build(art["vectorizer"], None, art["questions"], art["answers"], art["ids"],
+                               generation=0, engine=art["engine"], synonyms=_current_synonyms(),
+                               dense=art["dense"], version=version)
+    if SPELL_CORRECTION:
+        snap.spelling(normalize_text)
+    # Los cambios de /faqs cercanos a la lectura de las FAQs pueden no estar en el artefacto
+    cutoff = (since if since is not None else art["meta"]["created_at"]) - EDIT_REPLAY_SECONDS
+    with _index_lock:
+        if SNAPSHOT.version == version:
+            return False
+        edits = [(faq_id, q, a, deleted) for t, faq_id, q, a, deleted in _recent_edits if t >= cutoff]
+        snap = _replay_edits(snap, edits)
+        _publish(dataclasses.replace(snap, generation=_next_generation()))
+    SYNC_LOG.info("índice %s cargado (%d cambios repetidos)", version, len(edits))
+    return True
+
+def _on_remote_index(version, generation, since):
+    try:
+        _load_published(version, since)
+    except Exception as e:
+        SYNC_LOG.warning("no se pudo cargar la versión publicada %s: %s", version, e)
+
+def _announce_version(version, since, name=INDEX_NAME):
+    """Registra la versión recién construida en indice_publicado y avisa a los demás workers"""
+    if not COORDINATE_WORKERS:
+        return None
+    try:
+        with get_db_connection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            try:
+                generation = publish_version(cursor, version, since, name)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        return generation
+    except Exception as e:
+        SYNC_LOG.warning("no se pudo publicar la versión %s: %s", version, e)
+        return None
+
+def _acquire_build_lock(lock):
+    """True si este proceso puede construir (también sin BD: entonces no hay coordinación posible)"""
+    try:
+        return lock.acquire()
+    except psycopg2.Error as e:
+        SYNC_LOG.warning("sin bloqueo de construcción (la BD no responde): %s", e)
+        return True
+
+def _on_remote_collection(name, version, generation, since):
+    """Versión de una colección publicada por otro worker: se abre si la colección está cargada aquí"""
+    prefix = collection_index_name("")
+    if not name.startswith(prefix):
+        return
+    try:
+        _refresh_collection(name[len(prefix):], version)
+    except Exception as e:
+        SYNC_LOG.warning("no se pudo cargar la versión publicada %s de %s: %s", version, name, e)
+
+INDEX_LISTENER = IndexListener(_connect_db, _on_remote_index, _on_remote_edit,
+                               poll_interval=INDEX_SYNC_POLL_SECONDS, on_other=_on_remote_collection)
 
 # Endpoints CRUD para FAQs
+def _list_faqs_db(after, limit, search=None, field="all", collection=DEFAULT_COLLECTION):
+    """Página del listado leída de PostgreSQL por id (sin índice incremental que refleje los cambios)"""
+    where, params = ["coleccion = %s"], [collection]
+    if after:
+        where.append("id > %s")
+        params.append(after)
+    if search:
+        columns = {"q": ["q"], "a": ["a"], "all": ["q", "a"]}[field]
+        where.append("(" + " OR ".join(f"{c} ILIKE %s" for c in columns) + ")")
+        params.extend([f"%{search}%"] * len(columns))
+    sql = "SELECT id, q, a FROM faq WHERE " + " AND ".join(where)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql + " ORDER BY id LIMIT %s", params + [limit + 1])
+        rows = cursor.fetchall()
+        cursor.close()
+    items = [{"id": str(faq_id), "q": q, "a": a} for faq_id, q, a in rows[:limit]]
+    return items, (items[-1]["id"] if len(rows) > limit else None)
+
+def _listing_etag(snap, *params):
+    """ETag de una respuesta del listado: cambia con cada publicación del índice"""
+    key = repr((snap.generation, snap.built_at) + params).encode("utf-8")
+    return '"' + hashlib.sha1(key).hexdigest()[:20] + '"'
+
+def _not_modified(request, etag):
+    return etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+
 @app.get("/faqs")
-def list_faqs():
-    """Lista todas las FAQs disponibles"""
-    return _read_faqs()
+def list_faqs(request: Request, limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+              after: Optional[str] = None, search: Optional[str] = None, field: str = "all"):
+    """Lista las FAQs por páginas ordenadas por id (``after`` = cursor de la página anterior)"""
+    return _list_faqs(request, lambda: SNAPSHOT, limit, after, search, field)
+
+def _list_faqs(request, get_snapshot, limit, after, search, field, collection=DEFAULT_COLLECTION):
+    if field not in SEARCH_FIELDS:
+        raise HTTPException(400, f"Campo de búsqueda desconocido: {field} (opciones: {', '.join(SEARCH_FIELDS)})")
+    needle = normalize_text(search) if search else None
+    snap = get_snapshot() if INCREMENTAL_INDEX else None
+    if snap is None:
+        # Las ediciones no llegan al índice servido hasta la próxima recarga (o la colección
+        # todavía no tiene índice): leer la tabla
+        items, next_after = _list_faqs_db(after, limit, search.strip() if search else None, field, collection)
+        return {"items": items, "next": next_after, "total": None, "generation": None}
+    etag = _listing_etag(snap, limit, after, needle, field)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    items, next_after = page(snap.iter_faqs(after), limit, needle, field, snap.listing(), normalize_text)
+    body = {"items": items, "next": next_after, "total": None if needle else snap.items,
+            "generation": snap.generation}
+    return Response(json.dumps(body, ensure_ascii=False), media_type="application/json", headers=headers)
+
+def _export_rows_db():
+    """Todas las FAQs de PostgreSQL por bloques con un cursor de servidor"""
+    with get_db_connection() as conn:
+        conn.autocommit = False
+        cursor = conn.cursor(name="faq_export")
+        cursor.itersize = 5000
+        cursor.execute("SELECT id, q, a FROM faq WHERE coleccion = %s ORDER BY id", (DEFAULT_COLLECTION,))
+        for faq_id, q, a in cursor:
+            yield str(faq_id), q, a
+        cursor.close()
+        conn.rollback()
+
+def _export_json(rows):
+    """Array JSON generado fila a fila (no se arma la lista completa en memoria)"""
+    yield "["
+    for n, (faq_id, q, a) in enumerate(rows):
+        yield ("," if n else "") + json.dumps({"id": faq_id, "q": q, "a": a}, ensure_ascii=False)
+    yield "]"
+
+@app.get("/faqs/export")
+def export_faqs(request: Request):
+    """Todas las FAQs como un array JSON enviado en flujo"""
+    if not INCREMENTAL_INDEX:
+        return StreamingResponse(_export_json(_export_rows_db()), media_type="application/json")
+    snap = SNAPSHOT
+    etag = _listing_etag(snap, "export")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    rows = ((faq_id, q, a) for faq_id, _, q, a in snap.iter_faqs())
+    return StreamingResponse(_export_json(rows), media_type="application/json", headers=headers)
+
+# Búsqueda de duplicados: una a la vez por worker (cada una reparte el cálculo en DUPLICATES_WORKERS procesos)
+DUPLICATES_WORKERS = max(1, DEDUP_WORKERS // 2)
+_duplicates_lock = threading.Lock()
+
+def _duplicates(snap, directory, threshold):
+    if snap.version is None:
+        raise HTTPException(409, "El índice servido no tiene artefacto publicado; recárgalo antes")
+    if not _duplicates_lock.acquire(blocking=False):
+        raise HTTPException(409, "Ya hay una búsqueda de duplicados en curso; inténtalo cuando termine")
+    try:
+        # Las FAQs borradas o cambiadas desde la publicación no se sugieren con sus textos antiguos
+        return find_duplicates(directory / snap.version, threshold, DUPLICATES_WORKERS, exclude=snap.stale_rows())
+    except Exception as e:
+        raise HTTPException(500, f"Error al buscar duplicados: {str(e)}")
+    finally:
+        _duplicates_lock.release()
+
+@app.get("/faqs/duplicates")
+def faq_duplicates(threshold: float = Query(DEDUP_THRESHOLD, ge=0.5, le=1.0)):
+    """Grupos de FAQs casi duplicadas del índice publicado, con la fusión sugerida (ver dedup.py)"""
+    # Se analiza el artefacto publicado sin las FAQs que la capa incremental ya reemplazó;
+    # las altas y los textos nuevos posteriores entran con la próxima publicación
+    return _duplicates(SNAPSHOT, SERVING_DIR, threshold)
+
+@app.get("/faqs/{faq_id}")
+def get_faq(faq_id: str):
+    """Devuelve una FAQ por id"""
+    faq = SNAPSHOT.get_faq(faq_id) if INCREMENTAL_INDEX else _get_faq(faq_id)
+    if faq is None:
+        raise HTTPException(404, "FAQ no encontrada")
+    return {"id": str(faq["id"]), "q": faq["q"], "a": faq["a"]}
 
 @app.post("/faqs")
-def add_faq(item: FaqItem):
+def add_faq(item: FaqItem, background_tasks: BackgroundTasks):
     """Crea una nueva FAQ"""
     if not item.q or not item.a:
         raise HTTPException(400, "Formato requerido: {'q': 'pregunta', 'a': 'respuesta'}")
@@ -327,20 +1317,17 @@ def add_faq(item: FaqItem):
     # Insertar en la base de datos
     try:
         _add_faq(new_item)
-        return new_item
     except Exception as e:
         raise HTTPException(500, f"Error al crear FAQ: {str(e)}")
+    
+    _index_faq_change(background_tasks, str(new_item["id"]), new_item["q"], new_item["a"])
+    return new_item
 
 @app.put("/faqs/{faq_id}")
-def update_faq(faq_id: str, item: FaqItem):
+def update_faq(faq_id: str, item: FaqItem, background_tasks: BackgroundTasks):
     """Actualiza una FAQ existente"""
     # Verificar que la FAQ existe
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    cursor.execute("SELECT * FROM faq WHERE id = %s", (faq_id,))
-    existing_faq = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    existing_faq = _get_faq(faq_id)
     
     if not existing_faq:
         raise HTTPException(404, "FAQ no encontrada")
@@ -353,92 +1340,610 @@ def update_faq(faq_id: str, item: FaqItem):
     }
     
     if _update_faq(faq_id, update_data):
+        _index_faq_change(background_tasks, faq_id, update_data["q"], update_data["a"])
         return update_data
     else:
         raise HTTPException(500, "Error al actualizar FAQ")
 
 @app.delete("/faqs/{faq_id}")
-def delete_faq(faq_id: str):
+def delete_faq(faq_id: str, background_tasks: BackgroundTasks):
     """Elimina una FAQ"""
     # Eliminar de la base de datos
     if _delete_faq(faq_id):
+        _index_faq_change(background_tasks, faq_id, deleted=True)
         return {"deleted": faq_id}
     else:
         raise HTTPException(404, "FAQ no encontrada")
 
-@app.post("/reload")
-def reload_data():
-    """Reconstruye el índice TF-IDF en caliente sin reiniciar el servidor"""
-    global X, QUESTIONS, ANSWERS, FAQ_IDS
-    
-    # Cargar stopwords (opcional)
+# Importación masiva
+BULK_MAX_BYTES = 1024 * 1024 * 1024   # Tamaño máximo del cuerpo de /faqs/bulk
+BULK_SPOOL_BYTES = 8 * 1024 * 1024    # Parte del cuerpo que se guarda en memoria; el resto va a un fichero temporal
+
+async def _spool_body(request):
+    """Copia el cuerpo de la petición por trozos a un fichero temporal (en memoria hasta BULK_SPOOL_BYTES)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > BULK_MAX_BYTES:
+                raise HTTPException(413, f"El cuerpo supera {BULK_MAX_BYTES} bytes; usa migrate_to_postgres.py")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def _bulk_import(body, fmt, on_conflict, replace):
+    """Importa el cuerpo de /faqs/bulk (fichero binario) en una sola transacción y devuelve el informe"""
+    records = iter_records(text_stream(body), fmt)
+    with get_db_connection() as conn:
+        conn.autocommit = False
+        cursor = conn.cursor()
+        try:
+            report = import_faqs(cursor, records, on_conflict=on_conflict, replace=replace)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    return report
+
+def _rebuild_after_import():
+    """Una sola reconstrucción tras la importación (si ya hay una en curso, leyó datos anteriores: esperar y repetir)"""
+    while not _start_rebuild():
+        if _build_thread is not None:
+            _build_thread.join()
+
+@app.post("/faqs/bulk")
+async def bulk_faqs(request: Request, background_tasks: BackgroundTasks, format: Optional[str] = None,
+                    on_conflict: str = "update", replace: bool = False, rebuild: bool = True):
+    """Importa muchas FAQs (array JSON, JSONL o CSV con cabecera id,q,a) y reconstruye el índice una vez"""
+    fmt = format or detect_format(content_type=request.headers.get("content-type")) or "json"
+    if fmt not in FORMATS:
+        raise HTTPException(400, f"Formato desconocido: {fmt} (opciones: {', '.join(FORMATS)})")
+    if on_conflict not in ON_CONFLICT:
+        raise HTTPException(400, f"on_conflict desconocido: {on_conflict} (opciones: {', '.join(ON_CONFLICT)})")
+    # El cuerpo no se acumula en memoria: se lee en flujo desde el fichero temporal
+    body = await _spool_body(request)
+    try:
+        report = await run_in_threadpool(_bulk_import, body, fmt, on_conflict, replace)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"Error al leer las FAQs: {str(e)}")
+    except Exception as e:
+        raise HTTPException(500, f"Error al importar FAQs: {str(e)}")
+    finally:
+        body.close()
+    changed = report["inserted"] or report["updated"] or report["deleted"]
+    if rebuild and changed:
+        background_tasks.add_task(_rebuild_after_import)
+    report["rebuild"] = "scheduled" if rebuild and changed else "skipped"
+    return report
+
+def _write_vectors(ids, X, progress=None, since=None):
+    """Reescribe todos los vectores de vector_tfidf en una sola transacción.
+
+    Con ``since``, las FAQs cambiadas por /faqs desde ese instante (que ya no
+    están como en ``X``) se reescriben al final con el vector del índice servido.
+    """
+    with get_db_connection() as conn:
+        conn.autocommit = False
+        cursor = conn.cursor()
+        
+        # Reemplazar los vectores antiguos con COPY en formato disperso
+        write_vectors(cursor, ids, X, replace=True, progress=progress)
+        covered = _rewrite_edited_vectors(cursor, since) if since is not None else {}
+        
+        # Confirmar cambios
+        conn.commit()
+        cursor.close()
+    # Los vectores pendientes de antes de reescribir la tabla ya no hacen falta
+    with _unsaved_vectors_lock:
+        for faq_id, v in covered.items():
+            if _unsaved_vectors.get(faq_id) is v:
+                del _unsaved_vectors[faq_id]
+
+def _rewrite_edited_vectors(cursor, since):
+    """Vectores de las FAQs cambiadas desde ``since`` según el snapshot servido (borrados si ya no está).
+
+    Devuelve los vectores pendientes de guardar que quedan cubiertos: los de
+    antes de ``since`` ya están en la tabla leída y los demás se reescriben aquí.
+    """
+    # Los cambios posteriores esperan a que se confirme esta transacción para escribir su fila
+    with _index_lock:
+        snap = SNAPSHOT
+        edited = sorted({faq_id for t, faq_id, _, _, _ in _recent_edits if t >= since})
+        with _unsaved_vectors_lock:
+            covered = dict(_unsaved_vectors)
+    for faq_id in edited:
+        ix = snap.position(faq_id)
+        row = snap.engine.row_vector(ix) if ix is not None else None
+        if row is None:
+            cursor.execute("DELETE FROM vector_tfidf WHERE faq_id = %s", (faq_id,))
+        else:
+            upsert_vector(cursor, faq_id, row)
+    return covered
+
+def _dump_atomic(obj, path):
+    """Guarda un artefacto joblib reemplazando el anterior de forma atómica"""
+    tmp = path.with_name(path.name + ".tmp")
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+def _set_build(**fields):
+    global _phase_clock
+    with _build_lock:
+        if "phase" in fields:
+            # Duración de la fase que termina
+            now = time.perf_counter()
+            if _phase_clock is not None:
+                RELOAD_PHASE_SECONDS.observe(now - _phase_clock[1], _phase_clock[0])
+            _phase_clock = None if fields["phase"] in ("done", "error", "remote") else (fields["phase"], now)
+        BUILD_STATUS.update(fields)
+
+def _index_mode(snap):
+    """(modo, cubetas) del índice servido"""
+    if is_hashing(snap.pipe):
+        return "hashing", analyzer_step(snap.pipe).n_features
+    return "vocabulary", None
+
+def _scoring_mode(snap):
+    """Modo de puntuación efectivo: el configurado si el índice tiene parte densa; si no, "sparse" """
+    return SCORING_MODE if snap.dense is not None else "sparse"
+
+def _threshold(snap, threshold=None):
+    """Umbral de confianza: el de la petición o, si no trae, el del modo de puntuación efectivo"""
+    if threshold is not None:
+        return threshold
+    return {"dense": DENSE_CONFIDENCE_THRESHOLD, "hybrid": HYBRID_CONFIDENCE_THRESHOLD}.get(
+        _scoring_mode(snap), CONFIDENCE_THRESHOLD)
+
+def _load_stopwords():
+    """Stopwords en español para ajustar un índice (None si no existe el fichero)"""
     stopwords_file = Path("stopwords_es.txt")
-    stopwords_es = None
     if stopwords_file.exists():
-        stopwords_es = [w.strip() for w in stopwords_file.read_text(encoding="utf-8").splitlines() if w.strip()]
-    
-    # Leer FAQs actualizadas desde PostgreSQL
-    faqs = _read_faqs()
-    FAQ_IDS = [str(it["id"]) for it in faqs]
-    QUESTIONS = [it["q"].strip() for it in faqs]
-    ANSWERS = [it["a"].strip() for it in faqs]
-    
-    # Documento a indexar: PREGUNTA + RESPUESTA (aumenta recall)
-    raw_docs = [f"{q} {a}" for q, a in zip(QUESTIONS, ANSWERS)]
-    
-    # Preprocesar documentos
-    docs = [normalize_text(doc) for doc in raw_docs]
-    
-    # Reconstruir índice
-    # Actualizar configuración del vectorizador si hay stopwords
-    if stopwords_es:
-        pipe.named_steps['tfidf'].stop_words = stopwords_es
-    
-    # Configurar vectorizador
-    pipe.named_steps['tfidf'].lowercase = False  # Ya lo hicimos en el preprocesamiento
-    pipe.named_steps['tfidf'].preprocessor = None  # No usar preprocessor personalizado
-    pipe.named_steps['tfidf'].sublinear_tf = True
-    pipe.named_steps['tfidf'].ngram_range = (1, 3)
-    
-    # Entrenar con preguntas + respuestas preprocesadas
-    X = pipe.fit_transform(docs)
-    
-    # Guardar artefactos actualizados
-    joblib.dump({"X": X, "questions": QUESTIONS, "answers": ANSWERS, "ids": FAQ_IDS}, FAQS_PATH)
-    
-    # Actualizar vectores en la base de datos
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Limpiar vectores antiguos
-    cursor.execute("DELETE FROM vector_tfidf")
-    
-    # Insertar nuevos vectores
-    for i, faq_id in enumerate(FAQ_IDS):
-        # Serializar el vector TF-IDF usando pickle
-        vector_bytes = pickle.dumps(X[i].toarray())
-        cursor.execute(
-            "INSERT INTO vector_tfidf (faq_id, vector_data) VALUES (%s, %s)",
-            (faq_id, psycopg2.Binary(vector_bytes))
-        )
+        return [w.strip() for w in stopwords_file.read_text(encoding="utf-8").splitlines() if w.strip()]
+    return None
+
+def _current_synonyms():
+    """Vuelve a compilar los sinónimos (el fichero o la tabla pueden haber cambiado)"""
+    if SYNONYMS_FROM_DB:
+        with get_db_connection() as conn:
+            return _compile_synonyms(conn.cursor())
+    return _compile_synonyms()
+
+def _rebuild_index(mode=None):
+    """Construye un índice nuevo fuera de la ruta de consulta y lo publica con un solo intercambio"""
+    global _pending_edits
+    t0 = time.time()
+    lock = BuildLock(_connect_db) if COORDINATE_WORKERS else None
+    try:
+        if lock is not None and not _acquire_build_lock(lock):
+            # Otro worker está construyendo: este abrirá su artefacto cuando lo publique
+            with _index_lock:
+                _pending_edits = None
+            _set_build(state="idle", phase="remote", progress=1.0, finished_at=time.time(),
+                       duration=time.time() - t0, error=None)
+            return
+        
+        # Mismo modo que el índice servido salvo que se pida otro
+        served_mode, n_features = _index_mode(SNAPSHOT)
+        mode = mode or served_mode
+        if mode == "hashing" and n_features is None:
+            n_features = HASH_N_FEATURES
+        
+        stopwords_es = _load_stopwords()
+        
+        # Leer FAQs actualizadas desde PostgreSQL
+        _set_build(phase="reading", progress=0.05)
+        read_at = time.time()
+        faqs = _read_faqs()
+        faq_ids = [str(it["id"]) for it in faqs]
+        questions = [it["q"].strip() for it in faqs]
+        answers = [it["a"].strip() for it in faqs]
+        
+        # Documento a indexar: PREGUNTA + RESPUESTA (aumenta recall)
+        _set_build(phase="normalizing", progress=0.15, items=len(faqs))
+        docs = [normalize_text(f"{q} {a}") for q, a in zip(questions, answers)]
+        
+        synonyms = _current_synonyms()
+        if EXPAND_DOCUMENTS:
+            docs = [synonyms.expand(doc) for doc in docs]
+        
+        # Reconstruir índice con un pipeline nuevo (el servido no se toca)
+        _set_build(phase="fitting", progress=0.3)
+        dense = None
+        if REBUILD_IN_SUBPROCESS:
+            # El ajuste es intensivo en CPU; en otro proceso no compite por el GIL con las consultas
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                new_pipe, X = executor.submit(fit_pipeline, docs, stopwords_es, mode, n_features).result()
+                if SCORING_MODE != "sparse":
+                    _set_build(phase="fitting_dense", progress=0.5)
+                    dense = executor.submit(fit_dense, X).result()
+        else:
+            new_pipe, X = fit_pipeline(docs, stopwords_es, mode, n_features)
+            if SCORING_MODE != "sparse":
+                _set_build(phase="fitting_dense", progress=0.5)
+                dense = fit_dense(X)
+        
+        _set_build(phase="indexing", progress=0.6)
+        snap = IndexSnapshot.build(new_pipe, X, questions, answers, faq_ids, generation=0, synonyms=synonyms,
+                                   dense=dense)
+        if SPELL_CORRECTION:
+            snap.spelling(normalize_text)
+        
+        # Exportar el artefacto antes de publicar: el snapshot se sirve ya con su versión
+        _set_build(phase="exporting", progress=0.65)
+        serving_dir = publish_serving_index(SERVING_DIR, new_pipe, X, questions, answers, faq_ids, dense)
+        
+        # Publicar: aplicar los cambios de /faqs ocurridos durante la construcción y
+        # reemplazar el snapshot servido con una sola asignación
+        with _index_lock:
+            edits, _pending_edits = _pending_edits, None
+            snap = _replay_edits(snap, edits or [])
+            snap = dataclasses.replace(snap, generation=_next_generation(), version=serving_dir.name)
+            _publish(snap)
+        
+        # Guardar artefactos actualizados
+        _set_build(phase="saving", progress=0.7, generation=snap.generation)
+        _dump_atomic(new_pipe, PIPE_PATH)
+        _dump_atomic({"X": X, "questions": questions, "answers": answers, "ids": faq_ids, "dense": dense}, FAQS_PATH)
+        # Los demás workers abren esta versión en lugar de reconstruir
+        _announce_version(serving_dir.name, read_at)
+        
+        # Actualizar vectores en la base de datos
+        _set_build(phase="writing_vectors", progress=0.75)
+        # Los cambios de /faqs repetidos sobre el índice nuevo no están en X
+        _write_vectors(faq_ids, X, progress=lambda f: _set_build(progress=0.75 + 0.25 * f), since=read_at)
+        
+        # Registrar consulta para fines de auditoría
+        _log_consulta("[SYSTEM] Recarga del índice TF-IDF")
+        _set_build(state="idle", phase="done", progress=1.0, finished_at=time.time(),
+                   duration=time.time() - t0, error=None)
+        RELOAD_SECONDS.observe(time.time() - t0, "ok")
+    except Exception as e:
+        with _index_lock:
+            _pending_edits = None
+        _set_build(state="failed", phase="error", finished_at=time.time(),
+                   duration=time.time() - t0, error=str(e))
+        RELOAD_SECONDS.observe(time.time() - t0, "failed")
+    finally:
+        if lock is not None:
+            lock.release()
+
+def _start_rebuild(mode=None):
+    """Lanza la reconstrucción en segundo plano; devuelve False si ya hay una en curso"""
+    global _build_thread, _pending_edits
+    with _build_lock:
+        if BUILD_STATUS["state"] == "building":
+            return False
+        BUILD_STATUS.update(state="building", phase="queued", progress=0.0, started_at=time.time(),
+                            finished_at=None, duration=None, error=None,
+                            mode=mode or _index_mode(SNAPSHOT)[0])
+    with _index_lock:
+        # Desde aquí, los cambios en /faqs se anotan para aplicarlos al índice nuevo
+        _pending_edits = []
+    _build_thread = threading.Thread(target=_rebuild_index, args=(mode,), name="index-rebuild", daemon=True)
+    _build_thread.start()
+    return True
+
+@app.post("/reload")
+def reload_data(wait: bool = False, mode: Optional[str] = None):
+    """Reconstruye el índice TF-IDF en segundo plano sin reiniciar el servidor ni bloquear consultas"""
+    if mode is not None and mode not in INDEX_MODES:
+        raise HTTPException(400, f"Modo de índice desconocido: {mode} (opciones: {', '.join(INDEX_MODES)})")
+    started = _start_rebuild(mode)
+    if wait and _build_thread is not None:
+        _build_thread.join()
+        status = reload_status()
+        if status["state"] == "failed":
+            raise HTTPException(500, f"Error al recargar el índice: {status['error']}")
+        if status["phase"] == "remote":
+            # Lo construye otro worker; este lo abrirá al publicarse
+            return {"status": "building_elsewhere", "items": SNAPSHOT.items, "generation": SNAPSHOT.generation}
+        return {"status": "reloaded", "items": SNAPSHOT.items, "generation": SNAPSHOT.generation}
+    return {"status": "building" if started else "already_building", "items": SNAPSHOT.items,
+            "generation": SNAPSHOT.generation}
+
+@app.get("/reload/status")
+def reload_status():
+    """Estado de la reconstrucción del índice (fase, progreso, duración, error)"""
+    with _build_lock:
+        status = dict(BUILD_STATUS)
+    status["serving_generation"] = SNAPSHOT.generation
+    status["items"] = SNAPSHOT.items
+    return status
+
+# Colecciones de FAQs (faq_collections.py): /c/{colección}/... con un índice por colección
+# cargado en el primer uso; la colección DEFAULT_COLLECTION es el índice global de arriba
+COLLECTION_MIN_FAQS = 2   # El vectorizador necesita al menos dos documentos (max_df)
+_collection_refits = set()
+_collection_refits_lock = threading.Lock()
+
+def _collection_rows(collection):
+    """(id, pregunta, respuesta) actuales de una colección en la BD"""
+    return [(str(it["id"]), it["q"].strip(), it["a"].strip()) for it in _read_faqs(collection)]
+
+def _collection_edits(snap, rows):
+    """Cambios (id, pregunta, respuesta, borrada) que llevan el índice ``snap`` a las filas de la BD"""
+    current = {faq_id: (q, a) for faq_id, q, a in rows}
+    edits = [(faq_id, None, None, True) for faq_id, _, _, _ in snap.iter_faqs() if faq_id not in current]
+    for faq_id, q, a in rows:
+        faq = snap.get_faq(faq_id)
+        if faq is None or (faq["q"], faq["a"]) != (q, a):
+            edits.append((faq_id, q, a, False))
+    return edits
+
+def _build_collection(collection, rows, read_at):
+    """Ajusta el índice de una colección y lo publica en su artefacto; devuelve el snapshot (generación 0).
+
+    Si otro worker está construyendo la misma colección, el índice se sirve
+    desde memoria sin publicarlo (se abrirá el suyo cuando lo anuncie).
+    """
+    if len(rows) < COLLECTION_MIN_FAQS:
+        raise HTTPException(409, f"La colección necesita al menos {COLLECTION_MIN_FAQS} FAQs para indexarse")
+    ids, questions, answers = (list(col) for col in zip(*rows))
+    synonyms = SNAPSHOT.synonyms
+    docs = [normalize_text(f"{q} {a}") for q, a in zip(questions, answers)]
+    if EXPAND_DOCUMENTS:
+        docs = [synonyms.expand(doc) for doc in docs]
+    # Las colecciones son pequeñas frente al índice global: se ajustan en este proceso
+    pipe, X = fit_pipeline(docs, _load_stopwords())
+    dense = fit_dense(X) if SCORING_MODE != "sparse" else None
+    lock = BuildLock(_connect_db, collection_lock_key(collection)) if COORDINATE_WORKERS else None
+    if lock is not None and not _acquire_build_lock(lock):
+        return IndexSnapshot.build(pipe, X, questions, answers, ids, generation=0, synonyms=synonyms, dense=dense)
+    try:
+        serving_dir = publish_serving_index(collection_dir(SERVING_DIR, collection), pipe, X, questions, answers,
+                                            ids, dense)
+        _announce_version(serving_dir.name, read_at, collection_index_name(collection))
+    finally:
+        if lock is not None:
+            lock.release()
+    return _open_serving_index(serving_dir, synonyms)
+
+def _synced_collection(collection, directory, rows, read_at):
+    """Abre una versión del artefacto de una colección y le aplica lo que cambió después en la BD"""
+    snap = _open_serving_index(directory, SNAPSHOT.synonyms)
+    if rows is not None:
+        edits = _collection_edits(snap, rows)
+        # Demasiados cambios desde el artefacto: reajustar en lugar de acumularlos en la capa incremental
+        if len(edits) > INCREMENTAL_REFIT_DRIFT * max(snap.items, 1) and len(rows) >= COLLECTION_MIN_FAQS:
+            snap = _build_collection(collection, rows, read_at)
+        else:
+            snap = _replay_edits(snap, edits)
+    return snap
+
+def _load_collection(collection):
+    """Índice de una colección para la caché: su artefacto puesto al día o uno nuevo (None si no tiene FAQs)"""
+    read_at = time.time()
+    try:
+        rows = _collection_rows(collection)
+    except psycopg2.Error:
+        # Sin BD se sirve el artefacto tal cual
+        rows = None
+    serving_dir = current_serving_dir(collection_dir(SERVING_DIR, collection))
+    if serving_dir is not None:
+        snap = _synced_collection(collection, serving_dir, rows, read_at)
+    elif rows:
+        snap = _build_collection(collection, rows, read_at)
+    else:
+        return None
+    if SPELL_CORRECTION:
+        snap.spelling(normalize_text)
+    return dataclasses.replace(snap, generation=_next_generation())
+
+def _collection_nbytes(collection, snap):
+    """Bytes aproximados del índice de una colección: su artefacto o, si no se publicó, matriz y textos"""
+    if snap.version is not None:
+        return directory_nbytes(collection_dir(SERVING_DIR, collection) / snap.version)
+    M = snap.engine.matrix
+    # Matriz y su traspuesta (índice invertido)
+    return (2 * (M.data.nbytes + M.indices.nbytes) + M.indptr.nbytes
+            + sum(len(q) + len(a) for q, a in zip(snap.questions, snap.answers)))
+
+def _collection_gauges():
+    stats = COLLECTIONS.stats()
+    gauges = _stats_gauges(stats)
+    gauges[("loaded",)] = len(stats["loaded"])
+    return gauges
+
+COLLECTIONS = CollectionCache(_load_collection, _collection_nbytes, budget=COLLECTION_MEMORY_BUDGET)
+METRICS.gauge("faq_collections", "Índices de colección cargados (bytes, aciertos, cargas, expulsiones)", ["stat"],
+              fn=_collection_gauges)
+
+def _collection(collection, load=True):
+    """Snapshot de una colección (400 si el nombre no es válido, 404 si no tiene FAQs); sin ``load``, None si no está cargada"""
+    if not valid_collection(collection):
+        raise HTTPException(400, f"Nombre de colección no válido: {collection}")
+    snap = COLLECTIONS.get(collection) if load else COLLECTIONS.peek(collection)
+    if snap is None and load:
+        raise HTTPException(404, "Colección no encontrada")
+    return snap
+
+def _refresh_collection(collection, version):
+    """Abre ``version`` de una colección cargada aquí (la publicó otro worker)"""
+    snap = COLLECTIONS.peek(collection)
+    if snap is None or snap.version == version:
+        return
+    directory = collection_dir(SERVING_DIR, collection) / version
+    if not (directory / "meta.json").exists():
+        SYNC_LOG.warning("la versión publicada %s de la colección %s no existe", version, collection)
+        return
+    with COLLECTIONS.lock(collection):
+        read_at = time.time()
+        snap = _synced_collection(collection, directory, _collection_rows(collection), read_at)
+        if SPELL_CORRECTION:
+            snap.spelling(normalize_text)
+        COLLECTIONS.put(collection, dataclasses.replace(snap, generation=_next_generation()))
+
+def _rebuild_collection(collection):
+    """Reajusta el índice de una colección desde la BD y lo sirve; devuelve el snapshot nuevo"""
+    with COLLECTIONS.lock(collection):
+        # Con el candado de la colección tomado, sus cambios esperan a que termine
+        read_at = time.time()
+        snap = _build_collection(collection, _collection_rows(collection), read_at)
+        if SPELL_CORRECTION:
+            snap.spelling(normalize_text)
+        snap = dataclasses.replace(snap, generation=_next_generation())
+        COLLECTIONS.put(collection, snap)
+    _log_consulta(f"[SYSTEM] Recarga del índice de la colección {collection}")
+    return snap
+
+def _refit_collection(collection):
+    """Reajuste en segundo plano de una colección cuya deriva incremental es excesiva"""
+    try:
+        _rebuild_collection(collection)
+    except Exception as e:
+        SYNC_LOG.warning("no se pudo reajustar la colección %s: %s", collection, e)
+    finally:
+        with _collection_refits_lock:
+            _collection_refits.discard(collection)
+
+def _apply_collection_change(collection, faq_id, q=None, a=None, deleted=False):
+    """Aplica una alta, cambio o baja sobre el índice de la colección si está cargado (si no, no hace falta)"""
+    def apply(snap):
+        return _edited_snapshot(snap, faq_id, q, a, deleted, _next_generation())[0] or snap
+    return COLLECTIONS.update(collection, apply)
+
+def _index_collection_change(background_tasks, collection, faq_id, q=None, a=None, deleted=False):
+    """Como ``_index_faq_change``, para una colección (sus vectores no se guardan en vector_tfidf)"""
+    if not INCREMENTAL_INDEX:
+        return
+    snap = _apply_collection_change(collection, faq_id, q, a, deleted)
+    _broadcast_faq_change(faq_id, deleted, collection)
+    if snap is not None and snap.drift.exceeds(INCREMENTAL_REFIT_DRIFT):
+        with _collection_refits_lock:
+            if collection in _collection_refits:
+                return
+            _collection_refits.add(collection)
+        background_tasks.add_task(_refit_collection, collection)
+
+@app.get("/collections")
+def list_collections():
+    """Colecciones con FAQs (y cuántas tiene cada una) y estado de los índices cargados"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT coleccion, count(*) FROM faq GROUP BY coleccion ORDER BY coleccion")
+            rows = cursor.fetchall()
+            cursor.close()
+    except psycopg2.Error as e:
+        raise HTTPException(503, f"Base de datos no disponible: {str(e)}")
+    return {"collections": [{"name": name, "items": int(n)} for name, n in rows],
+            "default": DEFAULT_COLLECTION, "cache": COLLECTIONS.stats()}
+
+@app.post("/c/{collection}/ask", response_model=AskOut)
+def collection_ask(collection: str, payload: AskIn, threshold: Optional[float] = None):
+    """/ask sobre las FAQs de una colección"""
+    if collection == DEFAULT_COLLECTION:
+        return ask(payload, threshold)
+    return _ask(_collection(collection), payload, threshold)
+
+@app.post("/c/{collection}/topk", response_model=TopKOut)
+def collection_topk(collection: str, payload: AskIn, k: int = Query(5, ge=1, le=10)):
+    """/topk sobre las FAQs de una colección"""
+    if collection == DEFAULT_COLLECTION:
+        return topk(payload, k)
+    return _topk(_collection(collection), payload, k)
+
+@app.get("/c/{collection}/faqs")
+def collection_list_faqs(collection: str, request: Request,
+                         limit: int = Query(LIST_DEFAULT_LIMIT, ge=1, le=LIST_MAX_LIMIT),
+                         after: Optional[str] = None, search: Optional[str] = None, field: str = "all"):
+    """Listado paginado de las FAQs de una colección"""
+    if collection == DEFAULT_COLLECTION:
+        return list_faqs(request, limit, after, search, field)
+    _collection(collection, load=False)
     
-    # Cerrar conexión
-    conn.commit()
-    cursor.close()
-    conn.close()
+    def snapshot():
+        try:
+            return COLLECTIONS.get(collection)
+        except HTTPException:
+            # Demasiado pequeña para indexarse
+            return None
     
-    # Registrar consulta para fines de auditoría
+    return _list_faqs(request, snapshot, limit, after, search, field, collection)
+
+@app.get("/c/{collection}/faqs/duplicates")
+def collection_faq_duplicates(collection: str, threshold: float = Query(DEDUP_THRESHOLD, ge=0.5, le=1.0)):
+    """/faqs/duplicates sobre el índice publicado de una colección"""
+    if collection == DEFAULT_COLLECTION:
+        return faq_duplicates(threshold)
+    return _duplicates(_collection(collection), collection_dir(SERVING_DIR, collection), threshold)
+
+@app.get("/c/{collection}/faqs/{faq_id}")
+def collection_get_faq(collection: str, faq_id: str):
+    """Devuelve una FAQ de una colección por id"""
+    if collection == DEFAULT_COLLECTION:
+        return get_faq(faq_id)
+    snap = _collection(collection, load=False)
+    # Del índice si está cargado (refleja los cambios); si no, de la BD sin cargarlo
+    faq = snap.get_faq(faq_id) if snap is not None and INCREMENTAL_INDEX else _get_faq(faq_id, collection)
+    if faq is None:
+        raise HTTPException(404, "FAQ no encontrada")
+    return {"id": str(faq["id"]), "q": faq["q"], "a": faq["a"]}
+
+@app.post("/c/{collection}/faqs")
+def collection_add_faq(collection: str, item: FaqItem, background_tasks: BackgroundTasks):
+    """Crea una FAQ en una colección (la colección existe desde su primera FAQ)"""
+    if collection == DEFAULT_COLLECTION:
+        return add_faq(item, background_tasks)
+    _collection(collection, load=False)
+    if not item.q or not item.a:
+        raise HTTPException(400, "Formato requerido: {'q': 'pregunta', 'a': 'respuesta'}")
+    new_item = item.dict()
+    if not new_item.get("id"):
+        new_item["id"] = str(uuid.uuid4())
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO consulta (id, texto, timestamp) VALUES (%s, %s, CURRENT_TIMESTAMP)",
-            (str(uuid.uuid4()), "[SYSTEM] Recarga del índice TF-IDF")
-        )
-        cursor.close()
-        conn.close()
-    except Exception:
-        # Ignorar errores en el registro de auditoría
-        pass
-    
-    return {"status": "reloaded", "items": len(QUESTIONS)}
+        _add_faq(new_item, collection)
+    except Exception as e:
+        raise HTTPException(500, f"Error al crear FAQ: {str(e)}")
+    _index_collection_change(background_tasks, collection, str(new_item["id"]), new_item["q"], new_item["a"])
+    return new_item
+
+@app.put("/c/{collection}/faqs/{faq_id}")
+def collection_update_faq(collection: str, faq_id: str, item: FaqItem, background_tasks: BackgroundTasks):
+    """Actualiza una FAQ de una colección"""
+    if collection == DEFAULT_COLLECTION:
+        return update_faq(faq_id, item, background_tasks)
+    _collection(collection, load=False)
+    existing_faq = _get_faq(faq_id, collection)
+    if not existing_faq:
+        raise HTTPException(404, "FAQ no encontrada")
+    update_data = {"q": item.q or existing_faq["q"], "a": item.a or existing_faq["a"], "id": faq_id}
+    if not _update_faq(faq_id, update_data, collection):
+        raise HTTPException(500, "Error al actualizar FAQ")
+    _index_collection_change(background_tasks, collection, faq_id, update_data["q"], update_data["a"])
+    return update_data
+
+@app.delete("/c/{collection}/faqs/{faq_id}")
+def collection_delete_faq(collection: str, faq_id: str, background_tasks: BackgroundTasks):
+    """Elimina una FAQ de una colección"""
+    if collection == DEFAULT_COLLECTION:
+        return delete_faq(faq_id, background_tasks)
+    _collection(collection, load=False)
+    if not _delete_faq(faq_id, collection):
+        raise HTTPException(404, "FAQ no encontrada")
+    _index_collection_change(background_tasks, collection, faq_id, deleted=True)
+    return {"deleted": faq_id}
+
+@app.post("/c/{collection}/reload")
+def collection_reload(collection: str, wait: bool = False, mode: Optional[str] = None):
+    """Reconstruye el índice de una colección (síncrono; la colección por defecto, como /reload)"""
+    if collection == DEFAULT_COLLECTION:
+        return reload_data(wait, mode)
+    _collection(collection, load=False)
+    if mode not in (None, "vocabulary"):
+        raise HTTPException(400, "Los índices de colección usan el modo vocabulary")
+    try:
+        snap = _rebuild_collection(collection)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error al recargar el índice de la colección: {str(e)}")
+    return {"status": "reloaded", "collection": collection, "items": snap.items, "generation": snap.generation,
+            "version": snap.version}
@@ -0,0 +1,262 @@
+# Utilidades compartidas de las pruebas de rendimiento: directorio de trabajo
+# con los artefactos del índice, base de datos sustituta en memoria,
+# percentiles y escritura de resultados en JSON etiquetados con el commit.
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+def git_commit():
+    """(hash del commit, True si hay cambios sin confirmar); (None, None) fuera de git"""
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return head, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def environment():
+    import scipy
+    import sklearn
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def summarize(name, samples, size=None, **extra):
+    """Registro de resultados: percentiles en milisegundos y operaciones por segundo"""
+    s = np.asarray(samples, dtype=np.float64) * 1000.0
+    total = float(s.sum()) / 1000.0
+    record = {
+        "bench": name,
+        "size": size,
+        "count": int(len(s)),
+        "mean_ms": float(s.mean()) if len(s) else None,
+        "p50_ms": float(np.percentile(s, 50)) if len(s) else None,
+        "p95_ms": float(np.percentile(s, 95)) if len(s) else None,
+        "p99_ms": float(np.percentile(s, 99)) if len(s) else None,
+        "max_ms": float(s.max()) if len(s) else None,
+        "ops_per_s": len(s) / total if total > 0 else None,
+    }
+    record.update(extra)
+    return record
+
+
+def write_results(kind, config, results, out=None):
+    """Guarda los resultados en benchmarks/results/<tipo>-<commit>-<fecha>.json (o en ``out``)"""
+    env = environment()
+    if out is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        commit = (env["commit"] or "nogit")[:10] + ("-dirty" if env["dirty"] else "")
+        out = RESULTS_DIR / f"{kind}-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    payload = {"kind": kind, "created_at": time.time(), "env": env, "config": config, "results": results}
+    Path(out).write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return Path(out)
+
+
+def print_table(results):
+    cols = ["bench", "size", "count", "p50_ms", "p95_ms", "p99_ms", "ops_per_s"]
+    widths = [22] + [12] * (len(cols) - 1)
+    print(" ".join(f"{c:>{w}}" for c, w in zip(cols, widths)))
+    for r in results:
+        cells = []
+        for c, w in zip(cols, widths):
+            v = r.get(c)
+            cells.append(f"{v:>{w}.3f}" if isinstance(v, float) else f"{str(v):>{w}}")
+        print(" ".join(cells))
+
+
+class MemoryStore:
+    """Sustituto en memoria de las tablas faq, vector_tfidf y consulta.
+
+    Reemplaza las funciones de acceso a datos de api.py cuando no hay
+    PostgreSQL, para medir la API sin la latencia de la base de datos.
+    """
+
+    def __init__(self, faqs):
+        self._lock = threading.Lock()
+        self.faqs = {str(faq_id): {"id": str(faq_id), "q": q, "a": a} for faq_id, q, a in faqs}
+        self.vectors = {}
+        self.consultas = 0
+
+    def read_faqs(self):
+        with self._lock:
+            return [dict(f) for f in self.faqs.values()]
+
+    def get_faq(self, faq_id):
+        with self._lock:
+            faq = self.faqs.get(str(faq_id))
+            return dict(faq) if faq else None
+
+    def add_faq(self, item):
+        with self._lock:
+            self.faqs[str(item["id"])] = {"id": str(item["id"]), "q": item["q"], "a": item["a"]}
+        return item["id"]
+
+    def update_faq(self, faq_id, item):
+        with self._lock:
+            if str(faq_id) not in self.faqs:
+                return False
+            self.faqs[str(faq_id)].update(q=item["q"], a=item["a"])
+        return True
+
+    def delete_faq(self, faq_id):
+        with self._lock:
+            self.vectors.pop(str(faq_id), None)
+            return self.faqs.pop(str(faq_id), None) is not None
+
+    def log_consulta(self, texto, score=None, faq_id=None):
+        with self._lock:
+            self.consultas += 1
+
+    def log_consultas(self, rows):
+        with self._lock:
+            self.consultas += len(rows)
+
+    def store_vector(self, faq_id, v):
+        with self._lock:
+            self.vectors[str(faq_id)] = v
+
+    def write_vectors(self, ids, X, progress=None):
+        with self._lock:
+            self.vectors = {str(faq_id): None for faq_id in ids}
+        if progress:
+            progress(1.0)
+
+    def install(self, api):
+        """Sustituye en ``api`` las funciones que usan PostgreSQL"""
+        api._read_faqs = self.read_faqs
+        api._get_faq = self.get_faq
+        api._add_faq = self.add_faq
+        api._update_faq = self.update_faq
+        api._delete_faq = self.delete_faq
+        api._log_consulta = self.log_consulta
+        api._log_consultas = self.log_consultas
+        api._store_vector = self.store_vector
+        api._write_vectors = self.write_vectors
+
+
+def postgres_available():
+    """True si la base configurada en train_index.py acepta conexiones"""
+    import psycopg2
+    import train_index
+
+    try:
+        conn = psycopg2.connect(dbname=train_index.DB_NAME, user=train_index.DB_USER,
+                                password=train_index.DB_PASSWORD, host=train_index.DB_HOST,
+                                port=train_index.DB_PORT, connect_timeout=2)
+    except psycopg2.Error:
+        return False
+    conn.close()
+    return True
+
+
+def read_postgres_faqs():
+    """FAQs actuales de PostgreSQL (solo lectura)"""
+    import psycopg2
+    import train_index
+
+    conn = psycopg2.connect(dbname=train_index.DB_NAME, user=train_index.DB_USER,
+                            password=train_index.DB_PASSWORD, host=train_index.DB_HOST,
+                            port=train_index.DB_PORT)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, q, a FROM faq")
+        return [(str(faq_id), q.strip(), a.strip()) for faq_id, q, a in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def resolve_db(mode):
+    """'auto' usa PostgreSQL si responde y si no el sustituto en memoria"""
+    if mode == "auto":
+        return "postgres" if postgres_available() else "standin"
+    return mode
+
+
+def build_artifacts(faqs, workdir):
+    """Ajusta el índice como train_index.py y escribe joblib y artefacto de servicio en ``workdir``.
+
+    Devuelve el pipeline, la matriz y los tiempos de cada fase en segundos.
+    """
+    import joblib
+    import train_index
+    from retrieval import RetrievalEngine
+    from serving_index import publish_serving_index
+
+    workdir = Path(workdir)
+    ids = [f[0] for f in faqs]
+    questions = [f[1] for f in faqs]
+    answers = [f[2] for f in faqs]
+    timings = {}
+    t = time.perf_counter()
+    docs = train_index.preprocess_text([f"{q} {a}" for q, a in zip(questions, answers)])
+    timings["preprocess"] = time.perf_counter() - t
+    t = time.perf_counter()
+    pipe = train_index.build_pipeline(train_index.load_stopwords())
+    X = pipe.fit_transform(docs)
+    timings["fit_transform"] = time.perf_counter() - t
+    t = time.perf_counter()
+    RetrievalEngine(X)
+    timings["engine"] = time.perf_counter() - t
+    t = time.perf_counter()
+    joblib.dump(pipe, workdir / train_index.PIPE_PATH)
+    joblib.dump({"X": X, "questions": questions, "answers": answers, "ids": ids}, workdir / train_index.FAQS_PATH)
+    publish_serving_index(workdir / train_index.SERVING_DIR, pipe, X, questions, answers, ids)
+    timings["save"] = time.perf_counter() - t
+    return pipe, X, timings
+
+
+def prepare_workspace(faqs, workdir=None):
+    """Directorio de trabajo aislado con stopwords, sinónimos y los artefactos de ``faqs``.
+
+    api.py usa rutas relativas, así que se cambia el directorio actual a
+    este para no tocar los artefactos del repositorio.
+    """
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="defensaia-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    for name in ("stopwords_es.txt", "sinonimos.txt"):
+        if (REPO_ROOT / name).exists():
+            shutil.copy(REPO_ROOT / name, workdir / name)
+    os.chdir(workdir)
+    _, _, timings = build_artifacts(faqs, workdir)
+    return workdir, timings
+
+
+def load_api(faqs, db_mode, workdir=None):
+    """Importa api.py sobre un directorio de trabajo con ``faqs``; instala el sustituto si hace falta"""
+    workdir, timings = prepare_workspace(faqs, workdir)
+    import api
+
+    store = None
+    if db_mode == "standin":
+        store = MemoryStore(faqs)
+        store.install(api)
+    return api, store, workdir, timings
@@ -0,0 +1,35 @@
+# Compara dos ficheros de resultados (p. ej. de dos commits distintos).
+#
+#   python -m benchmarks.compare results/micro-aaa.json results/micro-bbb.json
+import argparse
+import json
+from pathlib import Path
+
+
+def _index(path):
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return data, {(r["bench"], r["size"]): r for r in data["results"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dos ejecuciones de benchmarks")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p50_ms", help="métrica a comparar (p50_ms, p95_ms, p99_ms, mean_ms)")
+    args = parser.parse_args(argv)
+
+    base, base_rows = _index(args.base)
+    new, new_rows = _index(args.new)
+    print(f"base: {(base['env'].get('commit') or '?')[:10]}  nuevo: {(new['env'].get('commit') or '?')[:10]}"
+          f"  métrica: {args.metric}")
+    print(f"{'bench':>20} {'size':>9} {'base':>12} {'nuevo':>12} {'cambio':>9}")
+    for key in sorted(base_rows.keys() & new_rows.keys(), key=lambda k: (k[0], k[1] or 0)):
+        a, b = base_rows[key][args.metric], new_rows[key][args.metric]
+        if a is None or b is None:
+            continue
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "-"
+        print(f"{key[0]:>20} {str(key[1]):>9} {a:>12.3f} {b:>12.3f} {change:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Corpus sintético de FAQs en español para las pruebas de rendimiento.
+#
+# Parte de las preguntas reales de importar_preguntas.sql y genera variantes
+# deterministas (misma semilla = mismo corpus) combinando preguntas,
+# fragmentos de respuestas y referencias normativas, de modo que el
+# vocabulario crece con el tamaño como en un corpus real. Se generan de una
+# en una, así que 1M de entradas no necesita tenerlas todas en memoria.
+#
+#   python -m benchmarks.corpus --size 100000 --out corpus.jsonl
+import argparse
+import json
+import random
+import re
+import sys
+import uuid
+from pathlib import Path
+
+SEED_SQL = Path(__file__).resolve().parent.parent / "importar_preguntas.sql"
+
+_PAIR_RE = re.compile(r"\(gen_random_uuid\(\), '((?:[^']|'')*)', '((?:[^']|'')*)'\)")
+
+PREFIXES = [
+    "", "", "", "En mi caso, ", "Como funcionario eventual, ", "Para el personal de planta, ",
+    "Según el reglamento interno, ", "Si estoy en comisión, ", "Durante la gestión actual, ",
+    "Como servidor público nuevo, ", "Para un consultor de línea, ",
+]
+QUALIFIERS = [
+    "", "", "en la oficina central", "en las oficinas departamentales", "durante el receso legislativo",
+    "para el personal eventual", "en caso de emergencia sanitaria", "en la gestión {year}",
+    "según la resolución administrativa {code}", "con el formulario {form}",
+    "en la unidad de {unit}", "para trámites en {city}",
+]
+UNITS = ["recursos humanos", "contabilidad", "archivo", "sistemas", "asesoría legal", "transparencia",
+         "comunicación", "presupuestos", "activos fijos", "servicios generales", "auditoría interna"]
+CITIES = ["La Paz", "El Alto", "Cochabamba", "Santa Cruz", "Sucre", "Oruro", "Potosí", "Tarija",
+          "Trinidad", "Cobija"]
+OFF_TOPIC = [
+    "receta de pan casero", "resultado del partido de ayer", "clima para mañana",
+    "mejor película del año", "cómo cambiar la llanta de un auto", "precio del dólar hoy",
+]
+
+
+def load_seed_faqs(path=SEED_SQL):
+    """Pares (pregunta, respuesta) del script de importación"""
+    sql = Path(path).read_text(encoding="utf-8")
+    return [(q.replace("''", "'").strip(), a.replace("''", "'").strip()) for q, a in _PAIR_RE.findall(sql)]
+
+
+def _sentences(text):
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+
+
+def _fill(template, rng, i):
+    return template.format(
+        year=rng.randint(2015, 2030),
+        code=f"RA-{rng.randint(1, 999):03d}/{rng.randint(2015, 2030)}",
+        form=f"F-{i % 5000:04d}",
+        unit=rng.choice(UNITS),
+        city=rng.choice(CITIES),
+    )
+
+
+def generate_faqs(size, seed=0, seeds=None):
+    """Genera ``size`` FAQs (id, pregunta, respuesta); las primeras son las originales"""
+    seeds = seeds or load_seed_faqs()
+    rng = random.Random(seed)
+    for i in range(size):
+        faq_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        if i < len(seeds):
+            q, a = seeds[i]
+            yield faq_id, q, a
+            continue
+        q, a = rng.choice(seeds)
+        _, other = rng.choice(seeds)
+        body = q.strip("¿?").strip()
+        prefix = rng.choice(PREFIXES)
+        if prefix:
+            body = body[0].lower() + body[1:]
+        qualifier = _fill(rng.choice(QUALIFIERS), rng, i)
+        question = f"¿{prefix}{body}{' ' + qualifier if qualifier else ''}?"
+        extra = rng.choice(_sentences(other) or [other])
+        answer = f"{a} {extra} Referencia: {_fill('resolución administrativa {code}', rng, i)}."
+        yield faq_id, question, answer
+
+
+def generate_queries(count, seed=1, seeds=None, off_topic=0.1):
+    """Consultas de usuario derivadas de las preguntas semilla (con ruido y algunas fuera de tema)"""
+    seeds = seeds or load_seed_faqs()
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < off_topic:
+            queries.append(rng.choice(OFF_TOPIC))
+            continue
+        words = rng.choice(seeds)[0].strip("¿?").split()
+        if len(words) > 3 and rng.random() < 0.5:
+            del words[rng.randrange(len(words))]
+        if rng.random() < 0.3:
+            words.append(rng.choice(UNITS))
+        query = " ".join(words)
+        queries.append(query.lower() if rng.random() < 0.5 else query)
+    return queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un corpus sintético de FAQs en JSONL")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="fichero JSONL de salida (por defecto, salida estándar)")
+    args = parser.parse_args(argv)
+    out = args.out.open("w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for faq_id, q, a in generate_faqs(args.size, args.seed):
+            out.write(json.dumps({"id": faq_id, "q": q, "a": a}, ensure_ascii=False) + "\n")
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Compara el índice denso (LSA) y el híbrido con el coseno TF-IDF exacto.
+#
+#   python -m benchmarks.dense --sizes 1000,10000,100000 --components 128,256 --alphas 0.3,0.5
+#
+# Para cada tamaño ajusta el pipeline de vocabulario y, por cada dimensión,
+# la SVD truncada. Mide el tiempo de ajuste, la memoria de la matriz densa,
+# la latencia de puntuación por consulta (sin contar la vectorización) y el
+# acuerdo con el modo disperso: top-1 igual y recall@k.
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import REPO_ROOT, print_table, summarize, write_results
+from benchmarks.corpus import generate_faqs, generate_queries
+
+
+def _score_all(search, vectors, k):
+    samples, tops = [], []
+    for v in vectors:
+        t = time.perf_counter()
+        idx, _ = search(v, k)
+        samples.append(time.perf_counter() - t)
+        tops.append(np.asarray(idx).tolist())
+    return samples, tops
+
+
+def _agreement(exact, other):
+    top1 = np.mean([a[:1] == b[:1] for a, b in zip(exact, other)])
+    recall = np.mean([len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(exact, other)])
+    return float(top1), float(recall)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice denso e híbrido frente al coseno TF-IDF")
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--components", default="128,256", help="dimensiones del índice denso a probar")
+    parser.add_argument("--alphas", default="0.3,0.5", help="pesos de la parte densa en el modo híbrido")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    os.chdir(REPO_ROOT)  # stopwords_es.txt y sinonimos.txt con rutas relativas
+    import train_index
+    from dense_index import fit_dense, hybrid_search
+    from retrieval import RetrievalEngine
+    from synonyms import compile_synonyms
+
+    synonyms = compile_synonyms(lambda text: train_index.preprocess_text([text])[0])
+    queries = [synonyms.expand(q) for q in train_index.preprocess_text(generate_queries(args.queries, seed=args.seed + 1))]
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        faqs = list(generate_faqs(size, seed=args.seed))
+        docs = train_index.preprocess_text([f"{q} {a}" for _, q, a in faqs])
+        pipe = train_index.build_pipeline(train_index.load_stopwords())
+        X = pipe.fit_transform(docs)
+        vectors = [pipe.transform([q]) for q in queries]
+
+        engine = RetrievalEngine(X)
+        samples, exact = _score_all(engine.search, vectors, args.k)
+        results.append(summarize("sparse.score", samples, size, fit_s=0.0, matrix_bytes=int(engine.matrix.data.nbytes)))
+
+        for dim in (int(c) for c in args.components.split(",")):
+            t = time.perf_counter()
+            dense = fit_dense(X, dim, seed=args.seed)
+            fit_s = time.perf_counter() - t
+            samples, tops = _score_all(lambda v, k: dense.search(dense.project(v)[0], k), vectors, args.k)
+            top1, recall = _agreement(exact, tops)
+            results.append(summarize(f"dense{dense.dim}.score", samples, size, fit_s=fit_s,
+                                     matrix_bytes=int(dense.matrix.nbytes + dense.term_vectors.nbytes),
+                                     top1_agreement=top1, recall_at_k=recall, k=args.k))
+            for alpha in (float(a) for a in args.alphas.split(",")):
+                samples, tops = _score_all(lambda v, k: hybrid_search(engine, dense, v, k, alpha), vectors, args.k)
+                top1, recall = _agreement(exact, tops)
+                results.append(summarize(f"hybrid{dense.dim}a{alpha:g}.score", samples, size, fit_s=fit_s,
+                                         matrix_bytes=int(dense.matrix.nbytes + dense.term_vectors.nbytes),
+                                         top1_agreement=top1, recall_at_k=recall, k=args.k))
+        print(f"corpus {size}: listo")
+
+    print_table(results)
+    print(f"{'bench':>22} {'size':>8} {'matrix_MB':>10} {'fit_s':>8} {'top1':>6} {'recall@k':>9}")
+    for r in results:
+        print(f"{r['bench']:>22} {r['size']:>8} {r['matrix_bytes'] / 1e6:>10.2f} {r['fit_s']:>8.2f} "
+              f"{r.get('top1_agreement', 1.0):>6.3f} {r.get('recall_at_k', 1.0):>9.3f}")
+    path = write_results("dense", vars(args), results, args.out)
+    print(f"Resultados: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Compara el modo hashing con el vocabulario exacto sobre el mismo corpus.
+#
+#   python -m benchmarks.hashing --sizes 1000,10000,100000 --features 262144,1048576
+#
+# Para cada tamaño ajusta ambos pipelines y mide el tamaño serializado, el
+# tiempo de ajuste, la vectorización de consultas y el acuerdo de
+# resultados: top-1 igual al del modo exacto y recall@k (fracción del top-k
+# exacto que también devuelve el modo hashing).
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+
+from benchmarks.common import REPO_ROOT, print_table, summarize, write_results
+from benchmarks.corpus import generate_faqs, generate_queries
+
+
+def _fit(train_index, docs, mode, n_features=None):
+    pipe = train_index.build_pipeline(train_index.load_stopwords(), mode, n_features or train_index.HASH_N_FEATURES)
+    t = time.perf_counter()
+    X = pipe.fit_transform(docs)
+    return pipe, X, time.perf_counter() - t
+
+
+def _search_all(pipe, engine, queries, k):
+    samples, tops = [], []
+    for q in queries:
+        t = time.perf_counter()
+        idx, _ = engine.search(pipe.transform([q]), k)
+        samples.append(time.perf_counter() - t)
+        tops.append(idx.tolist())
+    return samples, tops
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modo hashing frente a vocabulario exacto")
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--features", default="262144,1048576", help="cubetas del modo hashing a probar")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    os.chdir(REPO_ROOT)  # stopwords_es.txt y sinonimos.txt con rutas relativas
+    import train_index
+    from retrieval import RetrievalEngine
+    from synonyms import compile_synonyms
+
+    synonyms = compile_synonyms(lambda text: train_index.preprocess_text([text])[0])
+    queries = [synonyms.expand(q) for q in train_index.preprocess_text(generate_queries(args.queries, seed=args.seed + 1))]
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        faqs = list(generate_faqs(size, seed=args.seed))
+        docs = train_index.preprocess_text([f"{q} {a}" for _, q, a in faqs])
+
+        pipe, X, fit_s = _fit(train_index, docs, "vocabulary")
+        engine = RetrievalEngine(X)
+        samples, exact = _search_all(pipe, engine, queries, args.k)
+        results.append(summarize("vocabulary.query", samples, size, fit_s=fit_s, features=X.shape[1],
+                                 pipe_bytes=len(pickle.dumps(pipe)), nnz=int(X.nnz)))
+
+        for n_features in (int(f) for f in args.features.split(",")):
+            hpipe, HX, fit_s = _fit(train_index, docs, "hashing", n_features)
+            hengine = RetrievalEngine(HX)
+            samples, hashed = _search_all(hpipe, hengine, queries, args.k)
+            top1 = np.mean([a[:1] == b[:1] for a, b in zip(exact, hashed)])
+            recall = np.mean([len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(exact, hashed)])
+            results.append(summarize(f"hashing{n_features}.query", samples, size, fit_s=fit_s,
+                                     features=n_features, pipe_bytes=len(pickle.dumps(hpipe)),
+                                     nnz=int(HX.nnz), top1_agreement=float(top1),
+                                     recall_at_k=float(recall), k=args.k))
+        print(f"corpus {size}: listo")
+
+    print_table(results)
+    print(f"{'bench':>22} {'size':>8} {'pipe_MB':>9} {'fit_s':>8} {'top1':>6} {'recall@k':>9}")
+    for r in results:
+        print(f"{r['bench']:>22} {r['size']:>8} {r['pipe_bytes'] / 1e6:>9.2f} {r['fit_s']:>8.2f} "
+              f"{r.get('top1_agreement', 1.0):>6.3f} {r.get('recall_at_k', 1.0):>9.3f}")
+    path = write_results("hashing", vars(args), results, args.out)
+    print(f"Resultados: {path}")
+
+
+if __name__ == "__main__":
+    main()
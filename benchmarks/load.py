@@ -0,0 +1,116 @@
+# Prueba de carga HTTP en proceso contra la aplicación FastAPI de api.py.
+#
+#   python -m benchmarks.load --size 10000 --concurrency 16 --requests 5000
+#   python -m benchmarks.load --db postgres --mix ask=5,topk=3,answer=1,faqs=1
+#
+# Las peticiones pasan por toda la pila ASGI (validación, serialización,
+# middleware) sin red, con httpx.ASGITransport. Con --db standin (o auto sin
+# PostgreSQL) el acceso a datos se sustituye por un almacén en memoria; con
+# --db postgres se usan las FAQs y la tabla consulta reales.
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.common import (load_api, print_table, read_postgres_faqs, resolve_db, summarize,
+                               write_results)
+from benchmarks.corpus import generate_faqs, generate_queries
+
+ENDPOINTS = {
+    "ask": ("POST", "/ask"),
+    "topk": ("POST", "/topk?k=5"),
+    "answer": ("POST", "/answer?k=3"),
+    "faqs": ("GET", "/faqs"),
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"endpoint desconocido: {name} (opciones: {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def _worker(client, plan, queries, samples, errors):
+    while plan:
+        name, qi = plan.pop()
+        method, path = ENDPOINTS[name]
+        t = time.perf_counter()
+        try:
+            if method == "GET":
+                r = await client.get(path)
+            else:
+                r = await client.post(path, json={"query": queries[qi % len(queries)]})
+            ok = r.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - t
+        if ok:
+            samples[name].append(elapsed)
+        else:
+            errors[name] += 1
+
+
+async def run_load(app, mix, queries, total, concurrency, seed=0):
+    """Lanza ``total`` peticiones repartidas según ``mix`` con ``concurrency`` clientes"""
+    rng = random.Random(seed)
+    names = list(mix)
+    plan = [(name, i) for i, name in enumerate(rng.choices(names, weights=[mix[n] for n in names], k=total))]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t = time.perf_counter()
+        await asyncio.gather(*(_worker(client, plan, queries, samples, errors) for _ in range(concurrency)))
+        wall = time.perf_counter() - t
+    return samples, errors, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga HTTP en proceso de api.py")
+    parser.add_argument("--size", type=int, default=1000, help="FAQs del corpus sintético (solo con standin)")
+    parser.add_argument("--db", choices=["auto", "standin", "postgres"], default="auto")
+    parser.add_argument("--mix", default="ask=6,topk=3,faqs=1", help="pesos por endpoint, p. ej. ask=6,topk=3,faqs=1")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct-queries", type=int, default=1000,
+                        help="consultas distintas (menos = más aciertos de caché)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="directorio de trabajo (por defecto, uno temporal)")
+    parser.add_argument("--out", help="fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    db = resolve_db(args.db)
+    faqs = read_postgres_faqs() if db == "postgres" else list(generate_faqs(args.size, seed=args.seed))
+    api, _, _, _ = load_api(faqs, db, args.workdir)
+    mix = parse_mix(args.mix)
+    queries = generate_queries(args.distinct_queries, seed=args.seed + 1)
+
+    if args.warmup:
+        asyncio.run(run_load(api.app, mix, queries, args.warmup, args.concurrency, seed=args.seed + 2))
+    api.QUERY_CACHE.clear()
+    samples, errors, wall = asyncio.run(run_load(api.app, mix, queries, args.requests, args.concurrency,
+                                                 seed=args.seed))
+
+    size = len(faqs)
+    results = [summarize(f"http.{name}", s, size, errors=errors[name]) for name, s in samples.items()]
+    done = sum(len(s) for s in samples.values())
+    overall = summarize("http.all", [x for s in samples.values() for x in s], size,
+                        errors=sum(errors.values()), wall_s=wall)
+    overall["throughput_rps"] = done / wall if wall > 0 else None
+    results.append(overall)
+    print_table(results)
+    print(f"Rendimiento: {overall['throughput_rps']:.1f} peticiones/s con {args.concurrency} clientes ({db})")
+    config = dict(vars(args), db_resolved=db, cache=api.QUERY_CACHE.stats())
+    path = write_results("load", config, results, args.out)
+    print(f"Resultados: {path}")
+
+
+if __name__ == "__main__":
+    main()
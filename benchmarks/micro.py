@@ -0,0 +1,94 @@
+# Microbenchmarks de las etapas de una consulta y de la construcción del índice.
+#
+#   python -m benchmarks.micro --sizes 100,1000,10000 --queries 500
+#
+# Para cada tamaño de corpus mide la construcción (como train_index.py) y,
+# consulta a consulta, normalize_text, expand_query, la vectorización
+# (pipeline de sklearn y vectorizador mapeado en memoria), la puntuación
+# (índice invertido, exhaustiva y por lotes) y la respuesta completa de /answer.
+import argparse
+import time
+
+import joblib
+
+from benchmarks.common import (build_artifacts, load_api, print_table, summarize, write_results)
+from benchmarks.corpus import generate_faqs, generate_queries
+
+
+def _time_each(fn, items):
+    samples = []
+    out = []
+    for item in items:
+        t = time.perf_counter()
+        out.append(fn(item))
+        samples.append(time.perf_counter() - t)
+    return samples, out
+
+
+def run_size(api, faqs, queries, workdir, timings=None, k=5):
+    from index_snapshot import IndexSnapshot
+    from serving_index import current_serving_dir, load_serving_index
+
+    size = len(faqs)
+    results = []
+    if timings is None:
+        _, _, timings = build_artifacts(faqs, workdir)
+    for phase, seconds in timings.items():
+        results.append(summarize(f"build.{phase}", [seconds], size))
+
+    art = load_serving_index(current_serving_dir(workdir / api.SERVING_DIR))
+    pipe = joblib.load(workdir / api.PIPE_PATH)
+    synonyms = api.SNAPSHOT.synonyms
+    snap = IndexSnapshot.build(art["vectorizer"], None, art["questions"], art["answers"], art["ids"],
+                               generation=0, engine=art["engine"], synonyms=synonyms)
+
+    samples, normalized = _time_each(api.normalize_text, queries)
+    results.append(summarize("normalize_text", samples, size))
+    samples, expanded = _time_each(lambda q: api.expand_query(q, synonyms), queries)
+    results.append(summarize("expand_query", samples, size))
+    processed = [api.normalize_text(q) for q in expanded]
+    samples, _ = _time_each(lambda q: pipe.transform([q]), processed)
+    results.append(summarize("transform.sklearn", samples, size))
+    samples, vectors = _time_each(lambda q: snap.pipe.transform([q]), processed)
+    results.append(summarize("transform.mmap", samples, size))
+    samples, _ = _time_each(lambda v: snap.engine.search(v, k), vectors)
+    results.append(summarize("score.inverted", samples, size, k=k))
+    samples, _ = _time_each(lambda v: snap.engine.search_brute(v, k), vectors)
+    results.append(summarize("score.brute", samples, size, k=k))
+    V = snap.pipe.transform(processed)
+    t = time.perf_counter()
+    snap.engine.best_batch(V)
+    results.append(summarize("score.batch", [time.perf_counter() - t], size, queries=len(processed)))
+    samples, _ = _time_each(lambda q: api._answer_result(snap, q, 3, api.CONFIDENCE_THRESHOLD), queries)
+    results.append(summarize("answer.end_to_end", samples, size))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks del servicio de FAQs")
+    parser.add_argument("--sizes", default="100,1000,10000", help="tamaños del corpus separados por comas")
+    parser.add_argument("--queries", type=int, default=500, help="consultas por tamaño")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="directorio de trabajo (por defecto, uno temporal)")
+    parser.add_argument("--out", help="fichero JSON de resultados")
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    queries = generate_queries(args.queries, seed=args.seed + 1)
+    api = None
+    results = []
+    for size in sizes:
+        faqs = list(generate_faqs(size, seed=args.seed))
+        timings = None
+        if api is None:
+            # El primer tamaño también prepara el directorio de trabajo e importa api.py
+            api, _, workdir, timings = load_api(faqs, "standin", args.workdir)
+        results.extend(run_size(api, faqs, queries, workdir, timings))
+        print(f"corpus {size}: listo")
+    print_table(results)
+    path = write_results("micro", vars(args), results, args.out)
+    print(f"Resultados: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.pool
+
+
+class PoolTimeout(Exception):
+    """No hubo conexiones libres en el pool dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """Pool de conexiones PostgreSQL con límite de tamaño, chequeo de salud y estadísticas.
+
+    Envuelve ``psycopg2.pool.ThreadedConnectionPool`` añadiendo una espera
+    acotada cuando el pool está saturado (en lugar de fallar de inmediato),
+    verificación de conexiones inactivas antes de entregarlas y contadores
+    para dimensionar ``minconn``/``maxconn``. Si se pasa ``observe``, se
+    llama con ("acquire", segundos) al entregar una conexión y con
+    ("hold", segundos) al devolverla, para exportar sus distribuciones.
+    """
+
+    def __init__(self, minconn, maxconn, acquire_timeout=5.0, healthcheck_idle=30.0, observe=None,
+                 **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_idle = healthcheck_idle
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._checked_out = {}
+        self._observe = observe
+        self._closed = False
+        # Contadores para /pool/stats
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.discarded = 0
+
+    def _healthy(self, conn):
+        """Comprueba que una conexión siga viva; solo hace ida y vuelta si estuvo inactiva"""
+        if conn.closed:
+            return False
+        last = self._last_used.get(id(conn))
+        if last is not None and time.monotonic() - last < self.healthcheck_idle:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Obtiene una conexión sana, esperando como máximo ``acquire_timeout`` segundos"""
+        if self._closed:
+            raise psycopg2.pool.PoolError("el pool de conexiones está cerrado")
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise PoolTimeout(f"sin conexiones libres tras {self.acquire_timeout}s (max={self.maxconn})")
+            with self._lock:
+                self.wait_seconds += time.monotonic() - start
+        try:
+            conn = self._pool.getconn()
+            while not self._healthy(conn):
+                with self._lock:
+                    self.discarded += 1
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+            conn.autocommit = True
+        except Exception:
+            self._slots.release()
+            raise
+        now = time.monotonic()
+        with self._lock:
+            self.acquired += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self._checked_out[id(conn)] = now
+        if self._observe:
+            self._observe("acquire", now - start)
+        return conn
+
+    def putconn(self, conn, broken=False):
+        """Devuelve una conexión al pool; las conexiones rotas se cierran y descartan"""
+        try:
+            if not conn.closed and not broken:
+                # Deshacer cualquier transacción abierta antes de reutilizarla
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        # Conexión muerta (p. ej. tras reiniciar el servidor): se cierra y se descarta
+                        broken = True
+            if not conn.closed and not broken:
+                self._last_used[id(conn)] = time.monotonic()
+            else:
+                self._last_used.pop(id(conn), None)
+                with self._lock:
+                    self.discarded += 1
+            if self._closed:
+                conn.close()
+            else:
+                self._pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                taken = self._checked_out.pop(id(conn), None)
+            self._slots.release()
+            if self._observe and taken is not None:
+                self._observe("hold", time.monotonic() - taken)
+
+    @contextmanager
+    def connection(self):
+        """Context manager que presta una conexión y la devuelve al salir"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def stats(self):
+        """Estadísticas de saturación del pool"""
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self.in_use,
+                "idle": len(self._pool._pool) if not self._closed else 0,
+                "peak_in_use": self.peak_in_use,
+                "saturation": self.in_use / self.maxconn if self.maxconn else 0.0,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": (self.wait_seconds / self.waits * 1000.0) if self.waits else 0.0,
+                "discarded": self.discarded,
+                "closed": self._closed,
+            }
+
+    def close(self):
+        """Cierra todas las conexiones del pool"""
+        if not self._closed:
+            self._closed = True
+            self._pool.closeall()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# Detección de FAQs casi duplicadas ("¿Qué es una baja médica?" / "¿Cómo se
+# justifica una baja médica?"), que reparten la puntuación en /topk y
+# agrandan el índice.
+#
+# Las filas de la matriz TF-IDF del artefacto de servicio tienen norma 1, así
+# que X·Xᵀ es la similitud coseno entre FAQs. Nunca se arma la matriz
+# completa: las filas se reparten en bloques y cada proceso del pool calcula
+# X[bloque]·X[inicio:]ᵀ (solo el triángulo superior) y devuelve los pares que
+# superan el umbral. El tamaño del bloque se deriva de DEDUP_MEMORY_BUDGET, de
+# modo que el producto de un bloque no puede ocupar más que el presupuesto
+# aunque todas sus entradas sean no nulas. Los procesos abren el artefacto con
+# mmap y comparten sus páginas.
+#
+# Los pares se agrupan con unión-búsqueda; en cada grupo se sugiere conservar
+# la FAQ más parecida al resto y fusionar las demás en ella.
+#
+#   python dedup.py [--threshold 0.8] [--workers 4] [--coleccion NOMBRE] [--json]
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from faq_collections import DEFAULT_COLLECTION, collection_dir
+from serving_index import current_serving_dir, load_serving_index
+
+SERVING_DIR = Path("serving_index")
+DEDUP_THRESHOLD = 0.8                      # Similitud coseno mínima de un par duplicado
+DEDUP_MEMORY_BUDGET = 256 * 1024 * 1024    # Bytes del producto de bloque (entre todos los procesos)
+DEDUP_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+DEDUP_MAX_BLOCK_ROWS = 4096
+DEDUP_MAX_CLUSTERS = 500                   # Grupos que se devuelven (los más grandes primero)
+
+# Estado de cada proceso del pool: la matriz del artefacto abierta con mmap
+_worker_matrix = None
+
+
+def block_rows(n_docs, workers=1, budget=DEDUP_MEMORY_BUDGET):
+    """Filas por bloque para que el producto de cada proceso quepa en su parte del presupuesto.
+
+    Cota del peor caso: un bloque de b filas contra n documentos tiene como
+    mucho b * n entradas, de unos 16 bytes en COO (fila, columna, valor).
+    """
+    per_worker = budget // max(1, workers)
+    return int(max(1, min(DEDUP_MAX_BLOCK_ROWS, per_worker // (16 * max(1, n_docs)))))
+
+
+def _init_worker(directory):
+    global _worker_matrix
+    _worker_matrix = load_serving_index(directory)["engine"].matrix
+
+
+def block_pairs(X, start, stop, threshold):
+    """Pares (i, j, similitud) con i en [start, stop), j > i y similitud >= ``threshold``"""
+    S = (X[start:stop] @ X[start:].T).tocoo()
+    rows = S.row.astype(np.int64) + start
+    cols = S.col.astype(np.int64) + start
+    keep = (cols > rows) & (S.data >= threshold)
+    return rows[keep], cols[keep], S.data[keep].astype(np.float32)
+
+
+def _worker_block(args):
+    start, stop, threshold = args
+    return block_pairs(_worker_matrix, start, stop, threshold)
+
+
+def similar_pairs(directory, threshold=DEDUP_THRESHOLD, workers=DEDUP_WORKERS, budget=DEDUP_MEMORY_BUDGET):
+    """Pares de filas del artefacto ``directory`` con similitud >= ``threshold``; devuelve (i, j, s, filas/bloque)"""
+    X = load_serving_index(directory)["engine"].matrix
+    n = X.shape[0]
+    rows_per_block = block_rows(n, workers, budget)
+    tasks = [(start, min(start + rows_per_block, n), threshold) for start in range(0, n, rows_per_block)]
+    parts = []
+    if workers <= 1:
+        parts = [block_pairs(X, *task) for task in tasks]
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(str(directory),)) as executor:
+            parts = list(executor.map(_worker_block, tasks, chunksize=max(1, len(tasks) // (8 * workers))))
+    if not parts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32), rows_per_block
+    return (np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]),
+            np.concatenate([p[2] for p in parts]), rows_per_block)
+
+
+def _find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def clusters(rows, cols, scores):
+    """Grupos (unión-búsqueda) de los pares: lista de (miembros ordenados, pares del grupo)"""
+    parent = {}
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        parent.setdefault(i, i)
+        parent.setdefault(j, j)
+        ri, rj = _find(parent, i), _find(parent, j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups = {}
+    for i, j, s in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+        groups.setdefault(_find(parent, i), []).append((i, j, s))
+    out = []
+    for pairs in groups.values():
+        members = sorted({i for i, _, _ in pairs} | {j for _, j, _ in pairs})
+        out.append((members, pairs))
+    return out
+
+
+def suggest_merges(groups, ids, questions, max_clusters=DEDUP_MAX_CLUSTERS):
+    """Informe de cada grupo: FAQ a conservar (la de mayor similitud sumada) y las que se fusionarían en ella"""
+    report = []
+    for members, pairs in sorted(groups, key=lambda g: (-len(g[0]), -max(s for _, _, s in g[1])))[:max_clusters]:
+        weight = dict.fromkeys(members, 0.0)
+        to_keep = {}
+        for i, j, s in pairs:
+            weight[i] += s
+            weight[j] += s
+        keep = max(members, key=lambda m: (weight[m], -m))
+        for i, j, s in pairs:
+            if keep in (i, j):
+                to_keep[j if i == keep else i] = s
+        report.append({
+            "size": len(members),
+            "max_score": round(max(s for _, _, s in pairs), 4),
+            "keep": {"id": ids[keep], "q": questions[keep]},
+            # Similitud con la FAQ conservada (None si solo se parecen a través de otra del grupo)
+            "merge": [{"id": ids[m], "q": questions[m],
+                       "score": round(to_keep[m], 4) if m in to_keep else None}
+                      for m in members if m != keep],
+        })
+    return report
+
+
+def find_duplicates(directory, threshold=DEDUP_THRESHOLD, workers=DEDUP_WORKERS, budget=DEDUP_MEMORY_BUDGET,
+                    max_clusters=DEDUP_MAX_CLUSTERS, exclude=()):
+    """Pares y grupos de FAQs casi duplicadas de un artefacto de servicio, con las fusiones sugeridas.
+
+    Las filas de ``exclude`` (p. ej. FAQs borradas o cambiadas desde que se
+    publicó el artefacto) no aparecen en ningún par.
+    """
+    t0 = time.time()
+    directory = Path(directory)
+    rows, cols, scores, rows_per_block = similar_pairs(directory, threshold, workers, budget)
+    if len(exclude):
+        exclude = np.asarray(exclude, dtype=np.int64)
+        keep = ~(np.isin(rows, exclude) | np.isin(cols, exclude))
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    art = load_serving_index(directory)
+    groups = clusters(rows, cols, scores)
+    return {
+        "version": directory.name,
+        "items": len(art["ids"]) - len(exclude),
+        "excluded": len(exclude),
+        "threshold": threshold,
+        "pairs": int(len(scores)),
+        "clusters": len(groups),
+        "duplicates": sum(len(members) - 1 for members, _ in groups),
+        "suggestions": suggest_merges(groups, art["ids"], art["questions"], max_clusters),
+        "block_rows": rows_per_block,
+        "workers": workers,
+        "seconds": round(time.time() - t0, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Busca FAQs casi duplicadas en el índice publicado")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--workers", type=int, default=DEDUP_WORKERS)
+    parser.add_argument("--memory-mb", type=int, default=DEDUP_MEMORY_BUDGET // (1024 * 1024))
+    parser.add_argument("--max-clusters", type=int, default=DEDUP_MAX_CLUSTERS)
+    parser.add_argument("--coleccion", default=DEFAULT_COLLECTION)
+    parser.add_argument("--json", action="store_true", help="imprimir el informe completo en JSON")
+    args = parser.parse_args(argv)
+
+    root = SERVING_DIR if args.coleccion == DEFAULT_COLLECTION else collection_dir(SERVING_DIR, args.coleccion)
+    directory = current_serving_dir(root)
+    if directory is None:
+        parser.error(f"no hay índice publicado en {root}; ejecuta train_index.py (o /reload) antes")
+    report = find_duplicates(directory, args.threshold, args.workers, args.memory_mb * 1024 * 1024,
+                             args.max_clusters)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"{report['items']} FAQs, {report['pairs']} pares >= {args.threshold}, {report['clusters']} grupos, "
+          f"{report['duplicates']} fusionables ({report['seconds']}s, bloques de {report['block_rows']} filas, "
+          f"{report['workers']} procesos)")
+    for group in report["suggestions"]:
+        print(f"\n[{group['size']} FAQs, máx. {group['max_score']}] conservar: {group['keep']['q']} ({group['keep']['id']})")
+        for item in group["merge"]:
+            score = f"{item['score']:.3f}" if item["score"] is not None else "  -  "
+            print(f"  {score}  {item['q']} ({item['id']})")
+
+
+if __name__ == "__main__":
+    main()
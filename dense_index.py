@@ -0,0 +1,199 @@
+# Índice denso (LSA) sobre la matriz TF-IDF.
+#
+# ``fit_dense`` proyecta X con SVD truncada a DENSE_COMPONENTS dimensiones y
+# guarda las filas normalizadas (L2) en float32. Una consulta se proyecta
+# con los vectores de sus términos (los mismos que usaría
+# ``TruncatedSVD.transform``) y se puntúa con un producto escalar contra la
+# matriz por bloques de filas, quedándose con los k mejores de cada bloque.
+# Memoria y costo dependen de n_docs x dimensión, no del vocabulario ni de
+# la longitud de los documentos, y se encuentran paráfrasis que no comparten
+# términos con la FAQ. ``hybrid_search`` mezcla la puntuación densa con el
+# coseno TF-IDF del motor disperso.
+#
+# Solo se guardan los vectores de las columnas con algún documento (en el
+# modo hashing son una fracción pequeña de las cubetas).
+import copy
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+from retrieval import RetrievalEngine
+
+DENSE_COMPONENTS = 256        # Dimensión del índice denso
+DENSE_BLOCK_ROWS = 16384      # Filas de la matriz densa por bloque al puntuar
+DENSE_CANDIDATES = 50         # Candidatos densos que se añaden a los dispersos en el modo híbrido
+
+
+def _normalize(M):
+    norms = np.linalg.norm(M, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return (M / norms).astype(np.float32, copy=False)
+
+
+def fit_dense(X, n_components=DENSE_COMPONENTS, seed=0):
+    """Ajusta la SVD truncada sobre las columnas usadas de X y devuelve el ``DenseIndex``"""
+    from sklearn.decomposition import TruncatedSVD
+
+    X = sp.csr_matrix(X)
+    terms = np.unique(X.indices).astype(np.int64)
+    Xu = X[:, terms]
+    dim = max(1, min(n_components, Xu.shape[0] - 1, Xu.shape[1] - 1))
+    svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=seed)
+    docs = svd.fit_transform(Xu)
+    return DenseIndex(terms, svd.components_.T.astype(np.float32), _normalize(docs), X.shape[1])
+
+
+class DenseIndex:
+    """Matriz densa normalizada de las FAQs y proyección de consultas (inmutable, como RetrievalEngine)"""
+
+    def __init__(self, terms, term_vectors, matrix, n_features):
+        self.terms = terms                  # columnas TF-IDF con vector (ordenadas)
+        self.term_vectors = term_vectors    # len(terms) x dim
+        self.matrix = matrix                # n_docs x dim, filas con norma 1
+        self.n_features = n_features
+        self.base_docs, self.dim = matrix.shape
+        # Capa incremental: filas nuevas/modificadas y filas base ocultas
+        self.overlay = {}
+        self.masked = frozenset()
+        self._refresh_overlay()
+
+    def _refresh_overlay(self):
+        self._masked_arr = np.fromiter(sorted(self.masked), dtype=np.int64, count=len(self.masked))
+        self._overlay_ids = np.fromiter(sorted(self.overlay), dtype=np.int64, count=len(self.overlay))
+        if self.overlay:
+            self._overlay_matrix = np.vstack([self.overlay[i] for i in self._overlay_ids])
+        else:
+            self._overlay_matrix = np.empty((0, self.dim), dtype=np.float32)
+
+    def project(self, V):
+        """Filas TF-IDF (n x n_features) -> vectores densos normalizados (n x dim)"""
+        V = sp.csr_matrix(V)
+        pos = np.searchsorted(self.terms, V.indices)
+        pos[pos == len(self.terms)] = 0
+        known = self.terms[pos] == V.indices if len(self.terms) else np.zeros(len(pos), dtype=bool)
+        # Los términos sin vector (no vistos al ajustar) no aportan
+        if V.shape[0] == 1:
+            # Una sola consulta: combinación de sus pocas filas, sin construir otra matriz dispersa
+            return _normalize((V.data[known].astype(np.float32) @ self.term_vectors[pos[known]])[None, :])
+        rows = np.repeat(np.arange(V.shape[0]), np.diff(V.indptr))
+        P = sp.csr_matrix((V.data[known], (rows[known], pos[known])), shape=(V.shape[0], len(self.terms)))
+        return _normalize(np.asarray(P @ self.term_vectors))
+
+    def with_row(self, ix, v):
+        """Índice nuevo en el que la fila ``ix`` (existente o nueva) toma el vector TF-IDF ``v``"""
+        new = copy.copy(self)
+        new.overlay = dict(self.overlay)
+        new.overlay[ix] = self.project(v)[0]
+        if ix < self.base_docs:
+            new.masked = self.masked | {ix}
+        new._refresh_overlay()
+        return new
+
+    def without_row(self, ix):
+        """Índice nuevo sin la fila ``ix``"""
+        new = copy.copy(self)
+        new.overlay = dict(self.overlay)
+        new.overlay.pop(ix, None)
+        if ix < self.base_docs:
+            new.masked = self.masked | {ix}
+        new._refresh_overlay()
+        return new
+
+    def scores(self, q, docs):
+        """Puntuación densa de las filas ``docs`` (base u overlay) para la consulta proyectada ``q``"""
+        docs = np.asarray(docs, dtype=np.int64)
+        out = np.zeros(len(docs), dtype=np.float32)
+        in_overlay = np.isin(docs, self._overlay_ids)
+        base = ~in_overlay & (docs < self.base_docs)
+        if base.any():
+            out[base] = self.matrix[docs[base]] @ q
+        if in_overlay.any():
+            rows = np.searchsorted(self._overlay_ids, docs[in_overlay])
+            out[in_overlay] = self._overlay_matrix[rows] @ q
+        return out
+
+    def search(self, q, k=1, block_rows=DENSE_BLOCK_ROWS):
+        """Top-k por producto escalar, seleccionando los k mejores de cada bloque de filas"""
+        best_docs = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.base_docs, block_rows):
+            s = self.matrix[start:start + block_rows] @ q
+            if len(self._masked_arr):
+                lo, hi = np.searchsorted(self._masked_arr, [start, start + len(s)])
+                s[self._masked_arr[lo:hi] - start] = -np.inf
+            docs = np.arange(start, start + len(s), dtype=np.int64)
+            docs, s = RetrievalEngine._top(docs, s, k)
+            best_docs, best_scores = RetrievalEngine._top(np.concatenate([best_docs, docs]),
+                                                          np.concatenate([best_scores, s]), k)
+        if len(self._overlay_ids):
+            s = self._overlay_matrix @ q
+            best_docs, best_scores = RetrievalEngine._top(np.concatenate([best_docs, self._overlay_ids]),
+                                                          np.concatenate([best_scores, s]), k)
+        keep = np.isfinite(best_scores)
+        return best_docs[keep], best_scores[keep]
+
+    def best_batch(self, Q, block_rows=DENSE_BLOCK_ROWS):
+        """Mejor FAQ para cada fila de Q (consultas ya proyectadas) con Q · Mᵀ por bloques de filas.
+
+        El índice es -1 si no queda ninguna FAQ viva.
+        """
+        n = Q.shape[0]
+        best_idx = np.zeros(n, dtype=np.int64)
+        best_score = np.full(n, -np.inf, dtype=np.float32)
+        for start in range(0, self.base_docs, block_rows):
+            S = Q @ self.matrix[start:start + block_rows].T
+            if len(self._masked_arr):
+                lo, hi = np.searchsorted(self._masked_arr, [start, start + S.shape[1]])
+                S[:, self._masked_arr[lo:hi] - start] = -np.inf
+            arg = S.argmax(axis=1)
+            score = S[np.arange(n), arg]
+            better = score > best_score
+            best_idx = np.where(better, arg + start, best_idx)
+            best_score = np.where(better, score, best_score)
+        if len(self._overlay_ids):
+            S = Q @ self._overlay_matrix.T
+            arg = S.argmax(axis=1)
+            score = S[np.arange(n), arg]
+            better = score > best_score
+            best_idx = np.where(better, self._overlay_ids[arg], best_idx)
+            best_score = np.where(better, score, best_score)
+        best_idx[best_score == -np.inf] = -1
+        return best_idx, np.maximum(best_score, 0.0)
+
+
+def hybrid_search(engine, dense, v, k=1, alpha=0.5, candidates=DENSE_CANDIDATES):
+    """Top-k por ``alpha`` * similitud densa + (1 - ``alpha``) * coseno TF-IDF.
+
+    Se puntúan los documentos que comparten términos con la consulta (índice
+    invertido) más los ``candidates`` mejores del índice denso.
+    """
+    s_docs, s_scores = engine.candidates(v)
+    q = dense.project(v)[0]
+    d_docs, _ = dense.search(q, max(k, candidates))
+    docs = np.union1d(s_docs.astype(np.int64), d_docs)
+    sparse_scores = np.zeros(len(docs), dtype=np.float32)
+    sparse_scores[np.searchsorted(docs, s_docs)] = s_scores
+    combined = alpha * dense.scores(q, docs) + (1.0 - alpha) * sparse_scores
+    return RetrievalEngine._top(docs, combined.astype(np.float32), k)
+
+
+def save_dense(out_dir, dense):
+    """Guarda las matrices del índice denso junto al artefacto de servicio"""
+    out_dir = Path(out_dir)
+    np.save(out_dir / "dense_terms.npy", dense.terms)
+    np.save(out_dir / "dense_term_vectors.npy", dense.term_vectors)
+    np.save(out_dir / "dense_matrix.npy", dense.matrix)
+
+
+def load_dense(directory, n_features):
+    """Abre el índice denso de un artefacto con mmap (None si el artefacto no lo tiene)"""
+    directory = Path(directory)
+    if not (directory / "dense_matrix.npy").exists():
+        return None
+    return DenseIndex(
+        np.load(directory / "dense_terms.npy", mmap_mode="r"),
+        np.load(directory / "dense_term_vectors.npy", mmap_mode="r"),
+        np.load(directory / "dense_matrix.npy", mmap_mode="r"),
+        n_features,
+    )
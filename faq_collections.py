@@ -0,0 +1,166 @@
+# Colecciones de FAQs: varios departamentos o instituciones en un mismo despliegue.
+#
+# Cada FAQ pertenece a una colección (columna faq.coleccion). La colección
+# DEFAULT_COLLECTION es el índice global de siempre (rutas sin prefijo,
+# train_index.py, vector_tfidf); las demás se sirven en /c/{colección}/... con
+# un artefacto propio en serving_index/colecciones/{colección}/ (mismo formato
+# y fichero CURRENT que el índice global).
+#
+# Los índices de colección se abren en el primer uso y se guardan en
+# ``CollectionCache``, una LRU acotada por bytes: al superar el presupuesto
+# se descartan las colecciones usadas hace más tiempo. Como los artefactos
+# se abren con mmap, cargar una colección cuesta poco y lo que ocupa es
+# aproximadamente el tamaño de su directorio. Memoria y arranque dependen de
+# las colecciones activas, no de cuántas existan.
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from index_sync import BUILD_LOCK_KEY
+
+DEFAULT_COLLECTION = "general"
+COLLECTIONS_DIR = "colecciones"                  # Subdirectorio de serving_index/ con los artefactos de colección
+COLLECTION_MEMORY_BUDGET = 512 * 1024 * 1024     # Bytes de índices de colección cargados a la vez
+COLLECTION_NAME = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
+
+
+def valid_collection(name):
+    """True si ``name`` sirve como nombre de colección (minúsculas, dígitos, '-' y '_')"""
+    return bool(name) and COLLECTION_NAME.fullmatch(name) is not None
+
+
+def collection_dir(serving_root, name):
+    """Directorio raíz (con CURRENT y versiones) del artefacto de una colección"""
+    return Path(serving_root) / COLLECTIONS_DIR / name
+
+
+def collection_index_name(name):
+    """Fila de indice_publicado (y nombre de los eventos) del índice de una colección"""
+    return f"coleccion:{name}"
+
+
+def collection_lock_key(name):
+    """Clave del bloqueo consultivo de construcción de una colección (distinta de la del índice global)"""
+    return (BUILD_LOCK_KEY << 32) | zlib.crc32(name.encode("utf-8"))
+
+
+def directory_nbytes(directory):
+    """Bytes de los ficheros de un directorio de artefacto (lo que se mapea en memoria)"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    return sum(p.stat().st_size for p in directory.iterdir() if p.is_file())
+
+
+class CollectionCache:
+    """Índices de colección abiertos bajo demanda, con expulsión LRU por presupuesto de bytes.
+
+    ``load(nombre)`` devuelve el snapshot de la colección (o None si no existe)
+    y ``size(nombre, snapshot)`` lo que ocupa. Cada colección tiene su propio
+    candado (``lock``): con él se carga una sola vez aunque la pidan varias
+    peticiones a la vez y se serializan sus cambios y reconstrucciones, sin
+    bloquear a las demás colecciones. La recién usada nunca se expulsa,
+    aunque ella sola supere el presupuesto.
+    """
+
+    def __init__(self, load, size, budget=COLLECTION_MEMORY_BUDGET):
+        self.load = load
+        self.size = size
+        self.budget = budget
+        self._entries = OrderedDict()   # nombre -> (snapshot, bytes)
+        self._locks = {}                # nombre -> candado de la colección
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def lock(self, name):
+        """Candado de una colección (carga, cambios y reconstrucción)"""
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _lookup(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        self._entries.move_to_end(name)
+        return entry[0]
+
+    def get(self, name):
+        """Snapshot de la colección, cargándolo si no está en memoria (None si no existe)"""
+        with self._lock:
+            snap = self._lookup(name)
+            if snap is not None:
+                self.hits += 1
+                return snap
+            self.misses += 1
+        with self.lock(name):
+            with self._lock:
+                snap = self._lookup(name)
+            if snap is not None:
+                return snap
+            snap = self.load(name)
+            if snap is not None:
+                self.put(name, snap)
+                self.loads += 1
+        return snap
+
+    def peek(self, name):
+        """Snapshot cargado de la colección, sin cargarlo ni cambiar su posición (o None)"""
+        with self._lock:
+            entry = self._entries.get(name)
+        return entry[0] if entry is not None else None
+
+    def put(self, name, snap):
+        """Guarda (o reemplaza) el snapshot de una colección y expulsa las más frías si hace falta"""
+        nbytes = self.size(name, snap)
+        with self._lock:
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[name] = (snap, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.budget and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+    def update(self, name, fn):
+        """Reemplaza el snapshot cargado por ``fn(snapshot)``; no hace nada si la colección no está en memoria.
+
+        ``fn`` se ejecuta con el candado de la colección (sus cambios se aplican
+        en orden y esperan a una carga en curso); el tamaño se conserva, porque
+        la capa incremental es pequeña frente al artefacto.
+        """
+        with self.lock(name):
+            snap = self.peek(name)
+            if snap is None:
+                return None
+            snap = fn(snap)
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    self._entries[name] = (snap, entry[1])
+            return snap
+
+    def discard(self, name):
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is not None:
+                self.nbytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": list(self._entries),
+                "bytes": self.nbytes,
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,269 @@
+# Importación masiva de FAQs desde JSON, JSONL o CSV.
+#
+# Los registros se leen en flujo (sin cargar el fichero entero), se validan y
+# se envían por bloques con COPY a una tabla temporal. Al final una sola
+# sentencia los pasa a faq quitando los ids repetidos (gana la última
+# aparición) y resolviendo conflictos con ON CONFLICT, todo dentro de la
+# transacción del llamador. Lo usan migrate_to_postgres.py y POST /faqs/bulk.
+import codecs
+import csv
+import io
+import json
+import uuid
+from pathlib import Path
+
+from faq_collections import DEFAULT_COLLECTION
+
+FORMATS = ("json", "jsonl", "csv")
+# Qué hacer con los ids que ya existen en faq
+ON_CONFLICT = ("update", "skip")
+
+# Registros por bloque de COPY (acota la memoria del búfer)
+IMPORT_BATCH_ROWS = 5000
+# Errores de validación que se devuelven en el informe (el resto solo se cuentan)
+MAX_REPORTED_ERRORS = 20
+# Tamaño de lectura al recorrer un array JSON
+JSON_READ_SIZE = 1 << 16
+
+_EXTENSIONS = {".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+_CONTENT_TYPES = {"application/json": "json", "application/x-ndjson": "jsonl", "application/jsonl": "jsonl",
+                  "application/x-jsonlines": "jsonl", "text/csv": "csv"}
+
+
+def detect_format(name=None, content_type=None):
+    """Formato por extensión del fichero o por Content-Type (None si no se reconoce)"""
+    if content_type:
+        fmt = _CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    if name:
+        return _EXTENSIONS.get(Path(str(name)).suffix.lower())
+    return None
+
+
+def iter_json(fp):
+    """Recorre un array JSON elemento a elemento leyendo ``fp`` por trozos"""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(JSON_READ_SIZE)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip():
+        # Avanza sobre espacios pidiendo más texto si hace falta; False si se acabó el fichero
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return True
+            if eof:
+                return False
+            fill()
+
+    def value():
+        # Decodifica el valor que empieza en ``pos`` (puede ocupar varios trozos)
+        nonlocal pos
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if end == len(buf) and not eof:
+                # Un valor al final del búfer podría seguir en el próximo trozo
+                fill()
+                continue
+            pos = end
+            return item
+
+    def close():
+        # Tras el ']' final solo pueden quedar espacios
+        nonlocal pos
+        pos += 1
+        if skip():
+            raise ValueError("datos después del array JSON")
+
+    if not skip() or buf[pos] != "[":
+        raise ValueError("se esperaba un array JSON de FAQs")
+    pos += 1
+    if not skip():
+        raise ValueError("array JSON sin cerrar")
+    if buf[pos] == "]":
+        close()
+        return
+    while True:
+        if buf[pos] in ",]":
+            raise ValueError(f"falta un elemento del array JSON antes de '{buf[pos]}'")
+        yield value()
+        if pos > JSON_READ_SIZE:
+            buf, pos = buf[pos:], 0
+        # Tras cada elemento solo puede venir ',' (y otro elemento) o el cierre
+        if not skip():
+            raise ValueError("array JSON sin cerrar")
+        if buf[pos] == "]":
+            close()
+            return
+        if buf[pos] != ",":
+            raise ValueError(f"se esperaba ',' o ']' en el array JSON, no '{buf[pos]}'")
+        pos += 1
+        if not skip():
+            raise ValueError("array JSON sin cerrar")
+
+
+def iter_jsonl(fp):
+    """Un objeto JSON por línea (se ignoran las líneas vacías)"""
+    for line in fp:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(fp):
+    """Filas CSV con cabecera id,q,a (id opcional)"""
+    try:
+        yield from csv.DictReader(fp)
+    except csv.Error as e:
+        raise ValueError(f"CSV no válido: {e}") from e
+
+
+_READERS = {"json": iter_json, "jsonl": iter_jsonl, "csv": iter_csv}
+
+
+def iter_records(fp, fmt):
+    """Registros crudos de un fichero de texto en el formato indicado"""
+    if fmt not in _READERS:
+        raise ValueError(f"formato desconocido: {fmt} (opciones: {', '.join(FORMATS)})")
+    return _READERS[fmt](fp)
+
+
+def text_stream(binary):
+    """Envuelve un flujo binario como texto UTF-8 (se admite BOM)"""
+    return codecs.getreader("utf-8-sig")(binary)
+
+
+def validate_records(records, report):
+    """Filtra los registros válidos como (id, q, a); anota los inválidos en ``report``.
+
+    Sin id se genera uno nuevo; un id que no es UUID invalida el registro.
+    """
+    for n, rec in enumerate(records, 1):
+        report["read"] += 1
+        error = None
+        if not isinstance(rec, dict):
+            error = "no es un objeto"
+        else:
+            q = rec.get("q")
+            a = rec.get("a")
+            raw_id = rec.get("id")
+            if not isinstance(q, str) or not q.strip():
+                error = "falta 'q'"
+            elif not isinstance(a, str) or not a.strip():
+                error = "falta 'a'"
+            elif raw_id in (None, ""):
+                faq_id = str(uuid.uuid4())
+            else:
+                try:
+                    faq_id = str(uuid.UUID(str(raw_id)))
+                except ValueError:
+                    error = f"id no válido: {raw_id}"
+        if error:
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"record": n, "error": error})
+            continue
+        yield faq_id, q.strip(), a.strip()
+
+
+def _copy_batch(cursor, rows):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows(rows)
+    buf.seek(0)
+    cursor.copy_expert("COPY faq_import (n, id, q, a) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def new_report():
+    return {"read": 0, "invalid": 0, "duplicates": 0, "inserted": 0, "updated": 0, "skipped": 0,
+            "conflicts": 0, "deleted": 0, "errors": []}
+
+
+def import_faqs(cursor, records, on_conflict="update", replace=False, progress=None, collection=DEFAULT_COLLECTION):
+    """Importa registros crudos en faq (colección ``collection``); devuelve el informe. No confirma la transacción.
+
+    Con ``replace`` se borran antes las FAQs existentes de la colección (y sus
+    vectores; las consultas registradas pierden la referencia); con
+    ``on_conflict="skip"`` no se tocan las que ya existen. Los ids que ya son
+    de otra colección nunca se escriben: se cuentan en ``conflicts`` (y en
+    ``skipped``).
+    """
+    if on_conflict not in ON_CONFLICT:
+        raise ValueError(f"on_conflict desconocido: {on_conflict} (opciones: {', '.join(ON_CONFLICT)})")
+    report = new_report()
+    cursor.execute("CREATE TEMP TABLE faq_import (n BIGINT, id UUID, q TEXT, a TEXT) ON COMMIT DROP")
+    batch = []
+    staged = 0
+    for n, (faq_id, q, a) in enumerate(validate_records(records, report)):
+        batch.append((n, faq_id, q, a))
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            _copy_batch(cursor, batch)
+            staged += len(batch)
+            batch = []
+            if progress:
+                progress(staged)
+    if batch:
+        _copy_batch(cursor, batch)
+        staged += len(batch)
+        if progress:
+            progress(staged)
+
+    if replace:
+        cursor.execute("DELETE FROM vector_tfidf v USING faq f WHERE f.id = v.faq_id AND f.coleccion = %s",
+                       (collection,))
+        # El historial de consultas se conserva sin la referencia a la FAQ
+        cursor.execute("UPDATE consulta SET faq_id = NULL WHERE faq_id IN (SELECT id FROM faq WHERE coleccion = %s)",
+                       (collection,))
+        cursor.execute("DELETE FROM faq WHERE coleccion = %s", (collection,))
+        report["deleted"] = cursor.rowcount
+    # Ids que pertenecen a otra colección: no se mueven ni se reescriben
+    cursor.execute("SELECT count(DISTINCT i.id) FROM faq_import i JOIN faq f ON f.id = i.id WHERE f.coleccion <> %s",
+                   (collection,))
+    report["conflicts"] = cursor.fetchone()[0]
+    if on_conflict == "update":
+        action = ("DO UPDATE SET q = EXCLUDED.q, a = EXCLUDED.a "
+                  "WHERE faq.coleccion = EXCLUDED.coleccion "
+                  "AND (faq.q, faq.a) IS DISTINCT FROM (EXCLUDED.q, EXCLUDED.a)")
+    else:
+        action = "DO NOTHING"
+    # xmax = 0 solo en las filas recién insertadas
+    cursor.execute(
+        "WITH latest AS (SELECT DISTINCT ON (id) id, q, a FROM faq_import ORDER BY id, n DESC), "
+        f"written AS (INSERT INTO faq (id, q, a, coleccion) SELECT id, q, a, %s FROM latest ON CONFLICT (id) {action} "
+        "RETURNING (xmax = 0) AS inserted) "
+        "SELECT count(*) FILTER (WHERE inserted), count(*) FROM written",
+        (collection,)
+    )
+    inserted, written = cursor.fetchone()
+    cursor.execute("SELECT count(DISTINCT id) FROM faq_import")
+    distinct = cursor.fetchone()[0]
+    report["duplicates"] = staged - distinct
+    report["inserted"] = inserted
+    report["updated"] = written - inserted
+    # Ya existentes y sin cambios (o conservados con "skip", o de otra colección)
+    report["skipped"] = distinct - written
+    cursor.execute("DROP TABLE faq_import")
+    return report
+
+
+def import_file(cursor, path, fmt=None, **kwargs):
+    """``import_faqs`` sobre un fichero; el formato se deduce de la extensión si no se indica"""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise ValueError(f"no se reconoce el formato de {path}; indica uno de: {', '.join(FORMATS)}")
+    with open(path, encoding="utf-8-sig", newline="") as fp:
+        return import_faqs(cursor, iter_records(fp, fmt), **kwargs)
@@ -0,0 +1,75 @@
+# Listado de FAQs paginado a partir del índice servido.
+#
+# Las FAQs se ordenan por id una sola vez por índice (``FaqListing``); las
+# ediciones incrementales posteriores solo añaden una capa pequeña que se
+# mezcla al recorrer. Cada página es una búsqueda binaria del cursor (el
+# último id de la página anterior) más ``limit`` filas, así que su costo no
+# depende del número de FAQs. La búsqueda compara textos normalizados,
+# calculados la primera vez que se usan.
+import bisect
+import heapq
+
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 500
+SEARCH_FIELDS = ("all", "q", "a")
+
+
+class FaqListing:
+    """FAQs base de un índice ordenadas por id"""
+
+    def __init__(self, ids, questions, answers):
+        self.questions = questions
+        self.answers = answers
+        self.order = sorted(range(len(ids)), key=lambda i: str(ids[i]))
+        self.sorted_ids = [str(ids[i]) for i in self.order]
+        self._normalized = None
+
+    def normalized(self, normalize):
+        """(pregunta, respuesta) normalizadas en el orden de ``sorted_ids``"""
+        if self._normalized is None:
+            self._normalized = [(normalize(self.questions[i]), normalize(self.answers[i])) for i in self.order]
+        return self._normalized
+
+    def iter_after(self, after=None, skip=()):
+        """(id, posición en el orden, pregunta, respuesta) con id > ``after``, sin los ids de ``skip``"""
+        start = bisect.bisect_right(self.sorted_ids, after) if after else 0
+        for k in range(start, len(self.sorted_ids)):
+            faq_id = self.sorted_ids[k]
+            if faq_id in skip:
+                continue
+            i = self.order[k]
+            yield faq_id, k, self.questions[i], self.answers[i]
+
+
+def iter_faqs(base, overlay, skip, after=None):
+    """Mezcla por id las FAQs base y las de la capa incremental ``overlay`` (lista ordenada de (id, q, a))"""
+    start = bisect.bisect_right(overlay, (after,)) if after else 0
+    # Las filas de la capa no tienen posición en el orden base (None)
+    added = ((faq_id, None, q, a) for faq_id, q, a in overlay[start:] if not after or faq_id > after)
+    return heapq.merge(base.iter_after(after, skip), added, key=lambda row: row[0])
+
+
+def matches(row, needle, field, base, normalize):
+    """True si el texto normalizado de la fila contiene ``needle`` (ya normalizado)"""
+    _, k, q, a = row
+    if k is not None:
+        nq, na = base.normalized(normalize)[k]
+    else:
+        nq, na = normalize(q), normalize(a)
+    if field == "q":
+        return needle in nq
+    if field == "a":
+        return needle in na
+    return needle in nq or needle in na
+
+
+def page(rows, limit, needle=None, field="all", base=None, normalize=None):
+    """Toma ``limit`` filas (filtradas si hay ``needle``); devuelve (items, cursor de la siguiente página)"""
+    items = []
+    for row in rows:
+        if needle and not matches(row, needle, field, base, normalize):
+            continue
+        if len(items) == limit:
+            return items, items[-1]["id"]
+        items.append({"id": row[0], "q": row[2], "a": row[3]})
+    return items, None
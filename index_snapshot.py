@@ -0,0 +1,206 @@
+import dataclasses
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from faq_listing import FaqListing, iter_faqs
+from retrieval import RetrievalEngine, DriftTracker
+from serving_index import hash_column
+from spelling import TOKEN_PATTERN, SpellIndex
+
+
+def fit_pipeline(docs, stopwords=None, mode="vocabulary", n_features=None):
+    """Ajusta un pipeline TF-IDF nuevo sobre ``docs`` con la configuración de train_index.py.
+
+    Es una función de módulo para poder ejecutarse en un proceso aparte; sklearn
+    solo se importa aquí, no al servir consultas.
+    """
+    from train_index import HASH_N_FEATURES, build_pipeline
+
+    new_pipe = build_pipeline(stopwords, mode, n_features or HASH_N_FEATURES)
+    X = new_pipe.fit_transform(docs)
+    return new_pipe, X
+
+
+def analyzer_step(pipe):
+    """Primer paso del pipeline (el que analiza el texto: vocabulario o hashing)"""
+    return pipe.steps[0][1]
+
+
+def is_hashing(pipe):
+    """True si el pipeline usa hashing (no tiene vocabulario)"""
+    return getattr(analyzer_step(pipe), "vocabulary_", None) is None
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Índice servido completo e inmutable: pipeline, motor, textos, ids y generación.
+
+    Los manejadores leen la referencia global una sola vez por petición, así
+    que nunca mezclan el vocabulario de un índice con la matriz o los textos
+    de otro. Los cambios incrementales no modifican el snapshot: devuelven
+    uno nuevo que comparte la base y guarda las filas cambiadas aparte.
+    """
+
+    pipe: Any
+    engine: RetrievalEngine
+    questions: Sequence[str]
+    answers: Sequence[str]
+    ids: Sequence[str]
+    generation: int
+    built_at: float
+    drift: DriftTracker
+    # Sinónimos compilados con los que se expanden las consultas de este índice
+    synonyms: Any = None
+    # Índice denso (LSA) opcional, con las mismas filas que el motor
+    dense: Any = None
+    # Versión del artefacto de servicio de la que viene la base (None si no se ha publicado)
+    version: Optional[str] = None
+    _positions: Optional[Dict[str, int]] = None
+    # Capa incremental: ix -> (id, pregunta, respuesta) e id -> ix (None = borrada)
+    _rows: Dict[int, Tuple[str, str, str]] = field(default_factory=dict)
+    _moved: Dict[str, Optional[int]] = field(default_factory=dict)
+    _feature_names: Any = None
+    # Listado ordenado por id de las FAQs base (lo comparten los snapshots incrementales)
+    _listing: Any = None
+    # (generación, filas de la capa incremental ordenadas, ids base ocultos) del listado
+    _listing_overlay: Any = None
+    # Corrector ortográfico de las palabras de las FAQs base (lo comparten los snapshots incrementales)
+    _spelling: Any = None
+
+    @classmethod
+    def build(cls, pipe, X, questions, answers, ids, generation, engine=None, synonyms=None, dense=None,
+              version=None):
+        if engine is None:
+            engine = RetrievalEngine(X)
+        return cls(
+            pipe=pipe,
+            engine=engine,
+            questions=questions,
+            answers=answers,
+            ids=ids,
+            generation=generation,
+            built_at=time.time(),
+            drift=DriftTracker(engine),
+            synonyms=synonyms,
+            dense=dense,
+            version=version,
+        )
+
+    @property
+    def items(self):
+        return self.engine.live_docs
+
+    def feature_names(self, text=None):
+        """Columna -> término del vectorizador, calculado una sola vez por índice.
+
+        En el modo hashing no hay vocabulario: se devuelve {columna: n-grama}
+        con los n-gramas de ``text`` (la primera coincidencia gana si chocan).
+        """
+        vec = analyzer_step(self.pipe)
+        if is_hashing(self.pipe):
+            names = {}
+            for gram in vec.build_analyzer()(text or ""):
+                names.setdefault(hash_column(gram, vec.n_features), gram)
+            return names
+        if self._feature_names is None:
+            object.__setattr__(self, "_feature_names", vec.get_feature_names_out())
+        return self._feature_names
+
+    def question(self, ix):
+        row = self._rows.get(ix)
+        return row[1] if row else self.questions[ix]
+
+    def answer(self, ix):
+        row = self._rows.get(ix)
+        return row[2] if row else self.answers[ix]
+
+    def faq_id(self, ix):
+        row = self._rows.get(ix)
+        if row:
+            return row[0]
+        return self.ids[ix] if ix < len(self.ids) else None
+
+    def position(self, faq_id):
+        """Fila servida de una FAQ (None si no está en el índice)"""
+        if faq_id in self._moved:
+            return self._moved[faq_id]
+        if self._positions is None:
+            # Se construye al primer uso (solo lo necesitan las ediciones), no al arrancar
+            object.__setattr__(self, "_positions", {faq_id: i for i, faq_id in enumerate(self.ids)})
+        return self._positions.get(faq_id)
+
+    def stale_rows(self):
+        """Filas base que la capa incremental ya no sirve tal cual (FAQs borradas o cambiadas)"""
+        if not self._moved:
+            return []
+        if self._positions is None:
+            object.__setattr__(self, "_positions", {faq_id: i for i, faq_id in enumerate(self.ids)})
+        return sorted(self._positions[faq_id] for faq_id in self._moved if faq_id in self._positions)
+
+    def listing(self):
+        """Listado base ordenado por id, construido al primer uso"""
+        if self._listing is None:
+            object.__setattr__(self, "_listing", FaqListing(self.ids, self.questions, self.answers))
+        return self._listing
+
+    def spelling(self, normalize, build=True):
+        """Corrector ortográfico sobre las palabras de las FAQs base; con ``build=False``, None si aún no existe"""
+        if self._spelling is None and build:
+            vec = analyzer_step(self.pipe)
+            texts = (f"{q} {a}" for q, a in zip(self.questions, self.answers))
+            spelling = SpellIndex.from_texts(texts, normalize, getattr(vec, "token_pattern", None) or TOKEN_PATTERN,
+                                             known=getattr(vec, "stop_words", None) or ())
+            object.__setattr__(self, "_spelling", spelling)
+        return self._spelling
+
+    def _overlay_listing(self):
+        cached = self._listing_overlay
+        if cached is None or cached[0] != self.generation:
+            # Filas vigentes de la capa: la FAQ sigue apuntando a esa fila
+            rows = sorted((faq_id, q, a) for ix, (faq_id, q, a) in self._rows.items()
+                          if self._moved.get(faq_id) == ix)
+            cached = (self.generation, rows, frozenset(self._moved))
+            object.__setattr__(self, "_listing_overlay", cached)
+        return cached[1], cached[2]
+
+    def iter_faqs(self, after=None):
+        """(id, posición base o None, pregunta, respuesta) de las FAQs vigentes ordenadas por id"""
+        overlay, skip = self._overlay_listing()
+        return iter_faqs(self.listing(), overlay, skip, after)
+
+    def get_faq(self, faq_id):
+        """{"id", "q", "a"} de una FAQ servida (o None)"""
+        ix = self.position(faq_id)
+        if ix is None:
+            return None
+        return {"id": faq_id, "q": self.question(ix), "a": self.answer(ix)}
+
+    def with_faq(self, faq_id, q, a, v, generation, ngrams=0, oov_ngrams=0):
+        """Snapshot nuevo con la FAQ añadida o actualizada en su propia fila"""
+        ix = self.position(faq_id)
+        old_terms = self.engine.row_terms(ix) if ix is not None else None
+        if ix is None:
+            ix = self.engine.n_docs
+        engine = self.engine.with_row(ix, v)
+        rows = dict(self._rows)
+        rows[ix] = (faq_id, q, a)
+        moved = dict(self._moved)
+        moved[faq_id] = ix
+        self.drift.record(old_terms, engine.row_terms(ix), ngrams, oov_ngrams)
+        dense = self.dense.with_row(ix, v) if self.dense is not None else None
+        return dataclasses.replace(self, engine=engine, dense=dense, generation=generation, _rows=rows, _moved=moved)
+
+    def without_faq(self, faq_id, generation):
+        """Snapshot nuevo sin la FAQ (o None si no estaba en el índice)"""
+        ix = self.position(faq_id)
+        if ix is None:
+            return None
+        old_terms = self.engine.row_terms(ix)
+        moved = dict(self._moved)
+        moved[faq_id] = None
+        self.drift.record(old_terms, None)
+        dense = self.dense.without_row(ix) if self.dense is not None else None
+        return dataclasses.replace(
+            self, engine=self.engine.without_row(ix), dense=dense, generation=generation, _moved=moved
+        )
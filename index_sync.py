@@ -0,0 +1,236 @@
+# Coordinación del índice entre procesos (varios workers de uvicorn, o varias máquinas
+# que comparten el directorio serving_index/).
+#
+# La tabla indice_publicado guarda la versión activa del artefacto de servicio
+# y un contador de generación. Quien construye toma antes un bloqueo consultivo
+# de Postgres (``BuildLock``): aunque /reload o un reajuste por deriva lleguen a
+# varios workers, solo uno ajusta el índice. Al terminar escribe la versión y
+# avisa por NOTIFY en la misma transacción. Los demás escuchan el canal
+# (``IndexListener``) y abren la versión publicada con mmap, sin reajustar nada.
+# Por el mismo canal se avisan las altas, cambios y bajas de /faqs, para que
+# cada worker las aplique sobre su índice. Si se pierde una notificación (p. ej.
+# durante una reconexión), la consulta periódica de la tabla la recupera.
+import json
+import os
+import select
+import socket
+import threading
+import time
+
+import psycopg2
+
+CHANNEL = "indice_faq"
+INDEX_NAME = "faq"                 # Fila de indice_publicado del índice de FAQs
+BUILD_LOCK_KEY = 4242001           # Clave del bloqueo consultivo de construcción
+# Identidad de este proceso en las notificaciones (para ignorar las propias)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def published(cursor, name=INDEX_NAME):
+    """(versión, generación, instante de lectura de las FAQs) publicados o None si no hay ninguno"""
+    cursor.execute("SELECT version, generacion, desde FROM indice_publicado WHERE nombre = %s", (name,))
+    row = cursor.fetchone()
+    return (row[0], int(row[1]), row[2]) if row else None
+
+
+def publish_version(cursor, version, since=None, name=INDEX_NAME, worker=WORKER_ID):
+    """Registra ``version`` como la activa y la notifica al confirmar; devuelve la generación nueva.
+
+    ``since`` es el instante (epoch) en que se leyeron las FAQs del índice: los
+    workers vuelven a aplicar los cambios de /faqs posteriores.
+    """
+    cursor.execute(
+        "INSERT INTO indice_publicado (nombre, version, generacion, publicado, worker, desde) "
+        "VALUES (%s, %s, 1, now(), %s, %s) ON CONFLICT (nombre) DO UPDATE SET version = EXCLUDED.version, "
+        "generacion = indice_publicado.generacion + 1, publicado = now(), worker = EXCLUDED.worker, "
+        "desde = EXCLUDED.desde RETURNING generacion",
+        (name, version, worker, since)
+    )
+    generation = int(cursor.fetchone()[0])
+    notify(cursor, {"type": "index", "name": name, "version": version, "generation": generation, "since": since},
+           worker)
+    return generation
+
+
+def notify(cursor, event, worker=WORKER_ID):
+    """Envía un evento JSON por el canal (se entrega al confirmar la transacción)"""
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, json.dumps(dict(event, origin=worker))))
+
+
+class BuildLock:
+    """Bloqueo consultivo de sesión sobre una conexión propia: un solo constructor entre todos los procesos.
+
+    ``acquire`` no espera: devuelve False si otro proceso está construyendo. El
+    bloqueo se libera con ``release`` o al cerrarse la conexión (si el proceso muere).
+    """
+
+    def __init__(self, connect, key=BUILD_LOCK_KEY):
+        self.connect = connect
+        self.key = key
+        self._conn = None
+
+    def acquire(self):
+        conn = self.connect()
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+        acquired = cursor.fetchone()[0]
+        cursor.close()
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class IndexListener:
+    """Hilo que escucha el canal del índice y reparte los eventos de los demás procesos.
+
+    ``on_index(version, generation, since)`` se llama con cada versión publicada
+    por otro proceso (y al conectar o cada ``poll_interval`` segundos con la de
+    la tabla, por si se perdió alguna notificación); ``on_edit(event)`` con cada
+    cambio de /faqs; ``on_other(name, version, generation, since)``, si se
+    indica, con las versiones publicadas de otros índices (las colecciones).
+    Si la conexión se cae, se reintenta con espera creciente.
+    """
+
+    def __init__(self, connect, on_index, on_edit, poll_interval=30.0, name=INDEX_NAME, max_backoff=30.0,
+                 on_other=None):
+        self.connect = connect
+        self.on_index = on_index
+        self.on_edit = on_edit
+        self.on_other = on_other
+        self.poll_interval = poll_interval
+        self.name = name
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._conn = None
+        self._backoff = 1.0
+        self.connected = False
+        self.notifications = 0
+        self.index_events = 0
+        self.edit_events = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.published = None
+        self.last_event_at = None
+        self.last_error = None
+
+    def start(self):
+        """Arranca el hilo (idempotente)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="index-listener", daemon=True)
+            self._thread.start()
+
+    def _poll_table(self):
+        cursor = self._conn.cursor()
+        try:
+            current = published(cursor, self.name)
+        finally:
+            cursor.close()
+        if current is not None:
+            self.published = current[:2]
+            self.on_index(*current)
+
+    def _dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        if event.get("origin") == WORKER_ID:
+            return
+        if event.get("name", self.name) != self.name:
+            if event.get("type") == "index" and self.on_other is not None:
+                self.last_event_at = time.time()
+                self.index_events += 1
+                self.on_other(event["name"], event["version"], event["generation"], event.get("since"))
+            return
+        self.last_event_at = time.time()
+        if event.get("type") == "index":
+            self.index_events += 1
+            self.published = (event["version"], event["generation"])
+            self.on_index(event["version"], event["generation"], event.get("since"))
+        elif event.get("type") == "faq":
+            self.edit_events += 1
+            self.on_edit(event)
+
+    def _listen(self):
+        self._conn = self.connect()
+        self._conn.autocommit = True
+        cursor = self._conn.cursor()
+        cursor.execute(f"LISTEN {CHANNEL}")
+        cursor.close()
+        self.connected = True
+        self._backoff = 1.0
+        # Ponerse al día con lo publicado mientras no se escuchaba
+        self._poll_table()
+        next_poll = time.monotonic() + self.poll_interval
+        while not self._stop.is_set():
+            timeout = max(0.0, min(next_poll - time.monotonic(), 1.0))
+            if select.select([self._conn], [], [], timeout)[0]:
+                self._conn.poll()
+                while self._conn.notifies:
+                    self.notifications += 1
+                    self._dispatch(self._conn.notifies.pop(0).payload)
+            if time.monotonic() >= next_poll:
+                self._poll_table()
+                next_poll = time.monotonic() + self.poll_interval
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+            finally:
+                self.connected = False
+                if self._conn is not None:
+                    try:
+                        self._conn.close()
+                    except psycopg2.Error:
+                        pass
+                    self._conn = None
+            if self._stop.wait(self._backoff):
+                break
+            self.reconnects += 1
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "published_version": self.published[0] if self.published else None,
+            "published_generation": self.published[1] if self.published else None,
+            "notifications": self.notifications,
+            "index_events": self.index_events,
+            "edit_events": self.edit_events,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "last_event_at": self.last_event_at,
+            "last_error": self.last_error,
+        }
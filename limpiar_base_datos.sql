@@ -7,6 +7,15 @@ SET session_replication_role = 'replica';
 -- Limpiar la tabla consulta (tiene referencia a faq)
 DELETE FROM consulta;
 
+-- Limpiar los resúmenes del registro de consultas (analytics.py)
+DELETE FROM consulta_hora;
+DELETE FROM consulta_score;
+DELETE FROM consulta_sin_respuesta;
+DELETE FROM analitica_marca;
+
+-- Olvidar la versión publicada del índice (se vuelve a escribir al construirlo)
+DELETE FROM indice_publicado;
+
 -- Limpiar la tabla vector_tfidf (tiene referencia a faq)
 DELETE FROM vector_tfidf;
 
@@ -0,0 +1,216 @@
+# Métricas del servicio en formato de texto de Prometheus (sin dependencias).
+#
+# Contadores, medidores e histogramas con etiquetas, pensados para la ruta
+# caliente: observar un valor es una búsqueda binaria en los límites del
+# histograma y una suma bajo un lock. ``Registry.render`` genera el texto
+# que sirve GET /metrics. Los tiempos por etapa de la petición en curso se
+# acumulan además en un contextvar para el registro de peticiones lentas.
+import bisect
+import contextvars
+import math
+import threading
+import time
+
+# Límites (segundos) para latencias desde microsegundos hasta segundos
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites para puntuaciones de similitud (coseno en [0, 1])
+SCORE_BUCKETS = tuple(round(0.05 * i, 2) for i in range(1, 21))
+
+# Etapas de la petición en curso: {etapa: segundos} (None fuera de una petición)
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def _format_value(v):
+    if v == math.inf:
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v)) if abs(v) < 1e15 else repr(v)
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Contador monótono, opcionalmente por etiquetas"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_format_value(v)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Medidor con valor fijado o calculado al exportar (``fn`` devuelve {etiquetas: valor} o un número)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+        self._fn = fn
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        if self._fn is not None:
+            try:
+                current = self._fn()
+            except Exception:
+                current = None
+            if isinstance(current, dict):
+                values.update(current)
+            elif current is not None:
+                values[()] = current
+        lines = self.header()
+        for labels, v in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_format_value(float(v))}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.histogram.observe(elapsed, *self.labels)
+        stages = _request_stages.get()
+        if stages is not None and self.labels:
+            key = self.labels[0]
+            stages[key] = stages.get(key, 0.0) + elapsed
+        return False
+
+
+class Histogram(_Metric):
+    """Histograma acumulado con límites fijos, suma y conteo por etiquetas"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, *labels):
+        """Context manager que observa la duración del bloque (y la anota en la petición en curso)"""
+        return _Timer(self, labels)
+
+    def snapshot(self, *labels):
+        """(conteos por límite, suma, total) de unas etiquetas"""
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                return [0] * (len(self.buckets) + 1), 0.0, 0
+            return list(entry[0]), entry[1], entry[2]
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for labels, (counts, total, count) in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Conjunto de métricas exportadas juntas"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self.register(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def begin_request():
+    """Empieza a anotar las etapas de la petición actual; devuelve el token para ``end_request``"""
+    return _request_stages.set({})
+
+
+def end_request(token):
+    """Termina la anotación y devuelve {etapa: segundos} de la petición"""
+    stages = _request_stages.get()
+    _request_stages.reset(token)
+    return stages or {}
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
-import json
+import argparse
 import psycopg2
-import uuid
+import time
 from pathlib import Path
 
+from faq_collections import DEFAULT_COLLECTION, valid_collection
+from faq_import import FORMATS, ON_CONFLICT, import_file
+
 # Configuración de la base de datos
 DB_NAME = "DefensaIA"
 DB_USER = "postgres"
@@ -14,17 +17,12 @@ DB_PORT = "5432"
 # Ruta al archivo JSON
 JSON_PATH = Path("data/faqs.json")
 
-def migrate_json_to_postgres():
-    print("Iniciando migración de datos JSON a PostgreSQL...")
-    
-    # Cargar datos del archivo JSON
-    try:
-        faqs = json.loads(JSON_PATH.read_text(encoding="utf-8"))
-        print(f"Cargados {len(faqs)} FAQs desde el archivo JSON.")
-    except Exception as e:
-        print(f"Error al cargar el archivo JSON: {e}")
-        return False
-    
+def migrate_json_to_postgres(path=JSON_PATH, fmt=None, replace=True, on_conflict="update", rebuild=False,
+                             collection=DEFAULT_COLLECTION):
+    """Importa FAQs (JSON, JSONL o CSV) en una sola transacción; con ``replace`` vacía antes la colección"""
+    print(f"Iniciando importación de {path} a PostgreSQL...")
+    t0 = time.time()
+
     # Conectar a la base de datos
     try:
         conn = psycopg2.connect(
@@ -34,47 +32,55 @@ def migrate_json_to_postgres():
             host=DB_HOST,
             port=DB_PORT
         )
-        conn.autocommit = True
         cursor = conn.cursor()
         print("Conexión a PostgreSQL establecida.")
     except Exception as e:
         print(f"Error al conectar a PostgreSQL: {e}")
         return False
-    
-    # Limpiar tablas existentes
+
+    # Leer, validar y escribir todo o nada
     try:
-        cursor.execute("DELETE FROM consulta;")
-        cursor.execute("DELETE FROM vector_tfidf;")
-        cursor.execute("DELETE FROM faq;")
-        print("Tablas limpiadas correctamente.")
+        report = import_file(cursor, path, fmt, on_conflict=on_conflict, replace=replace, collection=collection,
+                             progress=lambda n: print(f"  {n} FAQs preparadas...", flush=True))
+        conn.commit()
     except Exception as e:
-        print(f"Error al limpiar tablas: {e}")
+        conn.rollback()
+        print(f"Error en la importación (no se aplicó ningún cambio): {e}")
         return False
-    
-    # Insertar FAQs en la base de datos
-    for faq in faqs:
-        try:
-            # Asegurarse de que el ID sea un UUID válido
-            try:
-                faq_id = uuid.UUID(faq["id"])
-            except (ValueError, KeyError):
-                # Si el ID no es válido o no existe, generar uno nuevo
-                faq_id = uuid.uuid4()
-                faq["id"] = str(faq_id)
-            
-            cursor.execute(
-                "INSERT INTO faq (id, q, a) VALUES (%s, %s, %s)",
-                (str(faq_id), faq["q"], faq["a"])
-            )
-            print(f"FAQ insertada: {faq['q'][:30]}...")
-        except Exception as e:
-            print(f"Error al insertar FAQ: {e}")
-    
-    # Cerrar conexión
-    cursor.close()
-    conn.close()
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f"Leídas {report['read']} FAQs en {time.time() - t0:.1f}s: {report['inserted']} nuevas, "
+          f"{report['updated']} actualizadas, {report['skipped']} sin cambios, "
+          f"{report['duplicates']} ids repetidos, {report['invalid']} inválidas, "
+          f"{report['conflicts']} con id de otra colección (sin tocar).")
+    for err in report["errors"]:
+        print(f"  registro {err['record']}: {err['error']}")
+
+    # Reconstruir el índice una sola vez al final
+    if rebuild and collection != DEFAULT_COLLECTION:
+        # Las colecciones las indexa api.py (al primer uso o con POST /c/{colección}/reload)
+        print(f"La colección {collection} se indexará al usarla o con POST /c/{collection}/reload.")
+    elif rebuild:
+        import train_index
+        train_index.main([])
     print("Migración completada exitosamente.")
     return True
 
 if __name__ == "__main__":
-    migrate_json_to_postgres()
+    parser = argparse.ArgumentParser(description="Importa FAQs desde JSON, JSONL o CSV a PostgreSQL")
+    parser.add_argument("path", nargs="?", default=JSON_PATH, type=Path)
+    parser.add_argument("--format", choices=FORMATS, help="por defecto se deduce de la extensión")
+    parser.add_argument("--upsert", action="store_true",
+                        help="conservar las FAQs existentes (por defecto se vacían las tablas)")
+    parser.add_argument("--on-conflict", choices=ON_CONFLICT, default="update",
+                        help="con --upsert: actualizar u omitir los ids que ya existen")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruir el índice al terminar")
+    parser.add_argument("--coleccion", default=DEFAULT_COLLECTION,
+                        help=f"colección de destino (por defecto {DEFAULT_COLLECTION}, el índice global)")
+    args = parser.parse_args()
+    if not valid_collection(args.coleccion):
+        parser.error(f"nombre de colección no válido: {args.coleccion}")
+    migrate_json_to_postgres(args.path, args.format, replace=not args.upsert,
+                             on_conflict=args.on_conflict, rebuild=args.rebuild, collection=args.coleccion)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import psycopg2
+import psycopg2.extras
+
+from vector_codec import decode_vector, encode_parts, is_legacy
+
+# Configuración de la base de datos
+DB_NAME = "DefensaIA"
+DB_USER = "postgres"
+DB_PASSWORD = "postgres"
+DB_HOST = "localhost"
+DB_PORT = "5432"
+
+# Filas convertidas por lote
+BATCH_SIZE = 1000
+
+def migrate_vectors():
+    """Convierte los vectores pickle densos de vector_tfidf al formato disperso binario"""
+    print("Migrando vectores TF-IDF al formato disperso...")
+    conn = psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+    # Cursor con nombre: recorre la tabla en el servidor sin traerla completa a memoria
+    reader = conn.cursor(name="vector_tfidf_migracion")
+    reader.itersize = BATCH_SIZE
+    reader.execute("SELECT faq_id, vector_data FROM vector_tfidf")
+    writer = conn.cursor()
+    
+    converted = skipped = 0
+    bytes_before = bytes_after = 0
+    batch = []
+    for faq_id, blob in reader:
+        if not is_legacy(blob):
+            skipped += 1
+            continue
+        indices, values, dim = decode_vector(blob)
+        data = encode_parts(indices, values, dim)
+        bytes_before += len(blob)
+        bytes_after += len(data)
+        batch.append((str(faq_id), data))
+        if len(batch) >= BATCH_SIZE:
+            _update_batch(writer, batch)
+            converted += len(batch)
+            batch = []
+            print(f"  {converted} vectores convertidos...")
+    if batch:
+        _update_batch(writer, batch)
+        converted += len(batch)
+    
+    conn.commit()
+    reader.close()
+    writer.close()
+    conn.close()
+    print(f"Migración completada: {converted} convertidos, {skipped} ya estaban en el formato nuevo.")
+    if converted:
+        print(f"Tamaño: {bytes_before} -> {bytes_after} bytes")
+    return True
+
+def _update_batch(cursor, batch):
+    psycopg2.extras.execute_values(
+        cursor,
+        "UPDATE vector_tfidf AS v SET vector_data = d.vector_data "
+        "FROM (VALUES %s) AS d (faq_id, vector_data) WHERE v.faq_id = d.faq_id::uuid",
+        [(faq_id, psycopg2.Binary(data)) for faq_id, data in batch]
+    )
+
+if __name__ == "__main__":
+    migrate_vectors()
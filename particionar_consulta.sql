@@ -0,0 +1,57 @@
+-- Convierte una tabla consulta existente (sin particionar) en la tabla
+-- particionada por mes de setup_database.sql, conservando todas las filas.
+--
+--   psql -d DefensaIA -f setup_database.sql        (crea crear_particion_consulta)
+--   psql -d DefensaIA -f particionar_consulta.sql
+--
+-- Se ejecuta en una sola transacción y no hace nada si consulta ya está
+-- particionada. Bloquea las escrituras en consulta mientras copia las filas.
+BEGIN;
+
+DO $$
+DECLARE
+    primero DATE;
+    ultimo DATE;
+    mes DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'consulta'::regclass) = 'p' THEN
+        RAISE NOTICE 'consulta ya está particionada';
+        RETURN;
+    END IF;
+
+    -- Apartar la tabla antigua (y los nombres de sus índices)
+    ALTER TABLE consulta RENAME TO consulta_sin_particionar;
+    ALTER INDEX IF EXISTS consulta_pkey RENAME TO consulta_sin_particionar_pkey;
+    ALTER INDEX IF EXISTS consulta_faq_id_idx RENAME TO consulta_sin_particionar_faq_id_idx;
+    ALTER INDEX IF EXISTS consulta_timestamp_idx RENAME TO consulta_sin_particionar_timestamp_idx;
+
+    CREATE TABLE consulta (
+        id UUID NOT NULL,
+        texto TEXT NOT NULL,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        score FLOAT,
+        faq_id UUID REFERENCES faq(id) ON DELETE SET NULL,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE INDEX consulta_faq_id_idx ON consulta (faq_id);
+    CREATE INDEX consulta_timestamp_idx ON consulta (timestamp);
+    CREATE TABLE consulta_default PARTITION OF consulta DEFAULT;
+
+    -- Un mes por partición desde la consulta más antigua hasta tres meses después del actual
+    SELECT date_trunc('month', min(timestamp)), date_trunc('month', max(timestamp))
+      INTO primero, ultimo FROM consulta_sin_particionar;
+    mes := COALESCE(primero, date_trunc('month', now()));
+    WHILE mes <= GREATEST(ultimo, date_trunc('month', now()) + INTERVAL '3 months') LOOP
+        PERFORM crear_particion_consulta(mes);
+        mes := mes + INTERVAL '1 month';
+    END LOOP;
+
+    INSERT INTO consulta (id, texto, timestamp, score, faq_id)
+    SELECT id, texto, timestamp, score, faq_id FROM consulta_sin_particionar;
+    DROP TABLE consulta_sin_particionar;
+END $$;
+
+COMMIT;
+
+-- Filas por partición tras la conversión
+SELECT tableoid::regclass AS particion, count(*) FROM consulta GROUP BY 1 ORDER BY 1;
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    """Cálculo en curso para una clave; los demás hilos esperan su resultado"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Dependencies:
+    """Filas del índice y términos de la consulta de los que depende un valor (``everything`` = de todo)"""
+
+    def __init__(self):
+        self.rows = set()
+        self.terms = set()
+        self.everything = False
+
+    def affected_by(self, rows, terms):
+        return self.everything or not self.rows.isdisjoint(rows) or not self.terms.isdisjoint(terms)
+
+
+class QueryCache:
+    """Caché LRU con TTL para resultados de consultas, invalidada por generación del índice.
+
+    Al reemplazar el índice completo (``set_generation``) se descartan todas
+    las entradas. Un cambio incremental de una FAQ (``invalidate``) solo
+    descarta las que dependen de su fila o comparten algún término con su
+    vector nuevo: mientras se calcula un valor, ``depends`` anota las filas
+    devueltas y los términos de la consulta (el IDF no cambia entre
+    reconstrucciones, así que una fila que no comparte términos con la
+    consulta no puede entrar en su resultado). Un valor sin dependencias
+    anotadas se descarta con cualquier cambio. Si varias peticiones piden la
+    misma clave mientras se calcula, solo la primera ejecuta ``compute`` y el
+    resto reutiliza su resultado.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.edits = 0          # Cambios incrementales recibidos
+        self.retained = 0       # Entradas que sobrevivieron a un cambio incremental
+        self._epoch = 0         # Cambia solo al reemplazar el índice completo
+        self._local = threading.local()
+
+    def set_generation(self, generation):
+        """Cambia la generación del índice (reemplazado por completo) y descarta las entradas anteriores"""
+        with self._lock:
+            if generation != self.generation:
+                self.generation = generation
+                self._epoch += 1
+                self.invalidations += len(self._data)
+                self._data.clear()
+
+    def invalidate(self, generation, rows, terms=()):
+        """Nueva generación por un cambio incremental: descarta solo las entradas afectadas.
+
+        ``rows`` son las filas del índice que cambiaron y ``terms`` los
+        términos de sus vectores nuevos (vacío en una baja).
+        """
+        rows, terms = set(rows), set(terms)
+        with self._lock:
+            if generation == self.generation:
+                return
+            self.generation = generation
+            self.edits += 1
+            stale = [key for key, (_, _, deps) in self._data.items() if deps.affected_by(rows, terms)]
+            for key in stale:
+                del self._data[key]
+            self.invalidations += len(stale)
+            self.retained += len(self._data)
+
+    def depends(self, rows=None, terms=None):
+        """Anota de qué filas y términos depende el valor en cálculo; sin argumentos, de todo el índice"""
+        deps = getattr(self._local, "deps", None)
+        if deps is None:
+            return
+        if rows is None and terms is None:
+            deps.everything = True
+            return
+        deps.rows.update(rows or ())
+        deps.terms.update(terms or ())
+
+    def get_or_compute(self, key, compute, generation=None):
+        """Devuelve el valor cacheado para ``key`` o lo calcula una sola vez.
+
+        Con ``generation`` (la del índice con el que calcula ``compute``), si
+        la caché ya va por otra el valor se calcula sin guardarlo.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.misses += 1
+                stale = True
+            else:
+                stale = False
+                generation = self.generation
+                key = (self._epoch, key)
+                entry = self._data.get(key)
+                if entry is not None:
+                    value, expires, _ = entry
+                    if expires > now:
+                        self._data.move_to_end(key)
+                        self.hits += 1
+                        return value
+                    del self._data[key]
+                    self.expirations += 1
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _InFlight()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+        if stale:
+            return compute()
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        deps = self._local.deps = _Dependencies()
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._local.deps = None
+            with self._lock:
+                self._inflight.pop(key, None)
+                # No guardar resultados calculados con un índice que ya fue reemplazado o cambiado
+                if flight.error is None and generation == self.generation:
+                    if not deps.rows and not deps.terms:
+                        deps.everything = True
+                    self._data[key] = (flight.value, time.monotonic() + self.ttl, deps)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+                        self.evictions += 1
+            flight.event.set()
+        return flight.value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Contadores de aciertos, fallos y expulsiones"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "edits": self.edits,
+                "retained": self.retained,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,160 @@
+import datetime
+import queue
+import threading
+import time
+import uuid
+
+
+class QueryLogWriter:
+    """Registro asíncrono de consultas: cola acotada en memoria y un hilo escritor por lotes.
+
+    ``log`` solo encola la fila (id, texto, timestamp, score, faq_id); el hilo
+    escritor agrupa hasta ``batch_size`` filas o lo acumulado en
+    ``flush_interval`` segundos y las pasa a ``write_batch`` en una sola
+    escritura. Si la cola está llena, ``log`` espera como mucho
+    ``block_timeout`` segundos y después descarta la fila. Los lotes que no se
+    pueden escribir se reintentan ``retries`` veces. Toda fila perdida queda
+    contada en ``dropped`` por motivo.
+    """
+
+    def __init__(self, write_batch, maxsize=10000, batch_size=500, flush_interval=1.0,
+                 block_timeout=0.0, retries=2, retry_backoff=0.5):
+        self.write_batch = write_batch
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closing = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.retried = 0
+        self.dropped = {"queue_full": 0, "write_error": 0, "closed": 0}
+        self.last_error = None
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        """Arranca el hilo escritor (idempotente)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._closing.clear()
+            self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+            self._thread.start()
+
+    def _drop(self, reason, n=1):
+        with self._lock:
+            self.dropped[reason] += n
+
+    def log(self, texto, score=None, faq_id=None):
+        """Encola una consulta; devuelve False si se descartó"""
+        if self._closing.is_set():
+            self._drop("closed")
+            return False
+        if self._thread is None:
+            self.start()
+        row = (str(uuid.uuid4()), texto, datetime.datetime.now(), score, faq_id)
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self._drop("queue_full")
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def log_many(self, rows):
+        """Encola varias consultas (texto, score, faq_id)"""
+        for texto, score, faq_id in rows:
+            self.log(texto, score, faq_id)
+
+    def _next_batch(self):
+        """Espera la primera fila y reúne el lote hasta llenarlo o agotar ``flush_interval``"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closing.is_set():
+                # Al cerrar, vaciar lo que quede sin esperar
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.last_error = str(e)
+                if attempt < self.retries and not self._closing.is_set():
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(self.retry_backoff * (attempt + 1))
+                    continue
+                self._drop("write_error", len(batch))
+                return
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self.last_flush_seconds = time.perf_counter() - start
+            return
+
+    def _run(self):
+        while not (self._closing.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def close(self, timeout=10.0):
+        """Deja de aceptar filas, escribe las pendientes y detiene el hilo"""
+        self._closing.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                # Sigue escribiendo (BD lenta); lo que no llegue a escribir se pierde al salir
+                return
+        lost = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+                lost += 1
+            except queue.Empty:
+                break
+        if lost:
+            self._drop("closed", lost)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "maxsize": self.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "retried": self.retried,
+                "dropped_queue_full": self.dropped["queue_full"],
+                "dropped_write_error": self.dropped["write_error"],
+                "dropped_closed": self.dropped["closed"],
+                "last_flush_seconds": self.last_flush_seconds,
+                "last_error": self.last_error,
+            }
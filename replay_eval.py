@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# Evaluación offline: repite consultas reales contra configuraciones candidatas
+# del índice para medir el efecto de un cambio antes de aplicarlo.
+#
+# Las consultas se leen en flujo de la tabla consulta (cursor de servidor,
+# sin las entradas "[SYSTEM]") o de un fichero JSONL con una consulta por
+# línea: {"query": "...", "faq_id": "..."} (faq_id es la etiqueta, opcional).
+# Cada configuración candidata (fichero JSON con una lista de objetos) puede
+# cambiar:
+#
+#   name            nombre en el informe
+#   synonyms        fichero de sinónimos (null = sin sinónimos)
+#   stopwords       fichero de stopwords (null = sin stopwords)
+#   ngram_range     [mín, máx] palabras por n-grama
+#   max_df          frecuencia de documento máxima de un término (modo vocabulario)
+#   mode            "vocabulary" o "hashing"
+#   expand_documents  expandir también los documentos con los sinónimos
+#   threshold       umbral de confianza (CONFIDENCE_THRESHOLD de api.py)
+#   spell           reintentar con la consulta corregida bajo el umbral (SPELL_CORRECTION)
+#
+# Lo que no se indique toma el valor actual de train_index.py/api.py. La
+# primera configuración, "actual" (la de ahora), es la referencia del cambio
+# de respuesta. Los índices se ajustan con build_pipeline de train_index.py
+# (los que solo difieren en umbral o corrección comparten ajuste) y las
+# consultas se reparten por bloques entre procesos; cada proceso recibe todos
+# los índices una vez y devuelve solo contadores y latencias por bloque, así
+# que la memoria no crece con el número de consultas. Cada bloque se responde
+# como /ask/batch (vectorización y producto de una vez, segunda pasada con las
+# corregidas) y una de cada REPLAY_LATENCY_EVERY consultas se repite además
+# suelta, como /ask, para medir la latencia por consulta.
+#
+# Por configuración se informa:
+#   answer_change_rate   consultas cuya respuesta (FAQ o ninguna) cambia frente a "actual"
+#   below_threshold_rate consultas sin respuesta (mejor puntuación bajo el umbral)
+#   top1_agreement       consultas etiquetadas cuya mejor FAQ es la etiqueta
+#   corrected_rate       consultas respondidas con la consulta corregida
+#   batch_ms_per_query   coste por consulta respondiendo por bloques
+#   latencia de una consulta suelta (expandir, vectorizar, puntuar y corregir): media, p50, p95, p99
+#
+# Desde consulta, la etiqueta es la FAQ que se sirvió entonces (acuerdo con
+# producción) y el texto es el que se registró, ya normalizado y expandido con
+# los sinónimos de aquel momento: quitar sinónimos no se puede medir así (usa
+# un JSONL con el texto original).
+#
+#   python replay_eval.py --configs candidatas.json [--queries consulta|fichero.jsonl]
+#                         [--days 30] [--limit N] [--faqs db|serving] [--workers N] [--out informe.json]
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+import train_index
+from faq_collections import DEFAULT_COLLECTION
+from index_snapshot import IndexSnapshot
+from serving_index import current_serving_dir, load_serving_index
+from synonyms import EXPAND_DOCUMENTS, SYNONYMS_FROM_DB, SYNONYMS_PATH, SynonymExpander, compile_synonyms
+
+# Configuración de la base de datos
+DB_NAME = "DefensaIA"
+DB_USER = "postgres"
+DB_PASSWORD = "postgres"
+DB_HOST = "localhost"
+DB_PORT = "5432"
+
+SERVING_DIR = Path("serving_index")
+CONFIDENCE_THRESHOLD = 0.10      # El de api.py
+SPELL_CORRECTION = True          # El de api.py
+REPLAY_DAYS = 30                 # Días de consulta que se repiten por defecto
+REPLAY_CHUNK = 2000              # Consultas por bloque enviado a un proceso
+REPLAY_WORKERS = os.cpu_count() or 1
+REPLAY_LATENCY_EVERY = 20        # Una de cada N consultas se mide también suelta (latencia por consulta)
+SYSTEM_PREFIX = "[SYSTEM]"       # Entradas internas del registro (ver analytics.py)
+BASELINE = "actual"
+
+# Claves que determinan el ajuste del índice (el resto solo cambia cómo se responde)
+INDEX_KEYS = ("synonyms", "stopwords", "ngram_range", "max_df", "mode", "expand_documents")
+
+# Estado de cada proceso del pool: índices ajustados y configuraciones
+_worker = {}
+
+
+def _normalize(text):
+    return train_index.preprocess_text([text])[0]
+
+
+def baseline_config():
+    """Configuración actual (la de train_index.py y api.py)"""
+    return {
+        "name": BASELINE,
+        "synonyms": str(SYNONYMS_PATH),
+        "stopwords": str(train_index.STOPWORDS_FILE) if train_index.STOPWORDS_FILE.exists() else None,
+        "ngram_range": list(train_index.NGRAM_RANGE),
+        "max_df": train_index.MAX_DF,
+        "mode": train_index.INDEX_MODE,
+        "expand_documents": EXPAND_DOCUMENTS,
+        "threshold": CONFIDENCE_THRESHOLD,
+        "spell": SPELL_CORRECTION,
+    }
+
+
+def load_configs(path):
+    """Configuración actual seguida de las candidatas de ``path`` (cada una completada con la actual)"""
+    base = baseline_config()
+    configs = [base]
+    if path:
+        for i, candidate in enumerate(json.loads(Path(path).read_text(encoding="utf-8"))):
+            unknown = set(candidate) - set(base)
+            if unknown:
+                raise ValueError(f"configuración {i}: claves desconocidas {sorted(unknown)}")
+            config = {**base, "name": f"config{i + 1}", **candidate}
+            if config["name"] == BASELINE:
+                raise ValueError(f"'{BASELINE}' está reservado para la configuración actual")
+            if config["mode"] not in train_index.INDEX_MODES:
+                raise ValueError(f"configuración {config['name']}: modo desconocido {config['mode']}")
+            configs.append(config)
+    names = [c["name"] for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("los nombres de las configuraciones se repiten")
+    return configs
+
+
+def _index_key(config):
+    return json.dumps([config[k] for k in INDEX_KEYS])
+
+
+def _read_stopwords(path):
+    if not path:
+        return None
+    return [w.strip() for w in Path(path).read_text(encoding="utf-8").splitlines() if w.strip()]
+
+
+def _fit_index(args):
+    """Ajusta el índice de una configuración como train_index.py; devuelve (pipe, X, sinónimos)"""
+    config, questions, answers, db_synonyms = args
+    if config["synonyms"]:
+        synonyms = compile_synonyms(_normalize, config["synonyms"])
+    else:
+        synonyms = SynonymExpander({}, _normalize)
+    if db_synonyms and config["synonyms"] == str(SYNONYMS_PATH):
+        # Mismo diccionario que api.py con SYNONYMS_FROM_DB (fichero + tabla sinonimo)
+        synonyms = db_synonyms
+    docs = train_index.preprocess_text([f"{q.strip()} {a.strip()}" for q, a in zip(questions, answers)])
+    if config["expand_documents"]:
+        docs = [synonyms.expand(doc) for doc in docs]
+    pipe = train_index.build_pipeline(_read_stopwords(config["stopwords"]), config["mode"],
+                                      train_index.HASH_N_FEATURES, config["ngram_range"], config["max_df"])
+    X = pipe.fit_transform(docs)
+    return pipe, X, synonyms
+
+
+def _init_worker(indexes, configs, questions, answers, ids):
+    _worker["configs"] = configs
+    _worker["positions"] = {faq_id: i for i, faq_id in enumerate(ids)}
+    snaps = {}
+    for key, (pipe, X, synonyms) in indexes.items():
+        snaps[key] = IndexSnapshot.build(pipe, X, questions, answers, ids, generation=0, synonyms=synonyms)
+        if any(c["spell"] and _index_key(c) == key for c in configs):
+            snaps[key].spelling(_normalize)
+    _worker["snaps"] = snaps
+
+
+def _search(snap, nq):
+    v = snap.pipe.transform([snap.synonyms.expand(nq)])
+    idx, scores = snap.engine.search(v, 1)
+    if len(idx):
+        return int(idx[0]), float(scores[0])
+    return -1, 0.0
+
+
+def _answer_one(snap, nq, threshold, spelling):
+    """Camino de /ask para una consulta normalizada; devuelve (fila, puntuación)"""
+    ix, score = _search(snap, nq)
+    if score < threshold and spelling is not None:
+        fixed, changes = spelling.correct(nq)
+        if changes:
+            ix2, score2 = _search(snap, fixed)
+            if score2 > score:
+                return ix2, score2
+    return ix, score
+
+
+def _answer_batch(snap, normalized, threshold, spelling):
+    """Camino de /ask/batch: vectoriza y puntúa el bloque de una vez y reintenta corregidas las de bajo umbral.
+
+    Devuelve (filas, puntuaciones, corregidas).
+    """
+    V = snap.pipe.transform([snap.synonyms.expand(nq) for nq in normalized])
+    top, scores = snap.engine.best_batch(V)
+    top, scores = top.astype(np.int64), scores.astype(np.float64)
+    corrected = np.zeros(len(normalized), dtype=bool)
+    if spelling is not None:
+        retry = []
+        for j in np.flatnonzero(scores < threshold).tolist():
+            fixed, changes = spelling.correct(normalized[j])
+            if changes:
+                retry.append((j, fixed))
+        if retry:
+            V2 = snap.pipe.transform([snap.synonyms.expand(fixed) for _, fixed in retry])
+            top2, scores2 = snap.engine.best_batch(V2)
+            for (j, _), ix, score in zip(retry, top2.tolist(), scores2.tolist()):
+                if score > scores[j]:
+                    top[j], scores[j], corrected[j] = ix, score, True
+    return top, scores, corrected
+
+
+def _replay_chunk(queries):
+    """Repite un bloque de (consulta, etiqueta) en todas las configuraciones; devuelve contadores y latencias"""
+    configs, snaps, positions = _worker["configs"], _worker["snaps"], _worker["positions"]
+    n = len(queries)
+    labels = np.asarray([positions.get(label, -2) if label else -3 for _, label in queries], dtype=np.int64)
+    labeled = labels != -3
+    normalized = [_normalize(text) for text, _ in queries]
+    sample = normalized[::REPLAY_LATENCY_EVERY]
+    reference = None
+    out = []
+    for config in configs:
+        snap = snaps[_index_key(config)]
+        threshold = config["threshold"]
+        spelling = snap.spelling(_normalize, build=False) if config["spell"] else None
+        t = time.perf_counter()
+        top, scores, corrected = _answer_batch(snap, normalized, threshold, spelling)
+        batch_s = time.perf_counter() - t
+        below = (scores < threshold) | (top < 0)
+        answered = np.where(below, -1, top)
+        if reference is None:
+            reference = answered
+        # Latencia de una consulta suelta (camino de /ask) sobre una muestra del bloque
+        latency = np.empty(len(sample), dtype=np.float32)
+        for i, nq in enumerate(sample):
+            t = time.perf_counter()
+            _answer_one(snap, nq, threshold, spelling)
+            latency[i] = time.perf_counter() - t
+        out.append({
+            "below": int(below.sum()),
+            "labeled": int(labeled.sum()),
+            "agree": int((top[labeled] == labels[labeled]).sum()),
+            "corrected": int((corrected & ~below).sum()),
+            "changed": int((answered != reference).sum()),
+            "batch_s": batch_s,
+            "latency": latency,
+        })
+    return n, out
+
+
+def _read_faqs(source, conn):
+    """(preguntas, respuestas, ids) de la colección por defecto: de la BD o del artefacto publicado"""
+    if source == "serving":
+        directory = current_serving_dir(SERVING_DIR)
+        if directory is None:
+            raise SystemExit(f"no hay artefacto publicado en {SERVING_DIR}")
+        art = load_serving_index(directory)
+        return list(art["questions"]), list(art["answers"]), list(art["ids"])
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, q, a FROM faq WHERE coleccion = %s ORDER BY id", (DEFAULT_COLLECTION,))
+    rows = cursor.fetchall()
+    cursor.close()
+    return [q.strip() for _, q, _ in rows], [a.strip() for _, _, a in rows], [str(i) for i, _, _ in rows]
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_consulta(conn, days, limit=None, chunk_rows=REPLAY_CHUNK):
+    """(texto, faq_id servida) de las consultas de usuarios de los últimos ``days`` días, con cursor de servidor"""
+    cursor = conn.cursor(name="replay_consulta")
+    cursor.itersize = chunk_rows
+    sql = ("SELECT texto, faq_id FROM consulta WHERE timestamp >= now() - %s * INTERVAL '1 day' "
+           "AND texto NOT LIKE %s ORDER BY timestamp")
+    params = [days, SYSTEM_PREFIX + "%"]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    cursor.execute(sql, params)
+    try:
+        for texto, faq_id in cursor:
+            yield texto, str(faq_id) if faq_id else None
+    finally:
+        cursor.close()
+
+
+def stream_jsonl(path, limit=None):
+    """(consulta, etiqueta) de un fichero JSONL, línea a línea"""
+    with open(path, encoding="utf-8") as f:
+        n = 0
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            query = (record.get("query") or "").strip()
+            if not query:
+                continue
+            yield query, record.get("faq_id")
+            n += 1
+            if limit and n >= limit:
+                break
+
+
+def _latency_ms(samples):
+    s = np.concatenate(samples).astype(np.float64) * 1000.0 if samples else np.empty(0)
+    if not len(s):
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    return {"mean_ms": round(float(s.mean()), 4), "p50_ms": round(float(np.percentile(s, 50)), 4),
+            "p95_ms": round(float(np.percentile(s, 95)), 4), "p99_ms": round(float(np.percentile(s, 99)), 4)}
+
+
+def replay(configs, questions, answers, ids, queries, workers=REPLAY_WORKERS, chunk=REPLAY_CHUNK,
+           db_synonyms=None, progress=None):
+    """Ajusta los índices de ``configs`` y repite ``queries`` ((texto, etiqueta)) en todos; devuelve el informe"""
+    t0 = time.time()
+    keys = list(dict.fromkeys(_index_key(c) for c in configs))
+    first = {}
+    for c in configs:
+        first.setdefault(_index_key(c), c)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max(1, min(workers, len(keys))), mp_context=ctx) as executor:
+        fitted = executor.map(_fit_index, [(first[k], questions, answers, db_synonyms) for k in keys])
+        indexes = dict(zip(keys, fitted))
+    fit_s = time.time() - t0
+
+    totals = [{"below": 0, "labeled": 0, "agree": 0, "corrected": 0, "changed": 0, "batch_s": 0.0}
+              for _ in configs]
+    latencies = [[] for _ in configs]
+    n_queries = 0
+    t1 = time.time()
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(indexes, configs, questions, answers, ids)) as executor:
+        for _, (n, out) in train_index._bounded_map(executor, _replay_chunk, _chunks(queries, chunk),
+                                                    max(2 * workers, 2)):
+            n_queries += n
+            for total, lat, part in zip(totals, latencies, out):
+                lat.append(part.pop("latency"))
+                for name, value in part.items():
+                    total[name] += value
+            if progress:
+                progress(n_queries, time.time() - t1)
+
+    results = []
+    for config, total, lat in zip(configs, totals, latencies):
+        results.append({
+            "name": config["name"],
+            "config": config,
+            "queries": n_queries,
+            "answer_change_rate": total["changed"] / n_queries if n_queries else None,
+            "below_threshold_rate": total["below"] / n_queries if n_queries else None,
+            "top1_agreement": total["agree"] / total["labeled"] if total["labeled"] else None,
+            "labeled": total["labeled"],
+            "corrected_rate": total["corrected"] / n_queries if n_queries else None,
+            # Coste por consulta en lotes (como /ask/batch) y latencia de consultas sueltas (como /ask)
+            "batch_ms_per_query": round(total["batch_s"] * 1000.0 / n_queries, 4) if n_queries else None,
+            "latency_samples": int(sum(len(x) for x in lat)),
+            **_latency_ms(lat),
+        })
+    return {"faqs": len(ids), "queries": n_queries, "indexes": len(keys), "fit_s": round(fit_s, 3),
+            "replay_s": round(time.time() - t1, 3), "results": results}
+
+
+def _connect():
+    return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repite consultas registradas contra configuraciones candidatas")
+    parser.add_argument("--configs", help="fichero JSON con la lista de configuraciones candidatas")
+    parser.add_argument("--queries", default="consulta", help="'consulta' o un fichero JSONL")
+    parser.add_argument("--days", type=int, default=REPLAY_DAYS)
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--faqs", choices=("db", "serving"), default="db",
+                        help="FAQs de la tabla faq o del artefacto publicado")
+    parser.add_argument("--workers", type=int, default=REPLAY_WORKERS)
+    parser.add_argument("--chunk", type=int, default=REPLAY_CHUNK)
+    parser.add_argument("--out", help="fichero JSON del informe")
+    args = parser.parse_args(argv)
+
+    configs = load_configs(args.configs)
+    conn = _connect() if args.faqs == "db" or args.queries == "consulta" else None
+    questions, answers, ids = _read_faqs(args.faqs, conn)
+    db_synonyms = None
+    if conn is not None and SYNONYMS_FROM_DB:
+        db_synonyms = compile_synonyms(_normalize, cursor=conn.cursor())
+    if args.queries == "consulta":
+        conn.autocommit = False
+        queries = stream_consulta(conn, args.days, args.limit, args.chunk)
+    else:
+        queries = stream_jsonl(args.queries, args.limit)
+
+    def progress(done, seconds):
+        print(f"  {done} consultas, {done / max(seconds, 1e-9):.0f} consultas/s", flush=True)
+
+    print(f"{len(ids)} FAQs, {len(configs)} configuraciones, {args.workers} procesos")
+    report = replay(configs, questions, answers, ids, queries, args.workers, args.chunk, db_synonyms, progress)
+    if conn is not None:
+        conn.rollback()
+        conn.close()
+
+    print(f"\n{report['queries']} consultas; {report['indexes']} índices ajustados en {report['fit_s']}s, "
+          f"repetición en {report['replay_s']}s")
+    print(f"{'config':>16} {'cambio':>8} {'sin resp.':>10} {'top1':>7} {'corregidas':>11} "
+          f"{'lote_ms':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}")
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else format("-", spec[0] + spec[1:].split(".")[0])
+
+    for r in report["results"]:
+        print(f"{r['name']:>16} {fmt(r['answer_change_rate'], '>8.3f')} {fmt(r['below_threshold_rate'], '>10.3f')} "
+              f"{fmt(r['top1_agreement'], '>7.3f')} {fmt(r['corrected_rate'], '>11.3f')} "
+              f"{fmt(r['batch_ms_per_query'], '>8.3f')} {fmt(r['p50_ms'], '>8.3f')} {fmt(r['p95_ms'], '>8.3f')} {fmt(r['p99_ms'], '>8.3f')}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Informe: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Retención del registro de consultas (tabla consulta particionada por mes).
+#
+#   python retention.py --keep-months 12 --archive-dir archivo_consultas
+#
+# Crea por adelantado las particiones de los próximos meses y, para cada
+# mes más antiguo que ``--keep-months``, exporta la partición a un CSV
+# comprimido con gzip, la separa de consulta y la borra. Quitar un mes
+# entero es un DROP de su tabla, no un DELETE sobre el registro. Los
+# resúmenes de analytics.py no se tocan, así que /stats conserva la historia.
+# Conviene ejecutarlo una vez al mes (p. ej. desde cron).
+import argparse
+import datetime
+import gzip
+import os
+import re
+from pathlib import Path
+
+import psycopg2
+
+# Configuración de la base de datos
+DB_NAME = "DefensaIA"
+DB_USER = "postgres"
+DB_PASSWORD = "postgres"
+DB_HOST = "localhost"
+DB_PORT = "5432"
+
+KEEP_MONTHS = 12                        # Meses de consultas que se conservan en la base de datos
+MONTHS_AHEAD = 3                        # Particiones futuras que se crean por adelantado
+ARCHIVE_DIR = Path("archivo_consultas") # Destino de los CSV comprimidos
+
+_PARTITION = re.compile(r"^consulta_(\d{4})_(\d{2})$")
+
+
+def _add_months(month, n):
+    y, m = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return datetime.date(y, m + 1, 1)
+
+
+def ensure_partitions(cursor, months_ahead=MONTHS_AHEAD, today=None):
+    """Crea las particiones del mes actual y de los ``months_ahead`` siguientes; devuelve sus nombres"""
+    first = (today or datetime.date.today()).replace(day=1)
+    names = []
+    for i in range(months_ahead + 1):
+        cursor.execute("SELECT crear_particion_consulta(%s)", (_add_months(first, i),))
+        names.append(cursor.fetchone()[0])
+    return names
+
+
+def monthly_partitions(cursor):
+    """Particiones mensuales de consulta como [(nombre, primer día del mes)] ordenadas"""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'consulta'::regclass"
+    )
+    parts = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION.match(name)
+        if match:
+            parts.append((name, datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(parts, key=lambda p: p[1])
+
+
+def expired_partitions(cursor, keep_months=KEEP_MONTHS, today=None):
+    """Particiones cuyo mes entero queda fuera de los últimos ``keep_months`` meses"""
+    cutoff = _add_months((today or datetime.date.today()).replace(day=1), -keep_months)
+    return [(name, month) for name, month in monthly_partitions(cursor) if month < cutoff]
+
+
+def export_partition(cursor, name, archive_dir=ARCHIVE_DIR):
+    """Copia la partición a ``archive_dir/<nombre>.csv.gz`` (con cabecera); devuelve la ruta"""
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{name}.csv.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", newline="") as fp:
+        cursor.copy_expert(f'COPY "{name}" (id, texto, timestamp, score, faq_id) TO STDOUT WITH (FORMAT csv, HEADER)', fp)
+    # El fichero queda completo en disco antes de borrar la partición
+    with open(tmp, "rb") as fp:
+        os.fsync(fp.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def archive_partition(conn, name, archive_dir=ARCHIVE_DIR, drop=True):
+    """Exporta la partición y después la separa de consulta (y la borra con ``drop``) en una transacción"""
+    cursor = conn.cursor()
+    try:
+        path = export_partition(cursor, name, archive_dir) if archive_dir else None
+        cursor.execute(f'ALTER TABLE consulta DETACH PARTITION "{name}"')
+        if drop:
+            cursor.execute(f'DROP TABLE "{name}"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crea particiones futuras de consulta y archiva las antiguas")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS)
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--no-archive", action="store_true", help="borrar sin exportar")
+    parser.add_argument("--keep-detached", action="store_true",
+                        help="solo separar las particiones (quedan como tablas sueltas)")
+    parser.add_argument("--dry-run", action="store_true", help="mostrar qué se haría sin cambiar nada")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+    cursor = conn.cursor()
+    expired = expired_partitions(cursor, args.keep_months)
+    if args.dry_run:
+        print(f"Se archivarían {len(expired)} particiones: {', '.join(name for name, _ in expired) or '-'}")
+        conn.close()
+        return
+
+    created = ensure_partitions(cursor, args.months_ahead)
+    conn.commit()
+    cursor.close()
+    print(f"Particiones disponibles hasta {created[-1]}")
+
+    for name, _ in expired:
+        path = archive_partition(conn, name, None if args.no_archive else args.archive_dir,
+                                 drop=not args.keep_detached)
+        action = "separada" if args.keep_detached else "borrada"
+        print(f"{name}: {action}" + (f", archivada en {path}" if path else ""))
+    conn.close()
+    print(f"Retención aplicada: {len(expired)} particiones anteriores a {args.keep_months} meses.")
+
+
+if __name__ == "__main__":
+    main()
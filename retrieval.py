@@ -0,0 +1,304 @@
+import copy
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def _l2_normalize_rows(M):
+    """Normaliza (L2) cada fila de una matriz CSR en su lugar"""
+    sq = M.multiply(M).sum(axis=1).A1
+    norms = np.sqrt(sq, dtype=np.float64)
+    norms[norms == 0.0] = 1.0
+    M.data /= np.repeat(norms, np.diff(M.indptr)).astype(M.dtype)
+    return M
+
+
+class RetrievalEngine:
+    """Motor de recuperación top-k sobre la matriz TF-IDF de las FAQs.
+
+    Se construye una sola vez por índice: guarda las filas ya normalizadas
+    en CSR float32 y un índice invertido término -> postings (la traspuesta
+    en CSR). Una consulta solo puntúa las FAQs que comparten algún término
+    con ella, por lo que el costo crece con los postings recorridos y no con
+    el tamaño del corpus. ``search_brute`` conserva el cálculo exhaustivo
+    (equivalente a ``cosine_similarity``) como alternativa.
+
+    Las altas, cambios y bajas individuales no reconstruyen la matriz base:
+    ``with_row``/``without_row`` devuelven un motor nuevo que comparte la
+    base y añade una capa pequeña de filas modificadas (``overlay``) y de
+    filas ocultas (``masked``/``dead``). Esa capa se descarta en la
+    siguiente reconstrucción completa.
+    """
+
+    def __init__(self, X):
+        M = sp.csr_matrix(X, dtype=np.float32, copy=True)
+        M.sum_duplicates()
+        # Índice invertido: fila t = documentos que contienen el término t
+        M = _l2_normalize_rows(M)
+        self._setup(M, M.T.tocsr())
+
+    @classmethod
+    def from_normalized(cls, matrix, postings):
+        """Motor a partir de una matriz ya normalizada y su traspuesta (p. ej. mapeadas en memoria), sin copiarlas"""
+        engine = cls.__new__(cls)
+        engine._setup(matrix, postings)
+        return engine
+
+    def _setup(self, matrix, postings):
+        self.matrix = matrix
+        self.postings = postings
+        self.base_docs, self.n_terms = self.matrix.shape
+        self.n_docs = self.base_docs
+        # Capa incremental: filas nuevas/modificadas y filas ocultas
+        self.overlay = {}
+        self.masked = frozenset()   # filas base ocultas (borradas o reemplazadas por el overlay)
+        self.dead = frozenset()     # filas borradas (base o añadidas)
+        self._refresh_overlay()
+
+    def _refresh_overlay(self):
+        """Precalcula las estructuras de la capa incremental tras un cambio"""
+        self._masked_arr = np.fromiter(sorted(self.masked), dtype=np.int64, count=len(self.masked))
+        self._overlay_ids = np.fromiter(sorted(self.overlay), dtype=np.int64, count=len(self.overlay))
+        if self.overlay:
+            self._overlay_matrix = sp.vstack([self.overlay[i] for i in self._overlay_ids], format="csr")
+        else:
+            self._overlay_matrix = None
+
+    def _normalized_row(self, v):
+        terms, weights = self._query_terms(v)
+        order = np.argsort(terms)
+        return sp.csr_matrix((weights[order], terms[order], [0, len(terms)]), shape=(1, self.n_terms))
+
+    def with_row(self, ix, v):
+        """Motor nuevo en el que la fila ``ix`` (existente o nueva) toma el vector ``v``"""
+        new = copy.copy(self)
+        new.overlay = dict(self.overlay)
+        new.overlay[ix] = self._normalized_row(v)
+        if ix < self.base_docs:
+            new.masked = self.masked | {ix}
+        new.dead = self.dead - {ix}
+        new.n_docs = max(self.n_docs, ix + 1)
+        new._refresh_overlay()
+        return new
+
+    def without_row(self, ix):
+        """Motor nuevo en el que la fila ``ix`` queda marcada como borrada"""
+        new = copy.copy(self)
+        new.overlay = dict(self.overlay)
+        new.overlay.pop(ix, None)
+        if ix < self.base_docs:
+            new.masked = self.masked | {ix}
+        new.dead = self.dead | {ix}
+        new._refresh_overlay()
+        return new
+
+    def row_terms(self, ix):
+        """Índices de término con peso no nulo en la fila servida ``ix`` (vacío si está borrada)"""
+        if ix in self.dead or ix >= self.n_docs:
+            return np.empty(0, dtype=np.int32)
+        if ix in self.overlay:
+            return self.overlay[ix].indices
+        return self.matrix.indices[self.matrix.indptr[ix]:self.matrix.indptr[ix + 1]]
+
+    def row_vector(self, ix):
+        """Fila servida ``ix`` (normalizada, 1 x n_terms) o None si está borrada"""
+        if ix in self.dead or ix >= self.n_docs:
+            return None
+        if ix in self.overlay:
+            return self.overlay[ix]
+        return self.matrix[ix]
+
+    @property
+    def live_docs(self):
+        return self.n_docs - len(self.dead)
+
+    @property
+    def nnz(self):
+        """Pesos no nulos servidos (matriz base más filas del overlay)"""
+        return int(self.matrix.nnz) + (int(self._overlay_matrix.nnz) if self._overlay_matrix is not None else 0)
+
+    @staticmethod
+    def _query_terms(v):
+        """Devuelve (términos, pesos normalizados) de un vector de consulta 1 x n_terms"""
+        v = sp.csr_matrix(v)
+        terms = v.indices
+        weights = v.data.astype(np.float32)
+        norm = float(np.sqrt(np.dot(weights, weights)))
+        if norm > 0.0:
+            weights = weights / norm
+        return terms, weights
+
+    def _candidates(self, terms, weights):
+        """Acumula puntuaciones solo para los documentos que aparecen en los postings"""
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        doc_parts, score_parts = [], []
+        for t, w in zip(terms, weights):
+            start, end = indptr[t], indptr[t + 1]
+            if start == end:
+                continue
+            doc_parts.append(indices[start:end])
+            score_parts.append(data[start:end] * w)
+        if doc_parts:
+            docs = np.concatenate(doc_parts)
+            contrib = np.concatenate(score_parts)
+            uniq, inv = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inv, weights=contrib).astype(np.float32)
+            if len(self._masked_arr):
+                keep = ~np.isin(uniq, self._masked_arr, assume_unique=True)
+                uniq, scores = uniq[keep], scores[keep]
+        else:
+            uniq, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self._overlay_matrix is not None and len(terms):
+            q = sp.csr_matrix((weights, terms, [0, len(terms)]), shape=(1, self.n_terms))
+            o_scores = (self._overlay_matrix @ q.T).toarray().ravel().astype(np.float32)
+            hit = o_scores > 0.0
+            uniq = np.concatenate([uniq.astype(np.int64), self._overlay_ids[hit]])
+            scores = np.concatenate([scores, o_scores[hit]])
+        return uniq, scores
+
+    @staticmethod
+    def _top(docs, scores, k):
+        """Selección parcial de los k mejores (argpartition + orden solo de esos k)"""
+        if len(scores) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[part], scores[part]
+        order = np.lexsort((docs, -scores))
+        return docs[order], scores[order]
+
+    def _pad(self, docs, scores, k):
+        """Completa con documentos de puntuación 0 para devolver siempre min(k, n_docs) resultados"""
+        want = min(k, self.live_docs)
+        if len(docs) >= want:
+            return docs, scores
+        seen = set(docs.tolist())
+        extra = []
+        i = 0
+        while len(docs) + len(extra) < want:
+            if i not in seen and i not in self.dead:
+                extra.append(i)
+            i += 1
+        docs = np.concatenate([docs, np.asarray(extra, dtype=docs.dtype)])
+        scores = np.concatenate([scores, np.zeros(len(extra), dtype=np.float32)])
+        return docs, scores
+
+    def candidates(self, v):
+        """(documentos, coseno) de todas las FAQs que comparten algún término con ``v``, sin ordenar"""
+        return self._candidates(*self._query_terms(v))
+
+    def search(self, v, k=1):
+        """Top-k por similitud coseno usando el índice invertido"""
+        terms, weights = self._query_terms(v)
+        docs, scores = self._candidates(terms, weights)
+        docs, scores = self._top(docs, scores, k)
+        return self._pad(docs, scores, k)
+
+    def search_brute(self, v, k=1):
+        """Top-k exhaustivo contra toda la matriz (camino original, sin índice invertido)"""
+        terms, weights = self._query_terms(v)
+        q = sp.csr_matrix((weights, terms, [0, len(terms)]), shape=(1, self.n_terms))
+        scores = np.full(self.n_docs, -1.0, dtype=np.float32)
+        scores[:self.base_docs] = (self.matrix @ q.T).toarray().ravel()
+        scores[self._masked_arr] = -1.0
+        if self._overlay_matrix is not None:
+            scores[self._overlay_ids] = (self._overlay_matrix @ q.T).toarray().ravel()
+        idx = scores.argsort()[::-1][:k]
+        # Las filas borradas quedan con -1 y nunca se devuelven
+        idx = idx[scores[idx] >= 0.0]
+        return idx, scores[idx]
+
+    def best_batch(self, V, block_rows=256):
+        """Mejor FAQ para cada fila de V con un producto disperso V · Xᵀ por bloques de filas.
+
+        El índice es -1 si la consulta no comparte ningún término con una FAQ viva.
+        """
+        V = sp.csr_matrix(V, dtype=np.float32)
+        V = _l2_normalize_rows(V.copy())
+        n = V.shape[0]
+        best_idx = np.zeros(n, dtype=np.int64)
+        best_score = np.zeros(n, dtype=np.float32)
+        MT = self.postings  # Xᵀ en CSR
+        mask = None
+        if len(self._masked_arr):
+            keep = np.ones(self.base_docs, dtype=np.float32)
+            keep[self._masked_arr] = 0.0
+            mask = sp.diags(keep, format="csr")
+        for start in range(0, n, block_rows):
+            block = V[start:start + block_rows]
+            S = (block @ MT).tocsr()
+            if mask is not None:
+                S = (S @ mask).tocsr()
+            rows = slice(start, start + S.shape[0])
+            best_idx[rows] = np.asarray(S.argmax(axis=1)).ravel()
+            best_score[rows] = S.max(axis=1).toarray().ravel()
+            if self._overlay_matrix is not None:
+                SO = (block @ self._overlay_matrix.T).toarray()
+                o_best = SO.argmax(axis=1)
+                o_score = SO[np.arange(SO.shape[0]), o_best]
+                better = o_score > best_score[rows]
+                best_idx[rows] = np.where(better, self._overlay_ids[o_best], best_idx[rows])
+                best_score[rows] = np.where(better, o_score, best_score[rows])
+        # argmax de una fila sin coincidencias devuelve 0, que puede ser una fila borrada
+        best_idx[best_score <= 0.0] = -1
+        return best_idx, best_score
+
+
+class DriftTracker:
+    """Mide cuánto se ha alejado el índice servido del que daría un reajuste completo.
+
+    Registra los cambios incrementales desde el último ajuste del vectorizador:
+    proporción de documentos modificados, n-gramas fuera del vocabulario
+    (que el índice incremental no puede representar) en relación con los
+    pares documento-término del índice, y variación relativa de las
+    frecuencias de documento que determinan el IDF.
+    """
+
+    def __init__(self, engine):
+        self.df_at_fit = np.diff(engine.postings.indptr)
+        self.df_sum = int(self.df_at_fit.sum())
+        self.n_at_fit = engine.live_docs
+        self.n_docs = self.n_at_fit
+        self.changed_docs = 0
+        self.ngrams = 0
+        self.oov_ngrams = 0
+        self._df_delta = {}
+        self._df_abs_delta = 0
+
+    def _shift(self, terms, step):
+        for t in terms.tolist():
+            old = self._df_delta.get(t, 0)
+            new = old + step
+            self._df_abs_delta += abs(new) - abs(old)
+            if new:
+                self._df_delta[t] = new
+            else:
+                self._df_delta.pop(t, None)
+
+    def record(self, old_terms, new_terms, ngrams=0, oov_ngrams=0):
+        """Registra un cambio de documento: términos antes/después (None = no existe)"""
+        self.changed_docs += 1
+        if old_terms is not None:
+            self._shift(old_terms, -1)
+            self.n_docs -= 1
+        if new_terms is not None:
+            self._shift(new_terms, 1)
+            self.n_docs += 1
+        self.ngrams += ngrams
+        self.oov_ngrams += oov_ngrams
+
+    def stats(self):
+        n_fit = max(self.n_at_fit, 1)
+        changed_ratio = self.changed_docs / n_fit
+        oov_ratio = self.oov_ngrams / max(self.df_sum, 1)
+        idf_drift = self._df_abs_delta / max(self.df_sum, 1) + abs(self.n_docs - self.n_at_fit) / n_fit
+        return {
+            "changed_docs": self.changed_docs,
+            "changed_ratio": changed_ratio,
+            "ngrams": self.ngrams,
+            "oov_ngrams": self.oov_ngrams,
+            "oov_ratio": oov_ratio,
+            "idf_drift": idf_drift,
+            "drift": max(changed_ratio, oov_ratio, idf_drift),
+        }
+
+    def exceeds(self, threshold):
+        return self.stats()["drift"] > threshold
@@ -0,0 +1,427 @@
+# Artefacto de servicio compacto y sin scikit-learn.
+#
+# train_index.py (y /reload) exportan el índice a un directorio versionado:
+#
+#   meta.json                          configuración del vectorizador y tamaños
+#   vocab.bin / vocab_offsets.npy      términos ordenados (UTF-8) con sus desplazamientos
+#   vocab_ids.npy / vocab_pos.npy      posición ordenada -> columna y columna -> posición
+#   idf.npy                            IDF en float32 (una entrada por columna o por cubeta)
+#   matrix_*.npy / postings_*.npy      CSR normalizada y su traspuesta (índice invertido)
+#   questions.bin / answers.bin / ids.bin (+ *_offsets.npy)   textos indexados por desplazamiento
+#   dense_*.npy                        índice denso (LSA) opcional, ver dense_index.py
+#
+# Todo se abre con mmap: el arranque no deserializa nada y los procesos que
+# sirven el mismo artefacto comparten las páginas en la caché del sistema.
+# El fichero CURRENT del directorio raíz apunta a la versión activa.
+#
+# En el modo "hashing" no hay vocabulario: la columna de cada n-grama es su
+# murmurhash3 (la misma función que HashingVectorizer) módulo n_features.
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+from dense_index import load_dense, save_dense
+from retrieval import RetrievalEngine
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+# Versiones anteriores que se conservan (otros procesos pueden seguir usándolas): una versión
+# solo se borra si hay KEEP_VERSIONS más nuevas y dejó de ser la activa hace más de
+# KEEP_VERSION_SECONDS. El margen cubre a los workers que aún no han recibido la versión nueva
+# (consultan indice_publicado cada INDEX_SYNC_POLL_SECONDS de api.py) y a quien esté a punto
+# de abrirla (dedup.py, replay_eval.py); lo ya mapeado sobrevive al borrado.
+KEEP_VERSIONS = 2
+KEEP_VERSION_SECONDS = 600.0
+
+
+def murmurhash3_32(data, seed=0):
+    """MurmurHash3 x86 de 32 bits con signo (igual que ``sklearn.utils.murmurhash3_32``)"""
+    c1, c2, mask = 0xCC9E2D51, 0x1B873593, 0xFFFFFFFF
+    h = seed & mask
+    n = len(data)
+    end = n - n % 4
+    for i in range(0, end, 4):
+        k = int.from_bytes(data[i:i + 4], "little")
+        k = (k * c1) & mask
+        k = ((k << 15) | (k >> 17)) & mask
+        k = (k * c2) & mask
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & mask
+        h = (h * 5 + 0xE6546B64) & mask
+    tail = n % 4
+    if tail:
+        k = int.from_bytes(data[end:], "little")
+        k = (k * c1) & mask
+        k = ((k << 15) | (k >> 17)) & mask
+        k = (k * c2) & mask
+        h ^= k
+    h ^= n
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & mask
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & mask
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+
+def hash_column(gram, n_features):
+    """Columna de un n-grama en el modo hashing (misma regla que HashingVectorizer)"""
+    h = murmurhash3_32(gram.encode("utf-8"))
+    if h == -2147483648:
+        return (2147483647 - (n_features - 1)) % n_features
+    return abs(h) % n_features
+
+
+def _map_file(path):
+    """Abre un fichero en solo lectura con mmap (bytes vacíos si está vacío)"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_strings(out_dir, name, strings):
+    """Guarda una lista de textos como un bloque UTF-8 más un array de desplazamientos"""
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(out_dir / f"{name}.bin", "wb") as f:
+        pos = 0
+        for i, text in enumerate(strings):
+            data = text.encode("utf-8")
+            f.write(data)
+            pos += len(data)
+            offsets[i + 1] = pos
+    np.save(out_dir / f"{name}_offsets.npy", offsets)
+
+
+class StringTable:
+    """Secuencia de textos de solo lectura respaldada por un bloque mapeado en memoria"""
+
+    def __init__(self, directory, name):
+        self._blob = _map_file(directory / f"{name}.bin")
+        self._offsets = np.load(directory / f"{name}_offsets.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def raw(self, i):
+        return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class Vocabulary:
+    """Vocabulario ordenado con búsqueda binaria; se comporta como ``vocabulary_`` de sklearn"""
+
+    def __init__(self, directory):
+        self._terms = StringTable(directory, "vocab")
+        self._ids = np.load(directory / "vocab_ids.npy", mmap_mode="r")
+        self._pos = np.load(directory / "vocab_pos.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self._terms)
+
+    def get(self, term, default=None):
+        key = term.encode("utf-8")
+        lo, hi = 0, len(self._terms)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self._terms.raw(mid)
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return int(self._ids[mid])
+        return default
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __getitem__(self, term):
+        ix = self.get(term)
+        if ix is None:
+            raise KeyError(term)
+        return ix
+
+    def term(self, ix):
+        """Término de la columna ``ix`` (acceso directo, sin construir el array completo)"""
+        return self._terms[int(self._pos[ix])]
+
+
+class FeatureNames:
+    """Vista perezosa columna -> término, equivalente a ``get_feature_names_out()``"""
+
+    def __init__(self, vocabulary):
+        self._vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self._vocabulary)
+
+    def __getitem__(self, ix):
+        return self._vocabulary.term(ix)
+
+
+class MmapTfidfVectorizer:
+    """Reproduce ``TfidfVectorizer.transform`` (analizador de palabras) a partir del artefacto.
+
+    Expone ``build_analyzer``, ``vocabulary_``, ``stop_words_`` y
+    ``get_feature_names_out`` con la misma semántica que sklearn, y
+    ``named_steps`` para usarse donde se espera el pipeline entrenado.
+    """
+
+    def __init__(self, directory, meta):
+        self._setup(directory, meta)
+        self.vocabulary_ = Vocabulary(directory)
+        self._feature_names = FeatureNames(self.vocabulary_)
+        self.n_features = len(self.vocabulary_)
+
+    def _setup(self, directory, meta):
+        self.idf_ = np.load(directory / "idf.npy", mmap_mode="r")
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.sublinear_tf = meta["sublinear_tf"]
+        self.norm = meta["norm"]
+        self.stop_words = frozenset(meta["stop_words"] or ())
+        self.stop_words_ = frozenset()
+        self.token_pattern = meta["token_pattern"]
+        self._token_re = re.compile(self.token_pattern)
+        self.named_steps = {"tfidf": self}
+        self.steps = [("tfidf", self)]
+
+    def _column(self, gram):
+        return self.vocabulary_.get(gram)
+
+    def build_analyzer(self):
+        """Tokeniza, quita stopwords y genera n-gramas igual que sklearn"""
+        token_re, stop_words = self._token_re, self.stop_words
+        min_n, max_n = self.ngram_range
+
+        def analyze(doc):
+            tokens = [w for w in token_re.findall(doc) if w not in stop_words]
+            if max_n == 1:
+                return tokens
+            original = tokens
+            n_original = len(original)
+            if min_n == 1:
+                grams = list(original)
+                start = 2
+            else:
+                grams = []
+                start = min_n
+            for n in range(start, min(max_n + 1, n_original + 1)):
+                for i in range(n_original - n + 1):
+                    grams.append(" ".join(original[i:i + n]))
+            return grams
+
+        return analyze
+
+    def get_feature_names_out(self):
+        return self._feature_names
+
+    def transform(self, docs):
+        analyze = self.build_analyzer()
+        lookup = self._column
+        indptr, indices, values = [0], [], []
+        for doc in docs:
+            counts = Counter()
+            for gram in analyze(doc):
+                ix = lookup(gram)
+                if ix is not None:
+                    counts[ix] += 1
+            cols = sorted(counts)
+            tf = np.array([counts[c] for c in cols], dtype=np.float64)
+            if self.sublinear_tf and len(tf):
+                tf = np.log(tf) + 1.0
+            w = tf * self.idf_[cols] if cols else tf
+            if self.norm == "l2" and len(w):
+                norm = math.sqrt(float(np.dot(w, w)))
+                if norm > 0.0:
+                    w = w / norm
+            indices.extend(cols)
+            values.extend(w.tolist())
+            indptr.append(len(indices))
+        return sp.csr_matrix(
+            (np.asarray(values, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(docs), self.n_features),
+        )
+
+
+class MmapHashingVectorizer(MmapTfidfVectorizer):
+    """Equivalente de HashingVectorizer + TfidfTransformer: sin vocabulario, memoria fija"""
+
+    def __init__(self, directory, meta):
+        self._setup(directory, meta)
+        self.vocabulary_ = None
+        self.n_features = meta["n_features"]
+
+    def _column(self, gram):
+        return hash_column(gram, self.n_features)
+
+    def get_feature_names_out(self):
+        raise AttributeError("el modo hashing no tiene nombres de columnas")
+
+
+def _save_csr(out_dir, name, M):
+    np.save(out_dir / f"{name}_data.npy", M.data)
+    np.save(out_dir / f"{name}_indices.npy", M.indices)
+    np.save(out_dir / f"{name}_indptr.npy", M.indptr)
+
+
+def _load_csr(directory, name, shape):
+    return sp.csr_matrix(
+        (
+            np.load(directory / f"{name}_data.npy", mmap_mode="r"),
+            np.load(directory / f"{name}_indices.npy", mmap_mode="r"),
+            np.load(directory / f"{name}_indptr.npy", mmap_mode="r"),
+        ),
+        shape=shape,
+        copy=False,
+    )
+
+
+def export_serving_index(out_dir, pipe, X, questions, answers, ids, dense=None):
+    """Escribe el artefacto de servicio de un pipeline TF-IDF entrenado (y su índice denso) en ``out_dir``"""
+    vec = pipe.steps[0][1]
+    tfidf = pipe.steps[-1][1]
+    hashing = getattr(vec, "vocabulary_", None) is None
+    if (vec.analyzer != "word" or vec.tokenizer is not None or vec.preprocessor is not None
+            or vec.lowercase or vec.strip_accents is not None):
+        raise ValueError("el artefacto de servicio solo reproduce el analizador de palabras sin preprocesado")
+    if hashing and (vec.alternate_sign or vec.norm is not None or vec.binary):
+        raise ValueError("el modo hashing requiere alternate_sign=False, norm=None y binary=False")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if not hashing:
+        terms = vec.get_feature_names_out()
+        order = sorted(range(len(terms)), key=lambda i: terms[i].encode("utf-8"))
+        ids_sorted = np.asarray(order, dtype=np.int32)
+        pos = np.empty(len(order), dtype=np.int32)
+        pos[ids_sorted] = np.arange(len(order), dtype=np.int32)
+        _write_strings(out_dir, "vocab", [terms[i] for i in order])
+        np.save(out_dir / "vocab_ids.npy", ids_sorted)
+        np.save(out_dir / "vocab_pos.npy", pos)
+    np.save(out_dir / "idf.npy", tfidf.idf_.astype(np.float32))
+
+    engine = RetrievalEngine(X)
+    _save_csr(out_dir, "matrix", engine.matrix)
+    _save_csr(out_dir, "postings", engine.postings)
+
+    _write_strings(out_dir, "questions", list(questions))
+    _write_strings(out_dir, "answers", list(answers))
+    _write_strings(out_dir, "ids", [str(i) for i in ids])
+    if dense is not None:
+        save_dense(out_dir, dense)
+
+    stop_words = vec.get_stop_words()
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "mode": "hashing" if hashing else "vocabulary",
+        "n_docs": engine.base_docs,
+        "n_terms": engine.n_terms,
+        "n_features": int(vec.n_features) if hashing else engine.n_terms,
+        "ngram_range": list(vec.ngram_range),
+        "token_pattern": vec.token_pattern,
+        "sublinear_tf": bool(tfidf.sublinear_tf),
+        "norm": tfidf.norm,
+        "stop_words": sorted(stop_words) if stop_words else None,
+        "dense_dim": dense.dim if dense is not None else None,
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    return out_dir
+
+
+def publish_serving_index(root, pipe, X, questions, answers, ids, dense=None):
+    """Exporta una versión nueva bajo ``root`` y la activa reescribiendo CURRENT de forma atómica"""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"v{time.time_ns()}"
+    export_serving_index(root / name, pipe, X, questions, answers, ids, dense)
+    tmp = root / (CURRENT_FILE + ".tmp")
+    tmp.write_text(name, encoding="utf-8")
+    os.replace(tmp, root / CURRENT_FILE)
+    prune_serving_versions(root, keep=name)
+    return root / name
+
+
+def _version_ns(name):
+    try:
+        return int(name[1:])
+    except ValueError:
+        return None
+
+
+def prune_serving_versions(root, keep=None, now=None):
+    """Borra las versiones antiguas de ``root`` (ver KEEP_VERSIONS y KEEP_VERSION_SECONDS).
+
+    Una versión dejó de ser la activa cuando se creó la siguiente, así que su
+    antigüedad se mide desde el nombre (instante de creación) de esta. Nunca
+    se borra ``keep`` ni la versión de CURRENT.
+    """
+    root = Path(root)
+    now = time.time() if now is None else now
+    current = root / CURRENT_FILE
+    active = {keep, current.read_text(encoding="utf-8").strip() if current.exists() else None}
+    versions = sorted((p for p in root.iterdir() if p.is_dir() and p.name.startswith("v")
+                       and _version_ns(p.name) is not None), key=lambda p: _version_ns(p.name))
+    removed = []
+    for old, newer in zip(versions[:-KEEP_VERSIONS], versions[1:]):
+        if old.name in active:
+            continue
+        if now - _version_ns(newer.name) / 1e9 < KEEP_VERSION_SECONDS:
+            continue
+        shutil.rmtree(old, ignore_errors=True)
+        removed.append(old.name)
+    return removed
+
+
+def current_serving_dir(root):
+    """Directorio de la versión activa del artefacto (o None si no existe)"""
+    current = Path(root) / CURRENT_FILE
+    if not current.exists():
+        return None
+    directory = Path(root) / current.read_text(encoding="utf-8").strip()
+    return directory if (directory / "meta.json").exists() else None
+
+
+def load_serving_index(directory):
+    """Abre un artefacto de servicio; devuelve vectorizador, motores, textos e ids mapeados en memoria"""
+    directory = Path(directory)
+    meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+    if meta["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"versión de artefacto no soportada: {meta['format_version']}")
+    shape = (meta["n_docs"], meta["n_terms"])
+    engine = RetrievalEngine.from_normalized(
+        _load_csr(directory, "matrix", shape),
+        _load_csr(directory, "postings", (shape[1], shape[0])),
+    )
+    vectorizer_cls = MmapHashingVectorizer if meta.get("mode") == "hashing" else MmapTfidfVectorizer
+    return {
+        "vectorizer": vectorizer_cls(directory, meta),
+        "engine": engine,
+        "dense": load_dense(directory, meta["n_features"]) if meta.get("dense_dim") else None,
+        "questions": StringTable(directory, "questions"),
+        "answers": StringTable(directory, "answers"),
+        "ids": StringTable(directory, "ids"),
+        "meta": meta,
+    }
@@ -5,20 +5,117 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE TABLE IF NOT EXISTS faq (
     id UUID PRIMARY KEY,
     q TEXT NOT NULL,
-    a TEXT NOT NULL
+    a TEXT NOT NULL,
+    coleccion TEXT NOT NULL DEFAULT 'general'   -- colección (ver faq_collections.py); 'general' = índice global
 );
 
+-- Bases creadas antes de las colecciones: todas sus FAQs quedan en 'general'
+ALTER TABLE faq ADD COLUMN IF NOT EXISTS coleccion TEXT NOT NULL DEFAULT 'general';
+CREATE INDEX IF NOT EXISTS faq_coleccion_idx ON faq (coleccion, id);
+
 -- Crear tabla vector_tfidf
 CREATE TABLE IF NOT EXISTS vector_tfidf (
     faq_id UUID PRIMARY KEY REFERENCES faq(id),
     vector_data BYTEA NOT NULL
 );
 
--- Crear tabla consulta
+-- Crear tabla consulta, particionada por mes sobre timestamp
+-- (para convertir una tabla consulta existente, ver particionar_consulta.sql)
 CREATE TABLE IF NOT EXISTS consulta (
-    id UUID PRIMARY KEY,
+    id UUID NOT NULL,
     texto TEXT NOT NULL,
     timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     score FLOAT,
-    faq_id UUID REFERENCES faq(id)
+    faq_id UUID REFERENCES faq(id) ON DELETE SET NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE INDEX IF NOT EXISTS consulta_faq_id_idx ON consulta (faq_id);
+CREATE INDEX IF NOT EXISTS consulta_timestamp_idx ON consulta (timestamp);
+
+-- Crea (si no existe) la partición del mes de ``mes``; las filas que ya
+-- estuvieran en la partición por defecto para ese mes se mueven a ella
+CREATE OR REPLACE FUNCTION crear_particion_consulta(mes DATE) RETURNS TEXT AS $$
+DECLARE
+    desde TIMESTAMP := date_trunc('month', mes);
+    hasta TIMESTAMP := date_trunc('month', mes) + INTERVAL '1 month';
+    nombre TEXT := 'consulta_' || to_char(mes, 'YYYY_MM');
+    pendientes BOOLEAN;
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+    SELECT EXISTS (SELECT 1 FROM consulta_default WHERE timestamp >= desde AND timestamp < hasta) INTO pendientes;
+    IF pendientes THEN
+        ALTER TABLE consulta DETACH PARTITION consulta_default;
+    END IF;
+    EXECUTE format('CREATE TABLE %I PARTITION OF consulta FOR VALUES FROM (%L) TO (%L)', nombre, desde, hasta);
+    IF pendientes THEN
+        INSERT INTO consulta SELECT * FROM consulta_default WHERE timestamp >= desde AND timestamp < hasta;
+        DELETE FROM consulta_default WHERE timestamp >= desde AND timestamp < hasta;
+        ALTER TABLE consulta ATTACH PARTITION consulta_default DEFAULT;
+    END IF;
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partición por defecto (consultas fuera de los meses creados) y meses actual y siguientes;
+-- retention.py crea los meses futuros y archiva los antiguos
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'consulta'::regclass) = 'p' THEN
+        CREATE TABLE IF NOT EXISTS consulta_default PARTITION OF consulta DEFAULT;
+        FOR i IN 0..3 LOOP
+            PERFORM crear_particion_consulta((date_trunc('month', now()) + i * INTERVAL '1 month')::date);
+        END LOOP;
+    END IF;
+END $$;
+
+-- Crear tabla sinonimo (opcional; se usa con SYNONYMS_FROM_DB = True en synonyms.py)
+CREATE TABLE IF NOT EXISTS sinonimo (
+    clave TEXT NOT NULL,
+    alternativa TEXT NOT NULL,
+    PRIMARY KEY (clave, alternativa)
+);
+
+-- Resúmenes incrementales del registro de consultas (los mantiene analytics.py)
+CREATE TABLE IF NOT EXISTS analitica_marca (
+    nombre TEXT PRIMARY KEY,
+    ts TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS consulta_hora (
+    hora TIMESTAMP NOT NULL,
+    faq_id UUID NOT NULL,           -- 00000000-0000-0000-0000-000000000000 = sin FAQ asociada
+    consultas BIGINT NOT NULL,
+    score_sum DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (hora, faq_id)
+);
+
+CREATE TABLE IF NOT EXISTS consulta_score (
+    hora TIMESTAMP NOT NULL,
+    cubeta SMALLINT NOT NULL,       -- floor(score * 20): cubetas de 0.05
+    consultas BIGINT NOT NULL,
+    PRIMARY KEY (hora, cubeta)
+);
+
+CREATE TABLE IF NOT EXISTS consulta_sin_respuesta (
+    texto_norm TEXT PRIMARY KEY,
+    ejemplo TEXT NOT NULL,
+    consultas BIGINT NOT NULL,
+    score_max DOUBLE PRECISION NOT NULL,
+    primera TIMESTAMP NOT NULL,
+    ultima TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS consulta_sin_respuesta_consultas_idx ON consulta_sin_respuesta (consultas DESC);
+
+-- Versión publicada del índice (la usan index_sync.py, api.py y train_index.py para
+-- que todos los workers sirvan el mismo artefacto de serving_index/)
+CREATE TABLE IF NOT EXISTS indice_publicado (
+    nombre TEXT PRIMARY KEY,        -- 'faq' (índice global) o 'coleccion:<nombre>'
+    version TEXT NOT NULL,          -- directorio de la versión bajo serving_index/
+    generacion BIGINT NOT NULL,     -- aumenta en cada publicación
+    publicado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    worker TEXT,                    -- proceso que construyó la versión
+    desde DOUBLE PRECISION          -- instante (epoch) en que se leyeron las FAQs de la versión
 );
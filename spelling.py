@@ -0,0 +1,140 @@
+# Corrección de errores de escritura en las consultas ("vacasiones", "viatcos").
+#
+# Diccionario de borrado simétrico (SymSpell): al construir el índice se
+# generan, para cada palabra de las FAQs, las variantes con hasta
+# SPELL_MAX_DISTANCE caracteres borrados de sus primeros SPELL_PREFIX_LENGTH
+# caracteres. Corregir una palabra desconocida solo genera sus propios
+# borrados y los busca en ese diccionario; la distancia de edición se
+# calcula únicamente con las pocas candidatas que comparten algún borrado,
+# nunca contra todo el vocabulario. Los borrados se guardan como hashes
+# int64 ordenados (búsqueda binaria vectorizada) para no tener millones de
+# cadenas en un dict de Python.
+#
+# Las palabras que ya aparecen en las FAQs (o en ``known``, p. ej. las
+# stopwords) no se tocan; entre candidatas a la misma distancia gana la que
+# aparece en más FAQs.
+import re
+from collections import Counter
+
+import numpy as np
+
+SPELL_MAX_DISTANCE = 2        # Distancia de edición máxima de una corrección
+SPELL_PREFIX_LENGTH = 7       # Caracteres iniciales cuyos borrados se indexan
+SPELL_MIN_LENGTH = 4          # Palabras más cortas no se corrigen (demasiadas candidatas)
+SPELL_CACHE_SIZE = 50000      # Correcciones recordadas por diccionario
+TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+def _deletes(word, max_distance):
+    """La palabra y sus variantes con hasta ``max_distance`` caracteres borrados"""
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))} - out
+        out |= frontier
+    return out
+
+
+def edit_distance(a, b, max_distance):
+    """Distancia de Damerau-Levenshtein (transposiciones adyacentes); ``max_distance`` + 1 si la supera"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= max_distance else max_distance + 1
+
+
+class SpellIndex:
+    """Diccionario de corrección sobre las palabras (ya normalizadas) de un índice"""
+
+    def __init__(self, counts, token_pattern=TOKEN_PATTERN, known=(), max_distance=SPELL_MAX_DISTANCE,
+                 prefix_length=SPELL_PREFIX_LENGTH, min_length=SPELL_MIN_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_length = min_length
+        self._token_re = re.compile(token_pattern)
+        self.words = sorted(counts)
+        self.counts = np.asarray([counts[w] for w in self.words], dtype=np.int64)
+        self._known = frozenset(self.words) | frozenset(known)
+        keys, ids = [], []
+        for i, word in enumerate(self.words):
+            if len(word) < min_length - max_distance or word.isdigit():
+                continue
+            for d in _deletes(word[:prefix_length], max_distance):
+                keys.append(hash(d))
+                ids.append(i)
+        keys = np.asarray(keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._ids = np.asarray(ids, dtype=np.int32)[order]
+        self._memo = {}
+
+    @classmethod
+    def from_texts(cls, texts, normalize, token_pattern=TOKEN_PATTERN, known=(), **kwargs):
+        """Diccionario con las palabras de ``texts`` (frecuencia = textos en los que aparecen)"""
+        token_re = re.compile(token_pattern)
+        counts = Counter()
+        for text in texts:
+            counts.update(set(token_re.findall(normalize(text))))
+        return cls(counts, token_pattern, {normalize(w) for w in known}, **kwargs)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self._known
+
+    def _lookup(self, word):
+        probes = np.fromiter((hash(d) for d in _deletes(word[:self.prefix_length], self.max_distance)),
+                             dtype=np.int64)
+        lo = np.searchsorted(self._keys, probes, side="left")
+        hi = np.searchsorted(self._keys, probes, side="right")
+        hits = [self._ids[a:b] for a, b in zip(lo, hi) if b > a]
+        if not hits:
+            return None
+        best = None
+        for i in np.unique(np.concatenate(hits)).tolist():
+            cand = self.words[i]
+            d = edit_distance(word, cand, self.max_distance)
+            if d > self.max_distance:
+                continue
+            key = (d, -int(self.counts[i]), cand)
+            if best is None or key < best:
+                best = key
+        return best[2] if best else None
+
+    def lookup(self, word):
+        """Corrección de una palabra normalizada: ella misma si es conocida, None si no hay ninguna cerca"""
+        if word in self._known:
+            return word
+        if len(word) < self.min_length or word.isdigit():
+            return None
+        if word not in self._memo:
+            if len(self._memo) >= SPELL_CACHE_SIZE:
+                self._memo.clear()
+            self._memo[word] = self._lookup(word)
+        return self._memo[word]
+
+    def correct(self, text):
+        """Corrige las palabras desconocidas de un texto normalizado; devuelve (texto, [(original, corrección)])"""
+        changes = []
+
+        def fix(match):
+            word = match.group(0)
+            fixed = self.lookup(word)
+            if fixed is None or fixed == word:
+                return word
+            changes.append((word, fixed))
+            return fixed
+
+        return self._token_re.sub(fix, text), changes
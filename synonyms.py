@@ -0,0 +1,96 @@
+# Expansión de consultas con sinónimos y frases.
+#
+# El diccionario se lee de sinonimos.txt (y opcionalmente de la tabla
+# sinonimo) y se compila una vez en un trie de tokens sobre el texto
+# normalizado. Buscar coincidencias cuesta O(tokens de la consulta x
+# longitud de la frase más larga), sin importar cuántas entradas tenga el
+# diccionario, y reconoce sinónimos de varias palabras ("gastos de viaje").
+from pathlib import Path
+
+SYNONYMS_PATH = Path("sinonimos.txt")
+# Leer también la tabla sinonimo (clave, alternativa) de PostgreSQL
+SYNONYMS_FROM_DB = False
+# Expandir también los documentos al indexar (train_index.py, /reload y cambios en /faqs)
+EXPAND_DOCUMENTS = False
+
+
+def parse_synonyms(text):
+    """Lee líneas ``clave: alt1, alt2`` y devuelve {clave: [alternativas]}"""
+    syn = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or ":" not in line:
+            continue
+        key, alts = line.split(":", 1)
+        key = key.strip()
+        if key:
+            syn.setdefault(key, []).extend(a.strip() for a in alts.split(",") if a.strip())
+    return syn
+
+
+def load_synonyms(path=SYNONYMS_PATH, cursor=None):
+    """Diccionario de sinónimos del fichero y, si se pasa un cursor, de la tabla sinonimo"""
+    path = Path(path)
+    syn = parse_synonyms(path.read_text(encoding="utf-8")) if path.exists() else {}
+    if cursor is not None:
+        cursor.execute("SELECT clave, alternativa FROM sinonimo")
+        for key, alt in cursor.fetchall():
+            syn.setdefault(key, []).append(alt)
+    return syn
+
+
+class SynonymExpander:
+    """Diccionario de sinónimos compilado en un trie de tokens normalizados.
+
+    Cada entrada (clave + alternativas) forma un grupo; si cualquier frase del
+    grupo aparece en la consulta, se añaden todas las del grupo, igual que
+    hacía el recorrido original de ``SYN``.
+    """
+
+    def __init__(self, syn, normalize):
+        self._trie = {}
+        self._groups = []
+        for key, alts in syn.items():
+            phrases = sorted({normalize(p) for p in [key, *alts]} - {""})
+            if not phrases:
+                continue
+            group = len(self._groups)
+            self._groups.append(phrases)
+            for phrase in phrases:
+                node = self._trie
+                for token in phrase.split():
+                    node = node.setdefault(token, {})
+                node.setdefault(None, set()).add(group)
+        self.size = len(self._groups)
+
+    def match(self, tokens):
+        """Grupos cuyas frases aparecen como secuencia de tokens consecutivos"""
+        found = set()
+        trie = self._trie
+        for i in range(len(tokens)):
+            node = trie.get(tokens[i])
+            j = i + 1
+            while node is not None:
+                groups = node.get(None)
+                if groups:
+                    found |= groups
+                if j >= len(tokens):
+                    break
+                node = node.get(tokens[j])
+                j += 1
+        return found
+
+    def expand(self, nq):
+        """Añade al texto normalizado los términos de los grupos encontrados"""
+        groups = self.match(nq.split())
+        if not groups:
+            return nq
+        extra = set()
+        for g in groups:
+            extra.update(self._groups[g])
+        return f"{nq} " + " ".join(sorted(extra))
+
+
+def compile_synonyms(normalize, path=SYNONYMS_PATH, cursor=None):
+    """Lee y compila el diccionario con la misma normalización que se aplica a los textos"""
+    return SynonymExpander(load_synonyms(path, cursor), normalize)
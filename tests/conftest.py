@@ -0,0 +1,5 @@
+# Las pruebas importan los módulos de la raíz del repositorio (no es un paquete instalable)
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = psycopg2.extensions.STATUS_READY
+        self.autocommit = False
+        self.dead = False
+        self.info = SimpleNamespace(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def rollback(self):
+        if self.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.status = psycopg2.extensions.STATUS_READY
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    made = []
+
+    def connect(*args, **kwargs):
+        made.append(FakeConnection())
+        return made[-1]
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return made
+
+
+def test_open_transaction_is_rolled_back_and_reused(connections):
+    pool = ConnectionPool(1, 1, acquire_timeout=0.01)
+    conn = pool.getconn()
+    conn.status = psycopg2.extensions.STATUS_IN_TRANSACTION
+    pool.putconn(conn)
+    assert conn.status == psycopg2.extensions.STATUS_READY
+    assert pool.getconn() is conn
+    assert pool.discarded == 0
+
+
+def test_failed_rollback_discards_connection(connections):
+    pool = ConnectionPool(0, 2, acquire_timeout=0.01)
+    for _ in range(3):
+        # Más fallos que maxconn: ninguna conexión muerta se queda ocupando el pool
+        conn = pool.getconn()
+        conn.status = psycopg2.extensions.STATUS_IN_TRANSACTION
+        conn.dead = True
+        pool.putconn(conn)
+        assert conn.closed
+    assert pool.discarded == 3
+    assert pool.in_use == 0
+    fresh = pool.getconn()
+    assert not fresh.closed and fresh not in connections[:3]
+
+
+def test_timeout_when_saturated(connections):
+    pool = ConnectionPool(0, 1, acquire_timeout=0.01)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.timeouts == 1
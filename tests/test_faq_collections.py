@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from faq_collections import (CollectionCache, collection_dir, collection_lock_key, directory_nbytes,
+                             valid_collection)
+
+SIZES = {"a": 40, "b": 30, "c": 50, "grande": 500}
+
+
+def _cache(budget=100, missing=()):
+    loaded = []
+
+    def load(name):
+        loaded.append(name)
+        return None if name in missing else f"snap-{name}"
+
+    cache = CollectionCache(load, lambda name, snap: SIZES[name], budget)
+    return cache, loaded
+
+
+def test_get_loads_once_and_counts():
+    cache, loaded = _cache()
+    assert cache.get("a") == "snap-a"
+    assert cache.get("a") == "snap-a"
+    stats = cache.stats()
+    assert loaded == ["a"]
+    assert (stats["hits"], stats["misses"], stats["loads"], stats["bytes"]) == (1, 1, 1, 40)
+
+
+def test_missing_collection_is_not_cached():
+    cache, loaded = _cache(missing={"a"})
+    assert cache.get("a") is None
+    assert cache.get("a") is None
+    assert loaded == ["a", "a"]
+    assert cache.stats()["loaded"] == []
+
+
+def test_evicts_least_recently_used():
+    cache, _ = _cache()
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")       # "b" queda como la más fría
+    cache.get("c")       # 40 + 30 + 50 > 100
+    stats = cache.stats()
+    assert stats["loaded"] == ["a", "c"]
+    assert (stats["bytes"], stats["evictions"]) == (90, 1)
+    assert cache.peek("b") is None
+
+
+def test_just_used_entry_is_never_evicted():
+    cache, _ = _cache()
+    cache.get("a")
+    cache.get("b")
+    assert cache.get("grande") == "snap-grande"
+    stats = cache.stats()
+    assert stats["loaded"] == ["grande"]
+    assert (stats["bytes"], stats["evictions"]) == (500, 2)
+
+
+def test_put_replaces_bytes_and_discard_releases_them():
+    cache, _ = _cache(budget=1000)
+    cache.put("a", "v1")
+    cache.put("a", "v2")
+    cache.put("b", "v1")
+    assert cache.stats()["bytes"] == 70
+    assert cache.peek("a") == "v2"
+    cache.discard("a")
+    cache.discard("a")
+    assert cache.stats()["bytes"] == 30
+
+
+def test_peek_does_not_change_order():
+    cache, _ = _cache()
+    cache.get("a")
+    cache.get("b")
+    cache.peek("a")
+    cache.get("c")
+    assert cache.stats()["loaded"] == ["b", "c"]
+
+
+def test_update_only_touches_loaded_collections():
+    cache, _ = _cache()
+    assert cache.update("a", lambda snap: snap + "!") is None
+    cache.get("a")
+    assert cache.update("a", lambda snap: snap + "!") == "snap-a!"
+    assert cache.peek("a") == "snap-a!"
+    assert cache.stats()["bytes"] == 40
+
+
+def test_concurrent_gets_load_once():
+    calls = []
+
+    def load(name):
+        calls.append(name)
+        time.sleep(0.05)
+        return "snap"
+
+    cache = CollectionCache(load, lambda name, snap: 1, 100)
+    threads = [threading.Thread(target=cache.get, args=("a",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert calls == ["a"]
+
+
+@pytest.mark.parametrize("name, ok", [("rrhh", True), ("legal-2024_x", True), ("", False), ("RRHH", False),
+                                      ("-x", False), ("a/b", False), ("a" * 64, False)])
+def test_valid_collection(name, ok):
+    assert valid_collection(name) is ok
+
+
+def test_collection_paths_and_keys(tmp_path):
+    assert collection_dir(tmp_path, "rrhh") == tmp_path / "colecciones" / "rrhh"
+    assert collection_lock_key("rrhh") != collection_lock_key("legal")
+    (tmp_path / "x.bin").write_bytes(b"12345")
+    (tmp_path / "sub").mkdir()
+    assert directory_nbytes(tmp_path) == 5
+    assert directory_nbytes(tmp_path / "nada") == 0
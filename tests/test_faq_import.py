@@ -0,0 +1,149 @@
+import csv
+import io
+
+import pytest
+
+import faq_import
+from faq_import import detect_format, import_faqs, iter_records, new_report, text_stream, validate_records
+
+ID1 = "00000000-0000-0000-0000-000000000001"
+ID2 = "00000000-0000-0000-0000-000000000002"
+ID3 = "00000000-0000-0000-0000-000000000003"
+
+
+def _read(text, fmt):
+    return list(iter_records(io.StringIO(text), fmt))
+
+
+@pytest.mark.parametrize("size", [1, 3, 1 << 16])
+def test_iter_json_reads_across_chunks(monkeypatch, size):
+    monkeypatch.setattr(faq_import, "JSON_READ_SIZE", size)
+    text = '[ {"q": "a, b", "a": "]"} ,\n {"q": "c", "a": "d"}, 3 ]'
+    assert _read(text, "json") == [{"q": "a, b", "a": "]"}, {"q": "c", "a": "d"}, 3]
+    assert _read(" [ ] ", "json") == []
+    assert _read("[1]\n  \n", "json") == [1]
+
+
+@pytest.mark.parametrize("text", ["[1 2]", "[1,,2]", "[,1]", "[1,]", "[1", "[", "", '{"q": "a"}', "[] x",
+                                  '[{"q": "a", "a": "b"}] [{"q": "c", "a": "d"}]', "[1] garbage"])
+def test_iter_json_rejects_malformed_arrays(text):
+    with pytest.raises(ValueError):
+        _read(text, "json")
+
+
+def test_iter_jsonl_skips_blank_lines():
+    assert _read('{"q": "a"}\n\n{"q": "b"}\n', "jsonl") == [{"q": "a"}, {"q": "b"}]
+
+
+def test_iter_csv_and_bom():
+    data = "\ufeffid,q,a\n,¿Hola?,\"sí, claro\"\n".encode("utf-8")
+    assert list(iter_records(text_stream(io.BytesIO(data)), "csv")) == [{"id": "", "q": "¿Hola?", "a": "sí, claro"}]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        _read("", "xml")
+
+
+def test_detect_format():
+    assert detect_format("faqs.NDJSON") == "jsonl"
+    assert detect_format("faqs.bin", "text/csv; charset=utf-8") == "csv"
+    assert detect_format("faqs.txt") is None
+
+
+def test_validate_records():
+    report = new_report()
+    records = [{"id": ID1, "q": " q ", "a": " a "}, {"q": "q"}, "x", {"id": "nope", "q": "q", "a": "a"},
+               {"q": "q", "a": "a"}]
+    valid = list(validate_records(records, report))
+    assert valid[0] == (ID1, "q", "a")
+    assert len(valid) == 2 and valid[1][0] != ID1
+    assert (report["read"], report["invalid"]) == (5, 3)
+    assert [e["record"] for e in report["errors"]] == [2, 3, 4]
+
+
+class FakeCursor:
+    """Cursor que simula en memoria las sentencias de ``import_faqs`` sobre la tabla faq"""
+
+    def __init__(self, faqs=None):
+        self.faq = dict(faqs or {})    # id -> (q, a, coleccion)
+        self.staged = []
+        self.rowcount = -1
+        self._result = None
+
+    def copy_expert(self, sql, buf):
+        self.staged += [(int(n), faq_id, q, a) for n, faq_id, q, a in csv.reader(buf)]
+
+    def execute(self, sql, params=()):
+        if sql.startswith("CREATE TEMP TABLE faq_import"):
+            self.staged = []
+        elif sql.startswith("DELETE FROM faq "):
+            gone = [faq_id for faq_id, row in self.faq.items() if row[2] == params[0]]
+            for faq_id in gone:
+                del self.faq[faq_id]
+            self.rowcount = len(gone)
+        elif sql.startswith("SELECT count(DISTINCT i.id)"):
+            ids = {faq_id for _, faq_id, _, _ in self.staged}
+            self._result = (sum(1 for i in ids if i in self.faq and self.faq[i][2] != params[0]),)
+        elif sql.startswith("WITH latest"):
+            self._result = self._upsert(params[0], "DO UPDATE" in sql)
+        elif sql == "SELECT count(DISTINCT id) FROM faq_import":
+            self._result = (len({faq_id for _, faq_id, _, _ in self.staged}),)
+
+    def _upsert(self, collection, update):
+        latest = {}
+        for _, faq_id, q, a in sorted(self.staged):
+            latest[faq_id] = (q, a)
+        inserted = written = 0
+        for faq_id, (q, a) in latest.items():
+            old = self.faq.get(faq_id)
+            if old is None:
+                self.faq[faq_id] = (q, a, collection)
+                inserted += 1
+                written += 1
+            elif update and old[2] == collection and old[:2] != (q, a):
+                self.faq[faq_id] = (q, a, collection)
+                written += 1
+        return inserted, written
+
+    def fetchone(self):
+        return self._result
+
+
+def test_import_counts():
+    cursor = FakeCursor({ID1: ("q1", "a1", "general"), ID2: ("q2", "a2", "general"), ID3: ("q3", "a3", "rrhh")})
+    records = [
+        {"id": ID1, "q": "q1", "a": "a1"},          # sin cambios
+        {"id": ID2, "q": "viejo", "a": "a2"},
+        {"id": ID2, "q": "q2 nueva", "a": "a2"},    # duplicado: gana el último
+        {"id": ID3, "q": "otra", "a": "x"},         # es de otra colección
+        {"q": "nueva", "a": "a"},
+        {"q": ""},
+    ]
+    report = import_faqs(cursor, records, collection="general")
+    assert {k: report[k] for k in ("read", "invalid", "duplicates", "inserted", "updated", "skipped",
+                                  "conflicts", "deleted")} == {
+        "read": 6, "invalid": 1, "duplicates": 1, "inserted": 1, "updated": 1, "skipped": 2,
+        "conflicts": 1, "deleted": 0}
+    assert cursor.faq[ID2] == ("q2 nueva", "a2", "general")
+    assert cursor.faq[ID3] == ("q3", "a3", "rrhh")
+
+
+def test_import_skip_and_replace(monkeypatch):
+    monkeypatch.setattr(faq_import, "IMPORT_BATCH_ROWS", 2)
+    cursor = FakeCursor({ID1: ("q1", "a1", "general"), ID2: ("q2", "a2", "general")})
+    staged = []
+    report = import_faqs(cursor, [{"id": ID1, "q": "x", "a": "y"}, {"q": "n1", "a": "a"}, {"q": "n2", "a": "a"}],
+                         on_conflict="skip", progress=staged.append)
+    assert (report["inserted"], report["updated"], report["skipped"]) == (2, 0, 1)
+    assert cursor.faq[ID1] == ("q1", "a1", "general")
+    assert staged == [2, 3]
+
+    report = import_faqs(cursor, [{"id": ID1, "q": "x", "a": "y"}], replace=True)
+    assert (report["deleted"], report["inserted"]) == (4, 1)
+    assert list(cursor.faq) == [ID1]
+
+
+def test_import_rejects_unknown_on_conflict():
+    with pytest.raises(ValueError):
+        import_faqs(FakeCursor(), [], on_conflict="merge")
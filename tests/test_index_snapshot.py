@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from index_snapshot import IndexSnapshot, fit_pipeline
+
+FAQS = [
+    ("00000000-0000-0000-0000-000000000001", "como solicito vacaciones", "con el formulario de vacaciones"),
+    ("00000000-0000-0000-0000-000000000002", "horario de atencion", "de lunes a viernes"),
+    ("00000000-0000-0000-0000-000000000003", "donde cobro viaticos", "en tesoreria"),
+    ("00000000-0000-0000-0000-000000000004", "como pido una licencia medica", "presentando el certificado"),
+]
+
+
+@pytest.fixture
+def snap():
+    ids, questions, answers = (list(col) for col in zip(*FAQS))
+    pipe, X = fit_pipeline([f"{q} {a}" for q, a in zip(questions, answers)])
+    return IndexSnapshot.build(pipe, X, questions, answers, ids, generation=1)
+
+
+def _vector(snap, text):
+    return snap.pipe.transform([text])
+
+
+def _best(snap, text, k=1):
+    idx, scores = snap.engine.search(_vector(snap, text), k)
+    return [snap.faq_id(int(i)) for i in idx], scores
+
+
+def test_delete_hides_row(snap):
+    faq_id = FAQS[0][0]
+    assert _best(snap, "vacaciones")[0][0] == faq_id
+    gone = snap.without_faq(faq_id, generation=2)
+    ids, _ = _best(gone, "vacaciones", k=4)
+    assert faq_id not in ids
+    assert gone.position(faq_id) is None
+    assert gone.get_faq(faq_id) is None
+    assert gone.items == len(FAQS) - 1
+    assert gone.stale_rows() == [0]
+    # El snapshot original no cambia
+    assert _best(snap, "vacaciones")[0][0] == faq_id
+    assert snap.stale_rows() == []
+
+
+def test_delete_missing_faq_returns_none(snap):
+    assert snap.without_faq("00000000-0000-0000-0000-0000000000ff", generation=2) is None
+
+
+def test_readd_restores_score(snap):
+    faq_id, q, a = FAQS[0]
+    _, before = _best(snap, "vacaciones")
+    gone = snap.without_faq(faq_id, generation=2)
+    back = gone.with_faq(faq_id, q, a, _vector(snap, f"{q} {a}"), generation=3)
+    ids, after = _best(back, "vacaciones")
+    assert ids[0] == faq_id
+    assert after[0] == pytest.approx(before[0], rel=1e-5)
+    assert back.position(faq_id) == len(FAQS)    # fila nueva al final
+    assert back.items == len(FAQS)
+
+
+def test_update_keeps_row_and_serves_new_text(snap):
+    faq_id = FAQS[2][0]
+    text = "donde cobro viaticos y pasajes"
+    edited = snap.with_faq(faq_id, text, "en tesoreria", _vector(snap, text), generation=2)
+    assert edited.position(faq_id) == 2
+    assert edited.get_faq(faq_id) == {"id": faq_id, "q": text, "a": "en tesoreria"}
+    assert edited.stale_rows() == [2]
+    assert _best(edited, "viaticos")[0][0] == faq_id
+    assert snap.get_faq(faq_id)["q"] == FAQS[2][1]
+
+
+def test_add_new_faq(snap):
+    faq_id = "00000000-0000-0000-0000-000000000005"
+    text = "licencia por paternidad"
+    added = snap.with_faq(faq_id, text, "diez dias", _vector(snap, text), generation=2)
+    assert added.position(faq_id) == len(FAQS)
+    assert added.items == len(FAQS) + 1
+    assert added.stale_rows() == []
+    assert faq_id in _best(added, "licencia", k=2)[0]
+
+
+def test_inverted_search_matches_brute_with_overlay(snap):
+    text = "licencia de vacaciones"
+    edited = snap.with_faq(FAQS[1][0], text, "x", _vector(snap, text), generation=2)
+    edited = edited.without_faq(FAQS[3][0], generation=3)
+    v = _vector(snap, "vacaciones licencia")
+    idx, scores = edited.engine.search(v, 3)
+    brute_idx, brute_scores = edited.engine.search_brute(v, 3)
+    assert set(idx[scores > 0].tolist()) == set(brute_idx[brute_scores > 0].tolist())
+    assert np.allclose(np.sort(scores[scores > 0]), np.sort(brute_scores[brute_scores > 0]), atol=1e-6)
+    assert 3 not in idx.tolist() and 3 not in brute_idx.tolist()
+
+
+def test_drift_counts_changed_docs(snap):
+    assert not snap.drift.exceeds(0.1)
+    edited = snap.without_faq(FAQS[0][0], generation=2)
+    stats = edited.drift.stats()
+    assert stats["changed_docs"] == 1
+    assert stats["changed_ratio"] == pytest.approx(1 / len(FAQS))
+    assert edited.drift.exceeds(0.1)
+
+
+def test_best_batch_never_returns_deleted_row(snap):
+    gone = snap.without_faq(FAQS[0][0], generation=2)
+    idx, scores = gone.engine.best_batch(_vector(snap, "zzz sin coincidencias"))
+    assert idx.tolist() == [-1] and scores.tolist() == [0.0]
+    idx, _ = gone.engine.best_batch(_vector(snap, "vacaciones horario"))
+    assert idx.tolist() == [1]
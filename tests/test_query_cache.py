@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from query_cache import QueryCache
+
+
+def test_hit_after_miss():
+    cache = QueryCache()
+    calls = []
+    assert cache.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert cache.get_or_compute("k", lambda: calls.append(1) or "otro") == "v"
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_lru_eviction():
+    cache = QueryCache(maxsize=2)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    cache.get_or_compute("a", lambda: 0)    # "a" pasa a ser la más reciente
+    cache.get_or_compute("c", lambda: 3)
+    assert cache.get_or_compute("a", lambda: 0) == 1
+    assert cache.get_or_compute("b", lambda: 0) == 0
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_ttl_expiration():
+    cache = QueryCache(ttl=0.01)
+    cache.get_or_compute("k", lambda: 1)
+    time.sleep(0.02)
+    assert cache.get_or_compute("k", lambda: 2) == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_set_generation_clears_everything():
+    cache = QueryCache()
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    cache.set_generation(1)
+    stats = cache.stats()
+    assert (stats["size"], stats["invalidations"], stats["generation"]) == (0, 2, 1)
+    assert cache.get_or_compute("a", lambda: 3) == 3
+
+
+def test_set_generation_same_value_keeps_entries():
+    cache = QueryCache()
+    cache.get_or_compute("a", lambda: 1)
+    cache.set_generation(0)
+    assert cache.stats()["size"] == 1
+
+
+def test_result_not_stored_if_generation_changes_during_compute():
+    cache = QueryCache()
+
+    def compute():
+        cache.set_generation(1)
+        return "viejo"
+
+    assert cache.get_or_compute("k", compute) == "viejo"
+    assert cache.get_or_compute("k", lambda: "nuevo") == "nuevo"
+
+
+def test_stale_generation_is_computed_but_not_stored():
+    cache = QueryCache()
+    cache.set_generation(2)
+    assert cache.get_or_compute("k", lambda: "viejo", generation=1) == "viejo"
+    assert cache.stats()["size"] == 0
+    assert cache.get_or_compute("k", lambda: "nuevo", generation=2) == "nuevo"
+    assert cache.get_or_compute("k", lambda: "otro", generation=2) == "nuevo"
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = QueryCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "v"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+                 for _ in range(4)]
+    for t in followers:
+        t.start()
+    while cache.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert results == ["v"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_error_reaches_waiters_and_is_not_cached():
+    cache = QueryCache()
+
+    def compute():
+        raise RuntimeError("fallo")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", compute)
+    assert cache.stats()["size"] == 0
+    assert cache.get_or_compute("k", lambda: "v") == "v"
+
+
+def _cached_with_deps(cache, key, rows=None, terms=None):
+    def compute():
+        cache.depends(rows, terms)
+        return key
+    return cache.get_or_compute(key, compute)
+
+
+def test_invalidate_drops_only_affected_entries():
+    cache = QueryCache()
+    _cached_with_deps(cache, "fila", rows=[1, 2], terms=[10])
+    _cached_with_deps(cache, "termino", rows=[3], terms=[20, 21])
+    _cached_with_deps(cache, "ajena", rows=[4], terms=[30])
+    _cached_with_deps(cache, "todo")                  # depends() sin argumentos: depende de todo
+    cache.get_or_compute("sin_anotar", lambda: 0)     # sin dependencias anotadas: también de todo
+
+    cache.invalidate(1, rows={2}, terms={21})
+    stats = cache.stats()
+    assert stats["generation"] == 1
+    assert (stats["size"], stats["invalidations"], stats["edits"], stats["retained"]) == (1, 4, 1, 1)
+    assert cache.get_or_compute("ajena", lambda: "recalculada") == "ajena"
+    assert cache.get_or_compute("fila", lambda: "recalculada") == "recalculada"
+
+
+def test_invalidate_same_generation_is_ignored():
+    cache = QueryCache()
+    _cached_with_deps(cache, "k", rows=[1])
+    cache.invalidate(0, rows={1})
+    assert cache.stats()["size"] == 1
+
+
+def test_depends_outside_compute_is_ignored():
+    QueryCache().depends([1], [2])
@@ -0,0 +1,70 @@
+from collections import Counter
+
+import pytest
+
+from spelling import SpellIndex, edit_distance
+
+TEXTS = [
+    "¿Cómo solicito mis vacaciones?",
+    "Vacaciones colectivas de fin de año",
+    "¿Dónde cobro los viáticos?",
+    "Horario de atención al público",
+    "Certificado de trabajo",
+    "Formulario de vacunación",
+]
+
+
+def _normalize(text):
+    table = str.maketrans("áéíóúü", "aeiouu", "¿?")
+    return text.lower().translate(table)
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SpellIndex.from_texts(TEXTS, _normalize, known=["Los"])
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("vacaciones", "vacaciones", 0),
+    ("vacasiones", "vacaciones", 1),     # sustitución
+    ("vacaiones", "vacaciones", 1),      # borrado
+    ("vaccaciones", "vacaciones", 1),    # inserción
+    ("vacaicones", "vacaciones", 1),     # transposición adyacente
+    ("viatcos", "viaticos", 1),
+    ("orario", "horario", 1),
+    ("", "ab", 2),
+])
+def test_edit_distance(a, b, expected):
+    assert edit_distance(a, b, 2) == expected
+    assert edit_distance(b, a, 2) == expected
+
+
+def test_edit_distance_caps_at_max_plus_one():
+    assert edit_distance("vacaciones", "horario", 2) == 3
+    assert edit_distance("abcdef", "ab", 2) == 3
+
+
+@pytest.mark.parametrize("word, expected", [
+    ("vacasiones", "vacaciones"),
+    ("vacaciones", "vacaciones"),    # conocida: no se toca
+    ("viatcos", "viaticos"),
+    ("certificdo", "certificado"),
+    ("los", "los"),                  # en ``known``
+    ("zzzzzz", None),
+    ("vac", None),                   # demasiado corta
+    ("2024", None),
+])
+def test_lookup(index, word, expected):
+    assert index.lookup(word) == expected
+
+
+def test_ties_prefer_more_frequent_word():
+    index = SpellIndex(Counter({"casas": 5, "cosas": 1}))
+    assert index.lookup("cesas") == "casas"
+
+
+def test_correct_reports_changes(index):
+    text, changes = index.correct("cuando son las vacasiones colectvas")
+    assert text == "cuando son las vacaciones colectivas"
+    assert changes == [("vacasiones", "vacaciones"), ("colectvas", "colectivas")]
+    assert index.correct("vacaciones") == ("vacaciones", [])
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+import train_index
+from train_index import _chunk_df, _chunk_transform, _init_worker, build_pipeline, fit_from_df, preprocess_text
+
+WORDS = ["vacaciones", "licencia", "horario", "viáticos", "pasajes", "certificado", "tesorería", "Becas",
+         "capacitación", "sueldo", "aguinaldo", "permiso"]
+
+
+def _rows(n):
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(n):
+        q = " ".join(rng.choice(WORDS, size=4)) + " institución"    # "institución" supera max_df
+        a = " ".join(rng.choice(WORDS, size=6))
+        rows.append((str(i), q, a))
+    return rows
+
+
+@pytest.fixture(autouse=True)
+def _clean_worker():
+    yield
+    train_index._worker.clear()
+
+
+def _chunked_fit(rows, mode, chunk_rows, n_features=2 ** 10):
+    """Ajuste en dos pasadas por bloques, como main() pero en este proceso"""
+    pipe = build_pipeline(None, mode, n_features)
+    chunks = [rows[i:i + chunk_rows] for i in range(0, len(rows), chunk_rows)]
+    _init_worker(pipe, None)
+    df = np.zeros(n_features, dtype=np.int64) if mode == "hashing" else None
+    n_docs = 0
+    for chunk in chunks:
+        n, chunk_df = _chunk_df(chunk)
+        n_docs += n
+        if mode == "hashing":
+            np.add.at(df, chunk_df[0], chunk_df[1])
+        elif df is None:
+            df = chunk_df
+        else:
+            df.update(chunk_df)
+    pipe = fit_from_df(pipe, n_docs, df)
+    _init_worker(pipe, None)
+    return pipe, sp.vstack([_chunk_transform(chunk) for chunk in chunks], format="csr")
+
+
+@pytest.mark.parametrize("mode", ["vocabulary", "hashing"])
+@pytest.mark.parametrize("chunk_rows", [1, 7, 200])
+def test_chunked_fit_matches_fit_transform(mode, chunk_rows):
+    rows = _rows(60)
+    pipe, X = _chunked_fit(rows, mode, chunk_rows)
+    ref = build_pipeline(None, mode, 2 ** 10)
+    X_ref = ref.fit_transform(preprocess_text([f"{q} {a}" for _, q, a in rows]))
+    if mode == "vocabulary":
+        assert pipe.steps[0][1].vocabulary_ == ref.steps[0][1].vocabulary_
+        assert "institucion" not in pipe.steps[0][1].vocabulary_
+    assert np.allclose(pipe.steps[-1][1].idf_, ref.steps[-1][1].idf_, rtol=1e-6)
+    assert X.shape == X_ref.shape
+    assert abs(X - X_ref).max() < 1e-6
+
+
+def test_fit_from_df_without_terms_raises():
+    pipe = build_pipeline(None, "vocabulary")
+    with pytest.raises(ValueError):
+        fit_from_df(pipe, 2, {"todas": 2})
@@ -0,0 +1,30 @@
+import pickle
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from vector_codec import MAGIC, _HEADER, decode_vector, encode_vector, is_legacy
+
+
+def test_roundtrip():
+    row = sp.csr_matrix(np.array([[0, 0.5, 0, 0.25, 0]], dtype=np.float32))
+    blob = encode_vector(row)
+    assert not is_legacy(blob)
+    indices, values, dim = decode_vector(blob)
+    assert indices.tolist() == [1, 3]
+    assert values.tolist() == [0.5, 0.25]
+    assert dim == 5
+
+
+def test_legacy_pickle():
+    blob = pickle.dumps(np.array([[0.0, 0.0, 0.75]]))
+    assert is_legacy(blob)
+    indices, values, dim = decode_vector(blob)
+    assert (indices.tolist(), values.tolist(), dim) == ([2], [0.75], 3)
+
+
+def test_unknown_version_raises():
+    blob = _HEADER.pack(MAGIC, 99, 3, 0)
+    with pytest.raises(ValueError):
+        decode_vector(blob)
@@ -1,11 +1,26 @@
+import argparse
 import joblib
+import multiprocessing
+import numbers
+import numpy as np
+import os
 import psycopg2
-import pickle
 import re
+import scipy.sparse as sp
+import shutil
+import time
 import unicodedata
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer, strip_accents_unicode
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer, strip_accents_unicode
 from sklearn.pipeline import Pipeline
+from dense_index import DENSE_COMPONENTS, fit_dense
+from faq_collections import DEFAULT_COLLECTION
+from index_sync import BuildLock, publish_version
+from serving_index import publish_serving_index
+from synonyms import EXPAND_DOCUMENTS, SYNONYMS_FROM_DB, compile_synonyms
+from vector_codec import write_vectors
 
 # Configuración de la base de datos
 DB_NAME = "DefensaIA"
@@ -16,6 +31,20 @@ DB_PORT = "5432"
 
 PIPE_PATH = Path("tfidf_pipe.joblib")
 FAQS_PATH = Path("faqs_texts.joblib")
+# Artefacto de servicio mapeado en memoria (lo usa api.py para arrancar sin scikit-learn)
+SERVING_DIR = Path("serving_index")
+
+# Modo del índice: "vocabulary" (TfidfVectorizer, vocabulario exacto) o "hashing"
+# (HashingVectorizer + TfidfTransformer en float32: memoria fija, sin vocabulario)
+INDEX_MODE = "vocabulary"
+HASH_N_FEATURES = 2 ** 20        # Cubetas del modo hashing (colisiones raras hasta ~10^5 n-gramas distintos)
+INDEX_MODES = ("vocabulary", "hashing")
+# Análisis del vectorizador: tamaño de los n-gramas y frecuencia de documento máxima de un
+# término (solo modo vocabulario); replay_eval.py mide el efecto de cambiarlos
+NGRAM_RANGE = (1, 3)
+MAX_DF = 0.95
+# Índice denso (LSA) opcional sobre la matriz TF-IDF, para SCORING_MODE "dense"/"hybrid" de api.py
+DENSE_INDEX = False
 
 # Función para normalizar texto (no será serializada)
 def preprocess_text(docs):
@@ -34,69 +63,344 @@ def preprocess_text(docs):
 
 # Cargar stopwords ES
 STOPWORDS_FILE = Path("stopwords_es.txt")
-stopwords_es = None
-if STOPWORDS_FILE.exists():
-    stopwords_es = [w.strip() for w in STOPWORDS_FILE.read_text(encoding="utf-8").splitlines() if w.strip()]
-
-# 1) Cargar FAQs desde PostgreSQL
-conn = psycopg2.connect(
-    dbname=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    host=DB_HOST,
-    port=DB_PORT
-)
-cursor = conn.cursor()
-cursor.execute("SELECT id, q, a FROM faq")
-faqs_data = cursor.fetchall()
-
-# Preparar datos
-faq_ids = [str(row[0]) for row in faqs_data]
-questions = [row[1].strip() for row in faqs_data]
-answers = [row[2].strip() for row in faqs_data]
-
-# Documento a indexar: PREGUNTA + RESPUESTA (aumenta recall)
-raw_docs = [f"{q} {a}" for q, a in zip(questions, answers)]
-
-# Preprocesar documentos
-docs = preprocess_text(raw_docs)
-
-# 2) Vectorizador mejorado (sin preprocessor personalizado)
-pipe = Pipeline([
-    ("tfidf", TfidfVectorizer(
-        lowercase=False,         # Ya lo hicimos en el preprocesamiento
-        preprocessor=None,       # No usar preprocessor personalizado
-        tokenizer=None,          # Usar tokenizador por defecto
-        stop_words=stopwords_es, # Stopwords en español
-        ngram_range=(1, 3),      # N-gramas de 1 a 3 palabras
-        sublinear_tf=True,       # Escala logarítmica para term frequency
-        min_df=1,                # Mínima frecuencia de documento
-        max_df=0.95              # Máxima frecuencia de documento (evitar palabras muy comunes)
-    ))
-])
-
-# 3) Ajustar y transformar usando preguntas + respuestas
-X = pipe.fit_transform(docs)
-
-# 4) Guardar artefactos
-joblib.dump(pipe, PIPE_PATH)
-joblib.dump({"X": X, "questions": questions, "answers": answers, "ids": faq_ids}, FAQS_PATH)
-
-# 5) Guardar vectores en la base de datos
-cursor.execute("DELETE FROM vector_tfidf")
-for i, faq_id in enumerate(faq_ids):
-    # Serializar el vector TF-IDF usando pickle
-    vector_bytes = pickle.dumps(X[i].toarray())
-    cursor.execute(
-        "INSERT INTO vector_tfidf (faq_id, vector_data) VALUES (%s, %s)",
-        (faq_id, psycopg2.Binary(vector_bytes))
-    )
-
-# Confirmar cambios y cerrar conexión
-conn.commit()
-cursor.close()
-conn.close()
-
-print("Índice TF-IDF creado y guardado.")
-print(f"Preguntas cargadas: {len(questions)}")
-print(f"Vectores almacenados en la base de datos: {len(faq_ids)}")
+
+def load_stopwords():
+    """Lee las stopwords en español (None si no existe el fichero)"""
+    if STOPWORDS_FILE.exists():
+        return [w.strip() for w in STOPWORDS_FILE.read_text(encoding="utf-8").splitlines() if w.strip()]
+    return None
+
+# Vectorizador mejorado (sin preprocessor personalizado)
+def build_pipeline(stopwords_es=None, mode=INDEX_MODE, n_features=HASH_N_FEATURES, ngram_range=NGRAM_RANGE,
+                   max_df=MAX_DF):
+    """Crea el pipeline TF-IDF sin ajustar (misma configuración para train_index.py y /reload)"""
+    if mode == "hashing":
+        # Mismo análisis (stopwords, n-gramas, TF logarítmico, L2); max_df no aplica sin vocabulario
+        return Pipeline([
+            ("hash", HashingVectorizer(
+                lowercase=False,
+                stop_words=stopwords_es,
+                ngram_range=tuple(ngram_range),
+                n_features=n_features,
+                alternate_sign=False,    # Conteos positivos, como TfidfVectorizer
+                norm=None,               # La normalización la hace TfidfTransformer
+                dtype=np.float32
+            )),
+            ("tfidf", TfidfTransformer(sublinear_tf=True))
+        ])
+    if mode != "vocabulary":
+        raise ValueError(f"modo de índice desconocido: {mode}")
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(
+            lowercase=False,         # Ya lo hicimos en el preprocesamiento
+            preprocessor=None,       # No usar preprocessor personalizado
+            tokenizer=None,          # Usar tokenizador por defecto
+            stop_words=stopwords_es, # Stopwords en español
+            ngram_range=tuple(ngram_range), # N-gramas (por defecto de 1 a 3 palabras)
+            sublinear_tf=True,       # Escala logarítmica para term frequency
+            min_df=1,                # Mínima frecuencia de documento
+            max_df=max_df            # Máxima frecuencia de documento (evitar palabras muy comunes)
+        ))
+    ])
+
+# Construcción por bloques: lectura con cursor de servidor, normalización y
+# tokenización en un pool de procesos, ajuste en dos pasadas (frecuencias de
+# documento y luego vectores) y escritura masiva. Ningún paso necesita tener
+# a la vez todos los textos crudos y normalizados.
+CHUNK_ROWS = 5000                           # FAQs por bloque
+BUILD_WORKERS = os.cpu_count() or 1         # Procesos para normalizar/tokenizar/vectorizar
+CHECKPOINT_DIR = Path(".train_checkpoint")  # Punto de control para reanudar con --resume
+STAGING_TABLE = "vector_tfidf_staging"      # Vectores nuevos hasta el intercambio final
+
+# Estado de cada proceso del pool (se fija en el inicializador)
+_worker = {}
+
+def _init_worker(pipe, synonyms):
+    _worker["pipe"] = pipe
+    _worker["synonyms"] = synonyms
+    _worker["analyze"] = pipe.steps[0][1].build_analyzer()
+
+def _prepare_docs(rows):
+    """Documento a indexar por FAQ: PREGUNTA + RESPUESTA normalizadas (y expandidas si procede)"""
+    docs = preprocess_text([f"{q.strip()} {a.strip()}" for _, q, a in rows])
+    synonyms = _worker.get("synonyms")
+    if synonyms is not None:
+        docs = [synonyms.expand(doc) for doc in docs]
+    return docs
+
+def _chunk_df(rows):
+    """Primera pasada: (documentos, frecuencias de documento) de un bloque"""
+    docs = _prepare_docs(rows)
+    vec = _worker["pipe"].steps[0][1]
+    if isinstance(vec, HashingVectorizer):
+        # Cada fila del bloque no repite columnas: el conteo de índices es la frecuencia de documento
+        cols, counts = np.unique(vec.transform(docs).indices, return_counts=True)
+        return len(docs), (cols, counts)
+    analyze = _worker["analyze"]
+    df = Counter()
+    for doc in docs:
+        df.update(set(analyze(doc)))
+    return len(docs), df
+
+def _chunk_transform(rows):
+    """Segunda pasada: matriz TF-IDF de un bloque con el pipeline ya ajustado"""
+    return _worker["pipe"].transform(_prepare_docs(rows))
+
+def _chunk_transform_item(item):
+    """``_chunk_transform`` para (índice, filas); None si el bloque ya estaba hecho"""
+    _, rows = item
+    return None if rows is None else _chunk_transform(rows)
+
+def _bounded_map(executor, fn, items, window):
+    """Como ``executor.map`` pero con como mucho ``window`` bloques en vuelo (memoria acotada)"""
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, fut = pending.popleft()
+            yield item, fut.result()
+    while pending:
+        item, fut = pending.popleft()
+        yield item, fut.result()
+
+def fit_from_df(pipe, n_docs, df):
+    """Deja ``pipe`` ajustado a partir de las frecuencias de documento (igual que ``fit``).
+
+    En el modo vocabulario aplica min_df/max_df y ordena el vocabulario como
+    TfidfVectorizer; en el modo hashing solo calcula el IDF de cada cubeta.
+    """
+    vec = pipe.steps[0][1]
+    tfidf = pipe.steps[-1][1]
+    if isinstance(vec, HashingVectorizer):
+        dfs = df.astype(np.float64)
+    else:
+        high = vec.max_df if isinstance(vec.max_df, numbers.Integral) else vec.max_df * n_docs
+        low = vec.min_df if isinstance(vec.min_df, numbers.Integral) else vec.min_df * n_docs
+        terms = sorted(t for t, c in df.items() if low <= c <= high)
+        if not terms:
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+        vec.vocabulary_ = {t: i for i, t in enumerate(terms)}
+        vec.fixed_vocabulary_ = False
+        dfs = np.fromiter((df[t] for t in terms), dtype=np.float64, count=len(terms))
+    # IDF suavizado, como TfidfTransformer(smooth_idf=True)
+    idf = np.log((1 + n_docs) / (1 + dfs)) + 1
+    tfidf.idf_ = idf.astype(np.float32) if isinstance(vec, HashingVectorizer) else idf
+    return pipe
+
+def _progress(label, done, total, t0):
+    rate = done / max(time.time() - t0, 1e-9)
+    pct = f" ({done / total:.0%})" if total else ""
+    print(f"  {label}: {done}/{total} FAQs{pct}, {rate:.0f} FAQs/s", flush=True)
+
+class Checkpoint:
+    """Punto de control en disco: pipeline ajustado y bloques ya escritos.
+
+    Los bloques terminados se guardan aquí (ids, textos y matriz) y no en
+    memoria; al final se ensamblan los artefactos a partir de ellos.
+    """
+
+    def __init__(self, directory, config):
+        self.directory = Path(directory)
+        self.config = config
+
+    def reset(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True)
+        joblib.dump(self.config, self.directory / "config.joblib")
+
+    def compatible(self):
+        path = self.directory / "config.joblib"
+        return path.exists() and joblib.load(path) == self.config
+
+    def load_pipe(self):
+        path = self.directory / "pipe.joblib"
+        return joblib.load(path) if path.exists() else None
+
+    def save_pipe(self, pipe, n_docs):
+        joblib.dump({"pipe": pipe, "n_docs": n_docs}, self.directory / "pipe.tmp")
+        os.replace(self.directory / "pipe.tmp", self.directory / "pipe.joblib")
+
+    def _chunk_path(self, i):
+        return self.directory / f"chunk_{i:06d}.joblib"
+
+    def chunk_ids(self, i):
+        path = self._chunk_path(i)
+        return joblib.load(path)["ids"] if path.exists() else None
+
+    def save_chunk(self, i, ids, questions, answers, X):
+        tmp = self.directory / f"chunk_{i:06d}.tmp"
+        joblib.dump({"ids": ids, "questions": questions, "answers": answers, "X": X}, tmp)
+        os.replace(tmp, self._chunk_path(i))
+
+    def chunks(self):
+        for path in sorted(self.directory.glob("chunk_*.joblib")):
+            yield joblib.load(path)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def _connect():
+    return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+
+def _stream_faqs(conn, chunk_rows, name):
+    """Lee faq por bloques con un cursor de servidor (orden estable por id para poder reanudar)"""
+    cursor = conn.cursor(name=name)
+    cursor.itersize = chunk_rows
+    # El índice global es el de la colección por defecto (las demás las indexa api.py)
+    cursor.execute("SELECT id, q, a FROM faq WHERE coleccion = %s ORDER BY id", (DEFAULT_COLLECTION,))
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield [(str(faq_id), q, a) for faq_id, q, a in rows]
+    finally:
+        cursor.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construye el índice TF-IDF desde PostgreSQL")
+    parser.add_argument("--mode", choices=INDEX_MODES, default=INDEX_MODE)
+    parser.add_argument("--workers", type=int, default=BUILD_WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--resume", action="store_true", help="continuar desde el último punto de control")
+    parser.add_argument("--dense", action="store_true", default=DENSE_INDEX,
+                        help="construir también el índice denso (SVD truncada de la matriz TF-IDF)")
+    parser.add_argument("--dense-components", type=int, default=DENSE_COMPONENTS)
+    args = parser.parse_args(argv)
+
+    stopwords_es = load_stopwords()
+    t0 = time.time()
+
+    # Un solo constructor a la vez (también frente a /reload en los workers de api.py)
+    lock = BuildLock(_connect)
+    if not lock.acquire():
+        print("Otro proceso está construyendo el índice; inténtalo cuando termine.")
+        return
+
+    # 1) Conexiones: una para leer con cursor de servidor y otra para escribir
+    read_conn = _connect()
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM faq WHERE coleccion = %s", (DEFAULT_COLLECTION,))
+    total = cursor.fetchone()[0]
+
+    # Expansión opcional de los documentos con el mismo diccionario que usa api.py
+    synonyms = None
+    if EXPAND_DOCUMENTS:
+        synonyms = compile_synonyms(lambda text: preprocess_text([text])[0],
+                                    cursor=cursor if SYNONYMS_FROM_DB else None)
+
+    config = {"mode": args.mode, "n_features": HASH_N_FEATURES, "chunk_rows": args.chunk_rows,
+              "stopwords": stopwords_es, "expand": EXPAND_DOCUMENTS, "total": total}
+    checkpoint = Checkpoint(CHECKPOINT_DIR, config)
+    if args.resume and checkpoint.compatible():
+        print(f"Reanudando desde {CHECKPOINT_DIR}")
+    else:
+        if args.resume:
+            print("El punto de control no coincide con la configuración o la tabla faq; se empieza de cero")
+        checkpoint.reset()
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {STAGING_TABLE} "
+                       "(faq_id UUID PRIMARY KEY, vector_data BYTEA NOT NULL)")
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        conn.commit()
+
+    ctx = multiprocessing.get_context("spawn")
+    window = max(2 * args.workers, 2)
+
+    # 2) Primera pasada: frecuencias de documento por bloque en paralelo
+    state = checkpoint.load_pipe()
+    if state is None:
+        print(f"Pasada 1/2: frecuencias de documento ({args.workers} procesos)")
+        pipe = build_pipeline(stopwords_es, args.mode)
+        hashing = args.mode == "hashing"
+        df = np.zeros(HASH_N_FEATURES, dtype=np.int64) if hashing else Counter()
+        n_docs = 0
+        with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(pipe, synonyms)) as executor:
+            chunks = _stream_faqs(read_conn, args.chunk_rows, "faq_df")
+            for _, (n, chunk_df) in _bounded_map(executor, _chunk_df, chunks, window):
+                n_docs += n
+                if hashing:
+                    np.add.at(df, chunk_df[0], chunk_df[1])
+                else:
+                    df.update(chunk_df)
+                _progress("frecuencias", n_docs, total, t0)
+        read_conn.commit()
+        pipe = fit_from_df(pipe, n_docs, df)
+        del df
+        checkpoint.save_pipe(pipe, n_docs)
+    else:
+        pipe, n_docs = state["pipe"], state["n_docs"]
+        print("Pasada 1/2: vocabulario tomado del punto de control")
+
+    # 3) Segunda pasada: vectorizar por bloques y escribir en la tabla auxiliar con COPY
+    print(f"Pasada 2/2: vectores ({args.workers} procesos)")
+    t1 = time.time()
+    done = 0
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(pipe, synonyms)) as executor:
+        def pending_chunks():
+            for i, rows in enumerate(_stream_faqs(read_conn, args.chunk_rows, "faq_vectors")):
+                ids = [faq_id for faq_id, _, _ in rows]
+                saved = checkpoint.chunk_ids(i)
+                if saved is not None:
+                    if saved != ids:
+                        raise RuntimeError("La tabla faq cambió desde el punto de control; ejecuta sin --resume")
+                    yield i, None
+                else:
+                    yield i, rows
+
+        for (i, rows), X_chunk in _bounded_map(executor, _chunk_transform_item, pending_chunks(), window):
+            if rows is not None:
+                ids = [faq_id for faq_id, _, _ in rows]
+                # Borrar antes por si el bloque se escribió pero no llegó a anotarse
+                cursor.execute(f"DELETE FROM {STAGING_TABLE} WHERE faq_id = ANY(%s::uuid[])", (ids,))
+                write_vectors(cursor, ids, X_chunk, replace=False, table=STAGING_TABLE)
+                conn.commit()
+                checkpoint.save_chunk(i, ids, [q.strip() for _, q, _ in rows],
+                                      [a.strip() for _, _, a in rows], X_chunk)
+                done += len(rows)
+            else:
+                done += len(checkpoint.chunk_ids(i))
+            _progress("vectores", done, total, t1)
+    read_conn.commit()
+    read_conn.close()
+
+    # 4) Ensamblar los artefactos desde los bloques guardados
+    faq_ids, questions, answers, parts = [], [], [], []
+    for chunk in checkpoint.chunks():
+        faq_ids.extend(chunk["ids"])
+        questions.extend(chunk["questions"])
+        answers.extend(chunk["answers"])
+        parts.append(chunk["X"])
+    X = sp.vstack(parts, format="csr") if parts else sp.csr_matrix((0, pipe.steps[-1][1].idf_.shape[0]))
+    dense = None
+    if args.dense:
+        t2 = time.time()
+        dense = fit_dense(X, args.dense_components)
+        print(f"Índice denso: {dense.dim} dimensiones, {len(dense.terms)} términos ({time.time() - t2:.1f}s)")
+    joblib.dump(pipe, PIPE_PATH)
+    joblib.dump({"X": X, "questions": questions, "answers": answers, "ids": faq_ids, "dense": dense}, FAQS_PATH)
+    serving_dir = publish_serving_index(SERVING_DIR, pipe, X, questions, answers, faq_ids, dense)
+
+    # 5) Reemplazar vector_tfidf por los vectores nuevos en una sola transacción
+    cursor.execute("DELETE FROM vector_tfidf")
+    cursor.execute(f"INSERT INTO vector_tfidf (faq_id, vector_data) "
+                   f"SELECT s.faq_id, s.vector_data FROM {STAGING_TABLE} s JOIN faq f ON f.id = s.faq_id")
+    cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+    # Los workers de api.py abren la versión nueva al confirmar
+    generation = publish_version(cursor, serving_dir.name, since=t0)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    lock.release()
+    checkpoint.clear()
+
+    print("Índice TF-IDF creado y guardado.")
+    print(f"Preguntas cargadas: {len(questions)}")
+    print(f"Vectores almacenados en la base de datos: {len(faq_ids)}")
+    print(f"Artefacto de servicio: {serving_dir} (modo {args.mode}, generación publicada {generation})")
+    print(f"Tiempo total: {time.time() - t0:.1f}s")
+
+if __name__ == "__main__":
+    main()
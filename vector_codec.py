@@ -0,0 +1,126 @@
+# Formato binario disperso para la columna vector_tfidf.vector_data.
+#
+# Cada vector se guarda como una cabecera fija seguida de los índices (int32)
+# y los pesos (float32) de sus términos no nulos, así que el tamaño crece con
+# los no-ceros de la FAQ y no con el vocabulario:
+#
+#   magic "TFV" | versión (uint8) | dimensión (uint32) | nnz (uint32) | índices | valores
+#
+# Los vectores antiguos (pickle.dumps(X[i].toarray())) se siguen leyendo y
+# migrate_vectors.py los convierte al formato nuevo.
+import io
+import pickle
+import struct
+
+import numpy as np
+import scipy.sparse as sp
+
+MAGIC = b"TFV"
+VERSION = 1
+_HEADER = struct.Struct("<3sBII")
+
+# Filas por bloque al escribir con COPY (acota la memoria del búfer)
+COPY_CHUNK_ROWS = 5000
+
+
+def encode_parts(indices, values, dim):
+    """Serializa (índices, valores, dimensión) al formato binario"""
+    indices = np.asarray(indices).astype("<i4", copy=False)
+    values = np.asarray(values).astype("<f4", copy=False)
+    return _HEADER.pack(MAGIC, VERSION, dim, len(indices)) + indices.tobytes() + values.tobytes()
+
+
+def encode_vector(row):
+    """Serializa una fila dispersa 1 x dim al formato binario"""
+    row = sp.csr_matrix(row)
+    row.sum_duplicates()
+    return encode_parts(row.indices, row.data, row.shape[1])
+
+
+def is_legacy(blob):
+    """True si el vector está en el formato antiguo (array denso serializado con pickle)"""
+    return bytes(blob[:len(MAGIC)]) != MAGIC
+
+
+def decode_vector(blob):
+    """Devuelve (índices int32, valores float32, dimensión) de un vector guardado"""
+    blob = bytes(blob)
+    if is_legacy(blob):
+        dense = np.asarray(pickle.loads(blob)).ravel()
+        indices = np.flatnonzero(dense).astype(np.int32)
+        return indices, dense[indices].astype(np.float32), dense.shape[0]
+    magic, version, dim, nnz = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError(f"cabecera de vector no válida: {magic!r}")
+    if version != VERSION:
+        raise ValueError(f"versión de vector no soportada: {version}")
+    offset = _HEADER.size
+    indices = np.frombuffer(blob, dtype="<i4", count=nnz, offset=offset)
+    values = np.frombuffer(blob, dtype="<f4", count=nnz, offset=offset + 4 * nnz)
+    return indices, values, dim
+
+
+def _copy_rows(cursor, rows, table="vector_tfidf"):
+    """Envía filas (faq_id, bytes) a ``table`` con COPY en formato texto"""
+    buf = io.StringIO()
+    for faq_id, data in rows:
+        # bytea en hexadecimal; la barra invertida se duplica por el escape de COPY
+        buf.write(f"{faq_id}\t\\\\x{data.hex()}\n")
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} (faq_id, vector_data) FROM STDIN", buf)
+
+
+def write_vectors(cursor, ids, X, replace=True, progress=None, table="vector_tfidf"):
+    """Escribe los vectores de todas las FAQs con COPY por bloques.
+
+    Con ``replace`` se vacía antes la tabla. No confirma la transacción.
+    """
+    X = sp.csr_matrix(X)
+    if replace:
+        cursor.execute(f"DELETE FROM {table}")
+    n = len(ids)
+    for start in range(0, n, COPY_CHUNK_ROWS):
+        end = min(start + COPY_CHUNK_ROWS, n)
+        _copy_rows(cursor, ((ids[i], encode_vector(X[i])) for i in range(start, end)), table)
+        if progress:
+            progress(end / max(n, 1))
+
+
+def upsert_vector(cursor, faq_id, row):
+    """Guarda (o reemplaza) el vector de una sola FAQ"""
+    cursor.execute(
+        "INSERT INTO vector_tfidf (faq_id, vector_data) VALUES (%s, %s) "
+        "ON CONFLICT (faq_id) DO UPDATE SET vector_data = EXCLUDED.vector_data",
+        (faq_id, encode_vector(row))
+    )
+
+
+def load_matrix(cursor, ids, itersize=5000):
+    """Reconstruye la matriz CSR de servicio desde vector_tfidf en el orden de ``ids``.
+
+    Las FAQs sin vector quedan como filas vacías.
+    """
+    pos = {str(faq_id): i for i, faq_id in enumerate(ids)}
+    rows, cols, vals = [], [], []
+    dim = 0
+    cursor.execute("SELECT faq_id, vector_data FROM vector_tfidf")
+    while True:
+        batch = cursor.fetchmany(itersize)
+        if not batch:
+            break
+        for faq_id, blob in batch:
+            i = pos.get(str(faq_id))
+            if i is None:
+                continue
+            indices, values, d = decode_vector(blob)
+            dim = max(dim, d)
+            rows.append(np.full(len(indices), i, dtype=np.int32))
+            cols.append(indices)
+            vals.append(values)
+    if not rows:
+        return sp.csr_matrix((len(ids), dim), dtype=np.float32)
+    return sp.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(ids), dim),
+        dtype=np.float32,
+    )